@@ -100,6 +100,11 @@ echo "✅ RabbitMQ deployed successfully"
 echo "🔧 Deploying microservices..."
 kubectl apply -f microservices.yaml
 
+# order-service pods wait in an init container until the schema is migrated
+echo "⏳ Waiting for order-service migrations..."
+kubectl wait --for=condition=complete --timeout=300s job/order-service-migrate -n canteen-system
+echo "✅ order-service migrations applied"
+
 # Wait for each service to be ready
 wait_for_deployment user-service canteen-system
 wait_for_deployment menu-service canteen-system
@@ -1,3 +1,4 @@
+const mongoose = require('mongoose');
 const MenuItem = require('../models/MenuItem');
 const Category = require('../models/Category');
 
@@ -37,6 +38,23 @@ const getMenuItemById = async (req, res) => {
     }
 };
 
+// Get several menu items by ID in one round trip
+const getMenuItemsByIds = async (req, res) => {
+    try {
+        const { ids } = req.body;
+
+        if (!Array.isArray(ids)) {
+            return res.status(400).json({ message: 'ids must be an array' });
+        }
+
+        const validIds = ids.filter((id) => mongoose.Types.ObjectId.isValid(id));
+        const menuItems = await MenuItem.find({ _id: { $in: validIds } });
+        res.json(menuItems);
+    } catch (error) {
+        res.status(500).json({ message: 'Error fetching menu items', error: error.message });
+    }
+};
+
 // Create new menu item (admin only)
 const createMenuItem = async (req, res) => {
     try {
@@ -126,6 +144,7 @@ const createCategory = async (req, res) => {
 module.exports = {
     getAllMenuItems,
     getMenuItemById,
+    getMenuItemsByIds,
     createMenuItem,
     updateMenuItem,
     deleteMenuItem,
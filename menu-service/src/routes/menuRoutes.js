@@ -4,6 +4,7 @@ const { authMiddleware, adminRequired } = require('../middleware/auth');
 const {
     getAllMenuItems,
     getMenuItemById,
+    getMenuItemsByIds,
     createMenuItem,
     updateMenuItem,
     deleteMenuItem,
@@ -14,6 +15,7 @@ const {
 // Public routes
 router.get('/items', getAllMenuItems);
 router.get('/items/:id', getMenuItemById);
+router.post('/items/batch', getMenuItemsByIds);
 router.get('/categories', getAllCategories);
 
 // Admin only routes
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Encode/decode cost and payload size of each event codec.
+
+Uses the real order_created message built by build_order_event.
+
+    python benchmarks/event_codec.py --items 5 --iterations 100000
+"""
+import os
+import sys
+import timeit
+import argparse
+from decimal import Decimal
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings  # noqa: E402
+
+settings.configure(RABBITMQ_ROUTING_KEYS={'order_created': 'order.created'})
+
+from orders.event_codec import available_codecs  # noqa: E402
+from orders.message_broker import build_order_event  # noqa: E402
+
+
+def order_created_message(item_count):
+    items = [
+        {
+            'menu_item_id': f'68e1f0c2a4b5c6d7e8f9{index:04d}',
+            'item_name': 'Paneer Butter Masala',
+            'quantity': 2,
+            'price': 149.5,
+            'special_instructions': 'Less spicy' if index % 2 else '',
+        }
+        for index in range(item_count)
+    ]
+    _, message = build_order_event(
+        'order_created',
+        order_id=104233,
+        user_id=5821,
+        total_amount=Decimal('299.00') * item_count,
+        items=items,
+        special_instructions='Pack separately',
+        created_at=datetime(2025, 10, 5, 12, 30, tzinfo=timezone.utc).isoformat(),
+    )
+    return message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    message = order_created_message(args.items)
+    print(f"order_created with {args.items} items, {args.iterations} iterations")
+    print(f"{'codec':<10}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+
+    for name, codec in available_codecs().items():
+        body = codec.encode(message)
+        assert codec.decode(body)['order_id'] == message['order_id']
+        encode = timeit.timeit(lambda: codec.encode(message), number=args.iterations)
+        decode = timeit.timeit(lambda: codec.decode(body), number=args.iterations)
+        print(
+            f"{name:<10}{len(body):>8}"
+            f"{encode / args.iterations * 1e6:>12.2f}"
+            f"{decode / args.iterations * 1e6:>12.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Closed-loop HTTP load test for order-service.
+
+Run it once against each serving mode and compare requests per second:
+
+    SERVER_MODE=development ./start.sh        # before: runserver
+    python benchmarks/load_test.py --concurrency 32 --duration 30
+
+    ./start.sh                                # after: gunicorn workers x threads
+    python benchmarks/load_test.py --concurrency 32 --duration 30
+
+Order creation mostly waits on menu-service and queue-service, so compare
+the sync and async views with a write-heavy mix and more clients than the
+sync server has threads:
+
+    ./start.sh                                # sync views, WSGI threads
+    python benchmarks/load_test.py --concurrency 256 --create-orders --write-ratio 1 --menu-item-id <id>
+
+    SERVER_MODE=asgi ./start.sh               # async views, Uvicorn workers
+    python benchmarks/load_test.py --concurrency 256 --create-orders --write-ratio 1 --menu-item-id <id>
+
+--create-orders also POSTs orders (needs menu-service and a menu item id).
+"""
+import time
+import random
+import argparse
+import threading
+from statistics import quantiles
+
+import requests
+
+
+def worker(args, deadline, latencies, errors, lock):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        user_id = random.randint(1, args.users)
+        start = time.perf_counter()
+        try:
+            if args.create_orders and random.random() < args.write_ratio:
+                response = session.post(f"{args.url}/api/orders/", json={
+                    'user_id': user_id,
+                    'items': [{'menu_item_id': args.menu_item_id, 'quantity': 1}],
+                }, timeout=10)
+            else:
+                response = session.get(f"{args.url}/api/orders/user/{user_id}/", timeout=10)
+            ok = response.status_code < 400
+        except requests.exceptions.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8083')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--create-orders', action='store_true')
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--menu-item-id', default=None)
+    args = parser.parse_args()
+
+    if args.create_orders and not args.menu_item_id:
+        parser.error('--create-orders needs --menu-item-id')
+
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args, deadline, latencies, errors, lock))
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"{args.url} concurrency={args.concurrency} duration={args.duration:.0f}s")
+    print(f"requests/s : {len(latencies) / args.duration:.1f}")
+    print(f"errors     : {errors[0]}")
+    if len(latencies) >= 2:
+        cuts = quantiles(latencies, n=100)
+        print(f"latency ms : p50={cuts[49] * 1000:.1f} p95={cuts[94] * 1000:.1f} p99={cuts[98] * 1000:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+import threading
+import aiohttp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Event loop -> pooled aiohttp session; a session can only be used on the
+# loop it was created on (one per ASGI worker in production)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_async_session() -> aiohttp.ClientSession:
+    """Get or create the keep-alive aiohttp session for the running event loop"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                keepalive_timeout=30
+            ),
+            timeout=aiohttp.ClientTimeout(total=5)
+        )
+        with _sessions_lock:
+            # Drop sessions whose loops are gone (e.g. per-request loops in tests)
+            for old_loop in [old_loop for old_loop in _sessions if old_loop.is_closed()]:
+                del _sessions[old_loop]
+            _sessions[loop] = session
+    return session
@@ -0,0 +1,150 @@
+"""Async versions of the order endpoints, for serving over ASGI.
+
+Routed instead of the DRF views in ``views.py`` when ORDER_ASYNC_VIEWS is
+on (see ``urls.py``). Calls to menu-service and queue-service are awaited
+on the event loop, so one worker interleaves many in-flight requests.
+Reads use the async ORM; work that needs a transaction or the sync
+serializers runs on a worker thread via ``sync_to_async``.
+"""
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from .models import Order
+from .serializers import (
+    OrderSerializer,
+    CreateOrderSerializer,
+    UpdateOrderStatusSerializer,
+    serialize_order_list,
+    serialize_order_page,
+    decode_order_cursor,
+)
+from .services import OrderService, StatusTransitionError
+
+logger = logging.getLogger(__name__)
+
+_renderer = JSONRenderer()
+
+
+def _response(data, status_code=status.HTTP_200_OK):
+    """Render like DRF's Response so both modes return identical bodies"""
+    return HttpResponse(_renderer.render(data), status=status_code, content_type='application/json')
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def create_order(request):
+    """Create a new order"""
+    data = _json_body(request)
+    if data is None:
+        return _response({'detail': 'JSON parse error'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = CreateOrderSerializer(data=data)
+    if not serializer.is_valid():
+        return _response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        user_id = serializer.validated_data['user_id']
+        items_data = serializer.validated_data['items']
+        special_instructions = serializer.validated_data.get('special_instructions')
+
+        order = await OrderService.acreate_order(user_id, items_data, special_instructions)
+
+        order_data = await sync_to_async(lambda: OrderSerializer(order).data)()
+        return _response(order_data, status.HTTP_201_CREATED)
+
+    except Exception as e:
+        logger.error(f"Error creating order: {str(e)}")
+        return _response({'error': 'Failed to create order'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_order(request, order_id):
+    """Get order by ID"""
+    try:
+        order = await Order.objects.prefetch_related('items').aget(id=order_id)
+        return _response(OrderSerializer(order).data)
+    except Order.DoesNotExist:
+        return _response({'detail': 'No Order matches the given query.'}, status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.error(f"Error fetching order {order_id}: {str(e)}")
+        return _response({'error': 'Failed to fetch order'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_user_orders(request, user_id):
+    """Get orders for a user, one keyset page at a time (see views.get_user_orders)"""
+    try:
+        params = request.GET
+        status_filter = params.get('status')
+        fields = params.get('fields')
+        fields = set(fields.split(',')) if fields else None
+
+        if settings.ORDER_LIST_LEGACY_UNPAGINATED and 'limit' not in params and 'cursor' not in params:
+            orders = OrderService.get_user_orders(user_id, status_filter)
+            return _response(await sync_to_async(serialize_order_list)(orders, fields))
+
+        limit = min(int(params.get('limit', settings.ORDER_PAGE_SIZE)), settings.ORDER_PAGE_SIZE_MAX)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        after = decode_order_cursor(params['cursor']) if params.get('cursor') else None
+
+        orders = OrderService.get_user_orders_page(user_id, status_filter, after)
+        results, next_cursor = await sync_to_async(serialize_order_page)(orders, limit, fields)
+        return _response({'results': results, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return _response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error fetching orders for user {user_id}: {str(e)}")
+        return _response({'error': 'Failed to fetch orders'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_user_active_orders(request, user_id):
+    """Get active orders for a user"""
+    try:
+        orders = OrderService.get_active_orders(user_id)
+        return _response(await sync_to_async(serialize_order_list)(orders))
+    except Exception as e:
+        logger.error(f"Error fetching active orders for user {user_id}: {str(e)}")
+        return _response({'error': 'Failed to fetch active orders'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+async def update_order_status(request, order_id):
+    """Update order status"""
+    data = _json_body(request)
+    if data is None:
+        return _response({'detail': 'JSON parse error'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = UpdateOrderStatusSerializer(data=data)
+    if not serializer.is_valid():
+        return _response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        def update():
+            order = OrderService.update_order_status(order_id, serializer.validated_data['status'])
+            return OrderSerializer(order).data
+
+        return _response(await sync_to_async(update)())
+
+    except StatusTransitionError as e:
+        return _response({'error': str(e)}, status.HTTP_409_CONFLICT)
+    except ValueError as e:
+        return _response({'error': str(e)}, status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.error(f"Error updating order {order_id} status: {str(e)}")
+        return _response({'error': 'Failed to update order status'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
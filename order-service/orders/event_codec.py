@@ -0,0 +1,119 @@
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Bump when an event's shape changes incompatibly
+SCHEMA_VERSION = 1
+SCHEMA_VERSION_HEADER = 'x-schema-version'
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+
+def _default(value):
+    """Encode types the fast codecs do not handle natively"""
+    if isinstance(value, Decimal):
+        # Consumers (including the Go queue-service) expect numbers
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class JsonCodec:
+    """Standard library JSON"""
+    name = 'json'
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return json.dumps(message, default=_default).encode('utf-8')
+
+    def decode(self, body: bytes) -> Dict[str, Any]:
+        return json.loads(body)
+
+
+class OrjsonCodec:
+    """orjson: same wire format as JsonCodec, several times faster"""
+    name = 'orjson'
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return orjson.dumps(message, default=_default)
+
+    def decode(self, body: bytes) -> Dict[str, Any]:
+        return orjson.loads(body)
+
+
+class MsgpackCodec:
+    """MessagePack: binary and smaller; only for Python consumers"""
+    name = 'msgpack'
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return msgpack.packb(message, default=_default, use_bin_type=True)
+
+    def decode(self, body: bytes) -> Dict[str, Any]:
+        return msgpack.unpackb(body, raw=False)
+
+
+def available_codecs() -> Dict[str, Any]:
+    """Codecs usable in this process, keyed by name"""
+    codecs = {'json': JsonCodec()}
+    if orjson is not None:
+        codecs['orjson'] = OrjsonCodec()
+    if msgpack is not None:
+        codecs['msgpack'] = MsgpackCodec()
+    return codecs
+
+
+_CODECS = available_codecs()
+
+# Decoding is driven by the message's content_type; JSON uses the fastest
+# implementation available
+_DECODERS = {
+    JSON_CONTENT_TYPE: _CODECS.get('orjson', _CODECS['json']),
+}
+if 'msgpack' in _CODECS:
+    _DECODERS[MSGPACK_CONTENT_TYPE] = _CODECS['msgpack']
+
+
+def get_codec(name: str):
+    """Get a codec by name, falling back to JSON if it is not installed"""
+    codec = _CODECS.get(name)
+    if codec is None:
+        logger.warning(f"Event codec {name} not available, using JSON")
+        codec = _DECODERS[JSON_CONTENT_TYPE]
+    return codec
+
+
+def encode_event(message: Dict[str, Any], codec_name: str = 'orjson') -> Tuple[bytes, str, Dict[str, Any]]:
+    """Encode an event; returns the body, its content type and AMQP headers"""
+    codec = get_codec(codec_name)
+    return codec.encode(message), codec.content_type, {SCHEMA_VERSION_HEADER: SCHEMA_VERSION}
+
+
+def decode_event(body: bytes, content_type: str = None, headers: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Decode an event using the codec named by its content type"""
+    codec = _DECODERS.get(content_type or JSON_CONTENT_TYPE)
+    if codec is None:
+        raise ValueError(f"Unsupported event content type: {content_type}")
+
+    version = (headers or {}).get(SCHEMA_VERSION_HEADER, 1)
+    if version > SCHEMA_VERSION:
+        logger.warning(f"Event schema version {version} is newer than supported {SCHEMA_VERSION}")
+
+    return codec.decode(body)
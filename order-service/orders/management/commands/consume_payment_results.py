@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from orders.payment_results import consume_payment_results
+
+
+class Command(BaseCommand):
+    help = 'Apply payment.success / payment.failed events to orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Results applied per transaction')
+        parser.add_argument('--max-wait', type=float, default=None, help='Seconds to wait for a batch to fill')
+        parser.add_argument('--prefetch', type=int, default=None, help='Unacked messages held by this consumer')
+
+    def handle(self, *args, **options):
+        try:
+            consume_payment_results(
+                batch_size=options['batch_size'],
+                max_wait=options['max_wait'],
+                prefetch_count=options['prefetch']
+            )
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped consuming payment results')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from orders.outbox import OutboxRelay
+
+
+class Command(BaseCommand):
+    help = 'Publish pending outbox events to RabbitMQ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Events published per transaction')
+        parser.add_argument('--interval', type=float, default=None, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the current backlog and exit')
+
+    def handle(self, *args, **options):
+        relay = OutboxRelay(batch_size=options['batch_size'], poll_interval=options['interval'])
+
+        if options['once']:
+            total = 0
+            while True:
+                published = relay.relay_batch()
+                total += published
+                if published < relay.batch_size:
+                    break
+            self.stdout.write(self.style.SUCCESS(f'Published {total} outbox events'))
+            return
+
+        try:
+            relay.run()
+        except KeyboardInterrupt:
+            relay.stop()
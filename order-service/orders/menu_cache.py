@@ -0,0 +1,281 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    """A cached menu item snapshot and the times it stops being fresh / usable"""
+
+    __slots__ = ('value', 'fresh_until', 'stale_until')
+
+    def __init__(self, value: Dict[str, Any], ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self.value = value
+        self.fresh_until = now + ttl
+        self.stale_until = now + ttl + stale_ttl
+
+
+class _Load:
+    """An in-flight load of one key, started at cache ``generation``"""
+
+    __slots__ = ('event', 'generation', 'value')
+
+    def __init__(self, generation: int):
+        self.event = threading.Event()
+        self.generation = generation
+        self.value = None
+
+
+class MenuItemCache:
+    """In-process LRU cache of menu-service item snapshots.
+
+    Entries are fresh for ``ttl`` seconds. After that they may still be served
+    for ``stale_ttl`` seconds while a single background refresh runs, and they
+    are also served if that refresh fails. Concurrent misses on the same key
+    share one upstream fetch. A load that was started before an
+    ``invalidate`` of its key is not stored, so it cannot bring back the
+    snapshot the invalidation removed.
+    """
+
+    def __init__(self, ttl: float = 300, stale_ttl: float = 60, max_entries: int = 1000, load_timeout: float = 10):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.load_timeout = load_timeout
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidate; full clears and per-key invalidations
+        # record the generation they happened at
+        self._generation = 0
+        self._cleared_at = 0
+        self._invalidated_at = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_serves = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str, loader: Callable[[str], Optional[Dict[str, Any]]] = None):
+        """Return a cached item without loading it; stale hits trigger a refresh"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            now = time.monotonic()
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+
+            if now >= entry.stale_until:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            self.stale_serves += 1
+            load = None
+            if loader is not None and key not in self._inflight:
+                load = self._inflight[key] = _Load(self._generation)
+
+        if load is not None:
+            threading.Thread(
+                target=self._load,
+                args=(key, loader, load),
+                name=f'menu-cache-refresh-{key}',
+                daemon=True
+            ).start()
+        return entry.value
+
+    def get_many(self, keys: Iterable[str], loader: Callable[[str], Optional[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """Return the cached subset of ``keys``"""
+        found = {}
+        for key in keys:
+            value = self.get(key, loader)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def _load(self, key: str, loader: Callable[[str], Optional[Dict[str, Any]]], load: _Load):
+        value = None
+        try:
+            value = loader(key)
+        finally:
+            # A failed refresh keeps serving the stale copy rather than failing orders
+            self._finish(key, load, value)
+
+    def claim_loads(self, keys: Iterable[str]) -> Tuple[List[str], Dict[str, _Load]]:
+        """Single-flight for caller-side (batch) loads of missing keys.
+
+        Returns ``(owned, waiting)``: the keys this caller must now load and
+        then pass to ``finish_loads``, and the in-flight load of each key
+        another caller is already loading (see ``wait_for``).
+        """
+        owned, waiting = [], {}
+        with self._lock:
+            for key in keys:
+                self.misses += 1
+                load = self._inflight.get(key)
+                if load is None:
+                    self._inflight[key] = _Load(self._generation)
+                    owned.append(key)
+                else:
+                    waiting[key] = load
+        return owned, waiting
+
+    def finish_loads(self, keys: Iterable[str], items: Dict[str, Dict[str, Any]]):
+        """Store what a ``claim_loads`` caller fetched and wake its waiters"""
+        for key in keys:
+            with self._lock:
+                load = self._inflight.get(key)
+            if load is not None:
+                self._finish(key, load, items.get(key))
+
+    def wait_for(self, waiting: Dict[str, _Load]) -> Dict[str, Dict[str, Any]]:
+        """Wait for other callers' loads and return the items they fetched"""
+        deadline = time.monotonic() + self.load_timeout
+        found = {}
+        for key, load in waiting.items():
+            load.event.wait(timeout=max(deadline - time.monotonic(), 0))
+            if load.value is not None:
+                found[key] = load.value
+        return found
+
+    def _finish(self, key: str, load: _Load, value: Optional[Dict[str, Any]]):
+        with self._lock:
+            if self._inflight.get(key) is load:
+                del self._inflight[key]
+            # Waiters still get the value; only the cache skips a superseded one
+            load.value = value
+            if value is not None and not self._invalidated_since(key, load.generation):
+                self._store(key, value)
+        load.event.set()
+
+    def _invalidated_since(self, key: str, generation: int) -> bool:
+        return max(self._cleared_at, self._invalidated_at.get(key, 0)) > generation
+
+    def _store(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = _CacheEntry(value, self.ttl, self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store an item snapshot, evicting the least recently used if full"""
+        with self._lock:
+            self._store(key, value)
+
+    def set_many(self, items: Dict[str, Dict[str, Any]]):
+        """Store several item snapshots"""
+        for key, value in items.items():
+            self.set(key, value)
+
+    def invalidate(self, key: str = None):
+        """Drop one item, or the whole cache when no key is given"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+                self._cleared_at = self._generation
+                self._invalidated_at.clear()
+            else:
+                self._entries.pop(key, None)
+                self._invalidated_at[key] = self._generation
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for proving the cache cuts menu-service traffic"""
+        with self._lock:
+            lookups = self.hits + self.stale_serves + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale_serves': self.stale_serves,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits + self.stale_serves) / lookups if lookups else 0,
+            }
+
+
+def handle_menu_event(message: Dict[str, Any]):
+    """Invalidate cached items named in a menu change event"""
+    cache = get_menu_cache()
+    menu_item_id = message.get('menu_item_id') or message.get('id')
+    if menu_item_id:
+        cache.invalidate(str(menu_item_id))
+    else:
+        cache.invalidate()
+    logger.info(f"Menu cache invalidated for {menu_item_id or 'all items'}")
+
+
+def _consume_menu_events():
+    """Consume menu change events on a per-process queue (blocking)"""
+    from .message_broker import RabbitMQService
+
+    # Each process keeps its own cache, so each needs its own exclusive queue
+    service = RabbitMQService()
+    queue_name = service.declare_queue(
+        '',
+        settings.RABBITMQ_ROUTING_KEYS['menu_changed'],
+        durable=False,
+        exclusive=True
+    )
+    service.setup_consumer(queue_name, handle_menu_event)
+    service.start_consuming()
+
+
+def start_invalidation_listener(max_backoff: float = 30.0):
+    """Start the background thread that applies menu change events.
+
+    The listener reconnects after any broker error, backing off up to
+    ``max_backoff`` seconds. Events sent while it was away are lost with its
+    exclusive queue, so the whole cache is dropped on each reconnect.
+    """
+    def run():
+        delay = 1.0
+        while True:
+            started = time.monotonic()
+            try:
+                _consume_menu_events()
+            except Exception as e:
+                logger.error(f"Menu cache invalidation listener failed: {str(e)}")
+
+            if time.monotonic() - started > max_backoff:
+                delay = 1.0  # it had been connected for a while; retry promptly
+            logger.info(f"Reconnecting menu cache invalidation listener in {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_backoff)
+            get_menu_cache().invalidate()
+
+    threading.Thread(target=run, name='menu-cache-invalidation', daemon=True).start()
+
+
+# Global instance
+_menu_cache = None
+_menu_cache_lock = threading.Lock()
+
+
+def get_menu_cache() -> MenuItemCache:
+    """Get or create the process-wide menu item cache"""
+    global _menu_cache
+    if _menu_cache is None:
+        with _menu_cache_lock:
+            if _menu_cache is None:
+                _menu_cache = MenuItemCache(
+                    ttl=settings.MENU_CACHE_TTL,
+                    stale_ttl=settings.MENU_CACHE_STALE_TTL,
+                    max_entries=settings.MENU_CACHE_MAX_ENTRIES,
+                    load_timeout=settings.MENU_CACHE_LOAD_TIMEOUT
+                )
+                if settings.MENU_CACHE_INVALIDATION_ENABLED:
+                    start_invalidation_listener()
+    return _menu_cache
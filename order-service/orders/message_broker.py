@@ -1,13 +1,364 @@
 import pika
-import json
+import time
+import queue
 import logging
 import threading
+import collections
+from concurrent.futures import Future
 from datetime import datetime
 from django.conf import settings
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, Optional, Tuple
+from .event_codec import encode_event, decode_event
 
 logger = logging.getLogger(__name__)
 
+class _PublisherChannel:
+    """A connection/channel pair owned by exactly one thread at a time"""
+
+    __slots__ = ('connection', 'channel')
+
+    def __init__(self, connection, channel):
+        self.connection = connection
+        self.channel = channel
+
+    @property
+    def is_open(self) -> bool:
+        return self.connection.is_open and self.channel.is_open
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+
+
+class PublisherPool:
+    """Pool of pre-opened publisher channels shared by request threads.
+
+    pika channels are not thread-safe, so each publish borrows a channel for
+    its exclusive use and hands it back afterwards. Channels are opened,
+    health-checked and re-opened by a background thread, so a publishing
+    thread never waits on a connection handshake; if no channel is ready
+    within ``acquire_timeout`` the publish fails fast instead.
+    """
+
+    def __init__(self, url: str, exchange: str, size: int = 4,
+                 acquire_timeout: float = 0.5, health_check_interval: float = 10):
+        self.url = url
+        self.exchange = exchange
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._reconnects = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._maintain, name='rabbitmq-publisher-pool', daemon=True)
+
+    def start(self):
+        """Open the pool's channels in the background"""
+        for _ in range(self.size):
+            self._reconnects.put(None)
+        self._thread.start()
+        return self
+
+    @property
+    def available(self) -> int:
+        return self._idle.qsize()
+
+    def publish(self, routing_key: str, body, properties: pika.BasicProperties):
+        """Publish on a borrowed channel; raises ConnectionError if none is ready"""
+        try:
+            publisher = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise ConnectionError('No RabbitMQ publisher channel available')
+
+        try:
+            publisher.channel.basic_publish(
+                exchange=self.exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=properties
+            )
+        except Exception:
+            self._discard(publisher)
+            raise
+        self._idle.put(publisher)
+
+    def _open(self) -> _PublisherChannel:
+        connection = pika.BlockingConnection(pika.URLParameters(self.url))
+        channel = connection.channel()
+        channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+        return _PublisherChannel(connection, channel)
+
+    def _discard(self, publisher: _PublisherChannel):
+        """Close a broken channel and ask the maintenance thread for a new one"""
+        publisher.close()
+        if not self._closed.is_set():
+            self._reconnects.put(None)
+
+    def _replace(self):
+        """Open one channel, retrying with capped exponential backoff"""
+        delay = 0.5
+        while not self._closed.is_set():
+            try:
+                self._idle.put(self._open())
+                return
+            except Exception as e:
+                logger.error(f"Publisher pool failed to connect to RabbitMQ: {str(e)}")
+                self._closed.wait(delay)
+                delay = min(delay * 2, 30)
+
+    def _check_idle(self):
+        """Service heartbeats on idle channels and replace dead ones"""
+        for _ in range(self._idle.qsize()):
+            try:
+                publisher = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if not publisher.is_open:
+                    raise ConnectionError('channel closed')
+                publisher.connection.process_data_events(time_limit=0)
+            except Exception as e:
+                logger.warning(f"Replacing unhealthy publisher channel: {str(e)}")
+                self._discard(publisher)
+                continue
+            self._idle.put(publisher)
+
+    def _maintain(self):
+        while not self._closed.is_set():
+            try:
+                self._reconnects.get(timeout=self.health_check_interval)
+            except queue.Empty:
+                self._check_idle()
+                continue
+            self._replace()
+
+    def close(self):
+        """Stop maintenance and close every idle channel"""
+        self._closed.set()
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class DeliveryNotConfirmed(Exception):
+    """Raised on a publish future when the broker never confirmed the message"""
+
+
+class _PendingPublish:
+    __slots__ = ('future', 'routing_key', 'body', 'properties', 'attempts', 'sent_at')
+
+    def __init__(self, future, routing_key, body, properties):
+        self.future = future
+        self.routing_key = routing_key
+        self.body = body
+        self.properties = properties
+        self.attempts = 0
+        self.sent_at = None
+
+
+class ConfirmingPublisher:
+    """Publisher with pipelined publisher confirms.
+
+    Runs its own pika ``SelectConnection`` IO loop on a background thread.
+    ``publish`` is thread-safe and returns a ``Future`` straight away, so
+    many messages are in flight at once. The broker's acks (including
+    ``multiple`` acks) are matched to messages by delivery tag. Nacked,
+    timed-out or connection-lost messages are retried up to ``max_retries``
+    times, after which the future fails with ``DeliveryNotConfirmed`` so the
+    caller can park the message. Retries may reorder messages.
+    """
+
+    def __init__(self, url: str, exchange: str, confirm_timeout: float = 5, max_retries: int = 3):
+        self.url = url
+        self.exchange = exchange
+        self.confirm_timeout = confirm_timeout
+        self.max_retries = max_retries
+        self._submitted = queue.Queue()
+        self._retry = collections.deque()
+        self._pending = {}
+        self._delivery_tag = 0
+        self._connection = None
+        self._channel = None
+        self._reconnect_delay = 0.5
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rabbitmq-confirming-publisher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self._channel is not None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def publish(self, routing_key: str, body, properties: pika.BasicProperties) -> Future:
+        """Queue a message for publishing; the future resolves on broker ack.
+
+        Raises ConnectionError while disconnected, so callers with their own
+        durable retry (like the outbox relay) do not pile up duplicates.
+        """
+        if not self.ready:
+            raise ConnectionError('Confirming publisher is not connected to RabbitMQ')
+        future = Future()
+        self._submitted.put(_PendingPublish(future, routing_key, body, properties))
+        self._wake()
+        return future
+
+    def _wake(self):
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._drain)
+            except Exception:
+                # Connection is being replaced; the new channel drains on open
+                pass
+
+    # -- IO loop thread only below this line --
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._connection = pika.SelectConnection(
+                pika.URLParameters(self.url),
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed
+            )
+            self._connection.ioloop.start()
+            self._channel = None
+            if not self._stopping.is_set():
+                self._stopping.wait(self._reconnect_delay)
+                self._reconnect_delay = min(self._reconnect_delay * 2, 30)
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error):
+        logger.error(f"Confirming publisher failed to connect to RabbitMQ: {str(error)}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self._channel = None
+        # Anything unconfirmed must be sent again on the next connection
+        for tag in sorted(self._pending, reverse=True):
+            self._retry.appendleft(self._pending.pop(tag))
+        if not self._stopping.is_set():
+            logger.warning(f"Confirming publisher connection closed: {reason}")
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.exchange_declare(
+            exchange=self.exchange,
+            exchange_type='topic',
+            durable=True,
+            callback=lambda frame: channel.confirm_delivery(
+                ack_nack_callback=self._on_delivery_confirmation,
+                callback=lambda frame: self._on_confirm_mode(channel)
+            )
+        )
+
+    def _on_channel_closed(self, channel, reason):
+        # A channel-level error (e.g. missing exchange); start over cleanly
+        self._channel = None
+        if self._connection.is_open:
+            self._connection.close()
+
+    def _on_confirm_mode(self, channel):
+        self._channel = channel
+        self._delivery_tag = 0
+        self._reconnect_delay = 0.5
+        self._connection.ioloop.call_later(1, self._check_timeouts)
+        self._drain()
+
+    def _drain(self):
+        if self._channel is None:
+            return
+        while self._retry:
+            self._send(self._retry.popleft())
+        while True:
+            try:
+                pending = self._submitted.get_nowait()
+            except queue.Empty:
+                break
+            self._send(pending)
+
+    def _send(self, pending: _PendingPublish):
+        self._delivery_tag += 1
+        pending.sent_at = time.monotonic()
+        self._pending[self._delivery_tag] = pending
+        self._channel.basic_publish(
+            exchange=self.exchange,
+            routing_key=pending.routing_key,
+            body=pending.body,
+            properties=pending.properties
+        )
+
+    def _on_delivery_confirmation(self, method_frame):
+        confirm = method_frame.method
+        if confirm.multiple:
+            tags = [tag for tag in self._pending if tag <= confirm.delivery_tag]
+        else:
+            tags = [confirm.delivery_tag] if confirm.delivery_tag in self._pending else []
+
+        acked = isinstance(confirm, pika.spec.Basic.Ack)
+        for tag in tags:
+            pending = self._pending.pop(tag)
+            if acked:
+                pending.future.set_result(True)
+            else:
+                self._failed(pending, 'nacked by broker')
+        if not acked:
+            self._drain()
+
+    def _check_timeouts(self):
+        if self._channel is None:
+            return
+        deadline = time.monotonic() - self.confirm_timeout
+        expired = [tag for tag, pending in self._pending.items() if pending.sent_at < deadline]
+        for tag in expired:
+            self._failed(self._pending.pop(tag), 'confirm timed out')
+        if expired:
+            self._drain()
+        self._connection.ioloop.call_later(1, self._check_timeouts)
+
+    def _failed(self, pending: _PendingPublish, reason: str):
+        pending.attempts += 1
+        if pending.attempts > self.max_retries:
+            logger.error(f"Giving up on message to {pending.routing_key}: {reason}")
+            pending.future.set_exception(DeliveryNotConfirmed(f"{pending.routing_key}: {reason}"))
+        else:
+            self._retry.append(pending)
+
+    def _stop_loop(self):
+        if self._connection.is_open:
+            self._connection.close()
+        else:
+            self._connection.ioloop.stop()
+
+    def close(self, timeout: float = 5):
+        """Wait briefly for outstanding confirms, then stop the IO loop"""
+        deadline = time.monotonic() + timeout
+        while (self._pending or not self._submitted.empty()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stopping.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._stop_loop)
+            except Exception:
+                pass
+        self._thread.join(timeout=timeout)
+
+
 class RabbitMQService:
     """RabbitMQ Service for asynchronous messaging"""
     
@@ -17,7 +368,44 @@ class RabbitMQService:
         self.exchange = settings.RABBITMQ_EXCHANGE
         self.routing_keys = settings.RABBITMQ_ROUTING_KEYS
         self._consumers = {}
-        self._connect()
+        self._publisher_pool = None
+        self._confirming_publisher = None
+        self._publisher_pool_lock = threading.Lock()
+    
+    @property
+    def publisher_pool(self) -> PublisherPool:
+        """Pool used for publishing; the connection below is for consuming"""
+        if self._publisher_pool is None:
+            with self._publisher_pool_lock:
+                if self._publisher_pool is None:
+                    self._publisher_pool = PublisherPool(
+                        settings.RABBITMQ_URL,
+                        self.exchange,
+                        size=settings.RABBITMQ_PUBLISHER_POOL_SIZE,
+                        acquire_timeout=settings.RABBITMQ_PUBLISH_ACQUIRE_TIMEOUT,
+                        health_check_interval=settings.RABBITMQ_HEALTH_CHECK_INTERVAL
+                    ).start()
+        return self._publisher_pool
+    
+    @property
+    def confirming_publisher(self) -> ConfirmingPublisher:
+        """Publisher used instead of the pool when publisher confirms are on"""
+        if self._confirming_publisher is None:
+            with self._publisher_pool_lock:
+                if self._confirming_publisher is None:
+                    self._confirming_publisher = ConfirmingPublisher(
+                        settings.RABBITMQ_URL,
+                        self.exchange,
+                        confirm_timeout=settings.RABBITMQ_CONFIRM_TIMEOUT,
+                        max_retries=settings.RABBITMQ_CONFIRM_MAX_RETRIES
+                    ).start()
+        return self._confirming_publisher
+    
+    @property
+    def publisher(self):
+        if settings.RABBITMQ_PUBLISHER_CONFIRMS:
+            return self.confirming_publisher
+        return self.publisher_pool
         
     def _connect(self):
         """Establish connection to RabbitMQ"""
@@ -40,28 +428,33 @@ class RabbitMQService:
             logger.error(f"Failed to connect to RabbitMQ: {str(e)}")
             raise
     
-    def publish_message(self, routing_key: str, message: Dict[str, Any]):
-        """Publish a message to RabbitMQ"""
+    def publish_message(self, routing_key: str, message: Dict[str, Any]) -> Optional[Future]:
+        """Publish a message to RabbitMQ.
+
+        With publisher confirms on, returns a future that resolves once the
+        broker has acknowledged the message; otherwise returns None.
+        """
         try:
-            if not self.connection or self.connection.is_closed:
-                self._connect()
-            
-            # Prepare message
-            message_body = json.dumps(message, default=str)
+            # Prepare message; events the Go queue-service reads stay JSON
+            codec_name = settings.RABBITMQ_EVENT_CODEC
+            if codec_name == 'msgpack' and routing_key in settings.RABBITMQ_JSON_ROUTING_KEYS:
+                codec_name = 'orjson'
+            message_body, content_type, headers = encode_event(message, codec_name)
             
-            # Publish message
-            self.channel.basic_publish(
-                exchange=self.exchange,
-                routing_key=routing_key,
-                body=message_body,
-                properties=pika.BasicProperties(
+            # Publish message on a pooled or confirming channel
+            confirmation = self.publisher.publish(
+                routing_key,
+                message_body,
+                pika.BasicProperties(
                     delivery_mode=2,  # Make message persistent
-                    content_type='application/json',
+                    content_type=content_type,
+                    headers=headers,
                     timestamp=int(datetime.now().timestamp() * 1000)
                 )
             )
             
             logger.info(f"Published message to {routing_key}: {message}")
+            return confirmation
             
         except Exception as e:
             logger.error(f"Failed to publish message: {str(e)}")
@@ -69,67 +462,41 @@ class RabbitMQService:
     
     def publish_order_created(self, order_data: Dict[str, Any]):
         """Publish order created event"""
-        message = {
-            'event_type': 'order_created',
-            'order_id': order_data['order_id'],
-            'user_id': order_data['user_id'],
-            'total_amount': float(order_data['total_amount']),
-            'items': order_data['items'],
-            'special_instructions': order_data.get('special_instructions'),
-            'timestamp': order_data['created_at']
-        }
-        self.publish_message(self.routing_keys['order_created'], message)
+        self.publish_message(*build_order_event('order_created', **order_data))
     
     def publish_order_status_changed(self, order_id: int, old_status: str, new_status: str, order_data: Dict[str, Any] = None):
         """Publish order status change event"""
-        message = {
-            'event_type': 'order_status_changed',
-            'order_id': order_id,
-            'old_status': old_status,
-            'new_status': new_status,
-            'timestamp': order_data.get('updated_at') if order_data else None
-        }
-        
-        # Add additional data based on status
-        if order_data:
-            message.update({
-                'user_id': order_data['user_id'],
-                'total_amount': float(order_data['total_amount']),
-                'queue_number': order_data.get('queue_number')
-            })
-        
-        # Route to appropriate routing key based on status
-        routing_key_map = {
-            'confirmed': self.routing_keys['order_confirmed'],
-            'preparing': self.routing_keys['order_preparing'],
-            'ready': self.routing_keys['order_ready'],
-            'completed': self.routing_keys['order_completed'],
-            'cancelled': self.routing_keys['order_cancelled']
-        }
-        
-        routing_key = routing_key_map.get(new_status, self.routing_keys['order_created'])
-        self.publish_message(routing_key, message)
+        self.publish_message(*build_order_event(
+            'order_status_changed',
+            order_id=order_id,
+            old_status=old_status,
+            new_status=new_status,
+            order_data=order_data
+        ))
     
     def publish_payment_initiated(self, order_id: int, user_id: int, amount: float, payment_id: str = None):
         """Publish payment initiated event"""
-        message = {
-            'event_type': 'payment_initiated',
-            'order_id': order_id,
-            'user_id': user_id,
-            'amount': float(amount),
-            'payment_id': payment_id,
-            'timestamp': None  # Will be set by timestamp property
-        }
-        self.publish_message(self.routing_keys['payment_initiated'], message)
+        self.publish_message(*build_order_event(
+            'payment_initiated',
+            order_id=order_id,
+            user_id=user_id,
+            amount=amount,
+            payment_id=payment_id
+        ))
     
-    def declare_queue(self, queue_name: str, routing_key: str) -> str:
-        """Declare a queue and bind it to the exchange"""
+    def declare_queue(self, queue_name: str, routing_key: str, durable: bool = True, exclusive: bool = False) -> str:
+        """Declare a queue and bind it to the exchange.
+
+        Pass an empty ``queue_name`` with ``exclusive=True`` for a
+        broker-named queue private to this connection.
+        """
         try:
             if not self.connection or self.connection.is_closed:
                 self._connect()
             
             # Declare queue
-            self.channel.queue_declare(queue=queue_name, durable=True)
+            result = self.channel.queue_declare(queue=queue_name, durable=durable, exclusive=exclusive)
+            queue_name = result.method.queue
             
             # Bind queue to exchange
             self.channel.queue_bind(
@@ -153,7 +520,7 @@ class RabbitMQService:
             
             def wrapper(ch, method, properties, body):
                 try:
-                    message = json.loads(body.decode('utf-8'))
+                    message = decode_event(body, properties.content_type, properties.headers)
                     callback(message)
                     ch.basic_ack(delivery_tag=method.delivery_tag)
                 except Exception as e:
@@ -172,6 +539,103 @@ class RabbitMQService:
             logger.error(f"Failed to set up consumer for {queue_name}: {str(e)}")
             raise
     
+    def setup_batch_consumer(self, queue_name: str, callback: Callable, batch_size: int = 100,
+                             max_wait: float = 0.2, prefetch_count: int = 200,
+                             before_batch: Optional[Callable] = None,
+                             transient_errors: Tuple[type, ...] = (), retry_delay: float = 1.0):
+        """Set up a consumer that hands messages to ``callback`` in batches.
+
+        A batch is flushed when ``batch_size`` messages have arrived or
+        ``max_wait`` seconds after its first message, then acked with one
+        ``multiple`` ack. If the batch callback raises, each message is
+        retried on its own so one bad message cannot hold back the rest;
+        a message that still fails is rejected without requeue. Errors in
+        ``transient_errors`` (e.g. a lost database connection) are not the
+        message's fault: the unprocessed messages are requeued and the
+        consumer pauses ``retry_delay`` seconds instead. ``before_batch`` runs
+        ahead of each flush. ``prefetch_count`` caps the unacked messages
+        held in this process. Messages are acked only after their callback
+        returns, so delivery is at-least-once and ``callback`` must be
+        idempotent.
+        """
+        try:
+            if not self.connection or self.connection.is_closed:
+                self._connect()
+            
+            self.channel.basic_qos(prefetch_count=max(prefetch_count, batch_size))
+            
+            batch = []
+            timer = [None]
+            
+            def flush():
+                if timer[0] is not None:
+                    self.connection.remove_timeout(timer[0])
+                    timer[0] = None
+                if not batch:
+                    return
+                deliveries = batch[:]
+                batch.clear()
+                
+                def requeue_rest(e):
+                    logger.error(f"Transient error processing messages from {queue_name}, requeueing: {str(e)}")
+                    self.channel.basic_nack(delivery_tag=deliveries[-1][0], multiple=True, requeue=True)
+                    time.sleep(retry_delay)
+                
+                try:
+                    if before_batch is not None:
+                        before_batch()
+                    callback([message for _, message in deliveries])
+                    self.channel.basic_ack(delivery_tag=deliveries[-1][0], multiple=True)
+                    return
+                except transient_errors as e:
+                    requeue_rest(e)
+                    return
+                except Exception as e:
+                    logger.error(f"Error processing batch of {len(deliveries)} messages from {queue_name}: {str(e)}")
+                
+                for delivery_tag, message in deliveries:
+                    try:
+                        callback([message])
+                        self.channel.basic_ack(delivery_tag=delivery_tag)
+                    except transient_errors as e:
+                        # Requeues this message and every later one in the batch
+                        requeue_rest(e)
+                        return
+                    except Exception as e:
+                        logger.error(f"Error processing message: {str(e)}")
+                        self.channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+            
+            def on_message(ch, method, properties, body):
+                try:
+                    message = decode_event(body, properties.content_type, properties.headers)
+                except Exception as e:
+                    logger.error(f"Undecodable message on {queue_name}: {str(e)}")
+                    flush()  # keep the tags before this one contiguous for the multiple ack
+                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    return
+                
+                batch.append((method.delivery_tag, message))
+                if len(batch) >= batch_size:
+                    flush()
+                elif timer[0] is None:
+                    timer[0] = self.connection.call_later(max_wait, on_timer)
+            
+            def on_timer():
+                timer[0] = None
+                flush()
+            
+            self.channel.basic_consume(
+                queue=queue_name,
+                on_message_callback=on_message
+            )
+            
+            self._consumers[queue_name] = callback
+            logger.info(f"Set up batch consumer for queue {queue_name}")
+            
+        except Exception as e:
+            logger.error(f"Failed to set up batch consumer for {queue_name}: {str(e)}")
+            raise
+    
     def start_consuming(self):
         """Start consuming messages (blocking)"""
         try:
@@ -187,6 +651,10 @@ class RabbitMQService:
     def close(self):
         """Close RabbitMQ connection"""
         try:
+            if self._publisher_pool:
+                self._publisher_pool.close()
+            if self._confirming_publisher:
+                self._confirming_publisher.close()
             if self.channel and not self.channel.is_closed:
                 self.channel.close()
             if self.connection and not self.connection.is_closed:
@@ -195,14 +663,75 @@ class RabbitMQService:
         except Exception as e:
             logger.error(f"Error closing RabbitMQ connection: {str(e)}")
 
+def build_order_event(event_type: str, **kwargs) -> Tuple[str, Dict[str, Any]]:
+    """Build the routing key and message body for an order event"""
+    routing_keys = settings.RABBITMQ_ROUTING_KEYS
+
+    if event_type == 'order_created':
+        message = {
+            'event_type': 'order_created',
+            'order_id': kwargs['order_id'],
+            'user_id': kwargs['user_id'],
+            'total_amount': float(kwargs['total_amount']),
+            'items': kwargs['items'],
+            'special_instructions': kwargs.get('special_instructions'),
+            'timestamp': kwargs['created_at']
+        }
+        return routing_keys['order_created'], message
+
+    if event_type == 'order_status_changed':
+        order_data = kwargs.get('order_data')
+        new_status = kwargs['new_status']
+        message = {
+            'event_type': 'order_status_changed',
+            'order_id': kwargs['order_id'],
+            'old_status': kwargs['old_status'],
+            'new_status': new_status,
+            'timestamp': order_data.get('updated_at') if order_data else None
+        }
+        
+        # Add additional data based on status
+        if order_data:
+            message.update({
+                'user_id': order_data['user_id'],
+                'total_amount': float(order_data['total_amount']),
+                'queue_number': order_data.get('queue_number')
+            })
+        
+        # Route to appropriate routing key based on status
+        routing_key_map = {
+            'confirmed': routing_keys['order_confirmed'],
+            'preparing': routing_keys['order_preparing'],
+            'ready': routing_keys['order_ready'],
+            'completed': routing_keys['order_completed'],
+            'cancelled': routing_keys['order_cancelled']
+        }
+        return routing_key_map.get(new_status, routing_keys['order_created']), message
+
+    if event_type == 'payment_initiated':
+        message = {
+            'event_type': 'payment_initiated',
+            'order_id': kwargs['order_id'],
+            'user_id': kwargs['user_id'],
+            'amount': float(kwargs['amount']),
+            'payment_id': kwargs.get('payment_id'),
+            'timestamp': None  # Will be set by timestamp property
+        }
+        return routing_keys['payment_initiated'], message
+
+    raise ValueError(f"Unknown event type: {event_type}")
+
 # Global instance
 _rabbitmq_service = None
+_rabbitmq_service_lock = threading.Lock()
 
 def get_rabbitmq_service() -> RabbitMQService:
     """Get or create RabbitMQ service instance"""
     global _rabbitmq_service
     if _rabbitmq_service is None:
-        _rabbitmq_service = RabbitMQService()
+        with _rabbitmq_service_lock:
+            if _rabbitmq_service is None:
+                _rabbitmq_service = RabbitMQService()
     return _rabbitmq_service
 
 def publish_order_event(event_type: str, **kwargs):
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2025-10-21 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_id', '-created_at', '-id'], name='orders_user_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2025-10-22 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_user_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_id', 'status', '-created_at', '-id'], name='orders_user_status_created_idx'),
+        ),
+        # Every user_id lookup is now served by a composite index prefix
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_user_id_4e08b8_idx',
+        ),
+    ]
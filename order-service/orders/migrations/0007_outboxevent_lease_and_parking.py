@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2025-10-27 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='parked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
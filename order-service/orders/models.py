@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 class Order(models.Model):
@@ -10,6 +11,16 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # status -> statuses an order may move to from it
+    STATUS_TRANSITIONS = {
+        'placed': {'confirmed', 'cancelled'},
+        'confirmed': {'preparing', 'cancelled'},
+        'preparing': {'ready', 'cancelled'},
+        'ready': {'completed'},
+        'completed': set(),
+        'cancelled': set(),
+    }
+    
     user_id = models.IntegerField()
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='placed')
@@ -21,13 +32,22 @@ class Order(models.Model):
     
     class Meta:
         db_table = 'orders'
+        # Shaped to OrderService's queries; the query plan suite in
+        # orders/test_query_plans.py guards them against regressions
         indexes = [
-            models.Index(fields=['user_id']),
             models.Index(fields=['status']),
+            # A user's history newest first, and its keyset pagination
+            models.Index(fields=['user_id', '-created_at', '-id'], name='orders_user_created_id_idx'),
+            # A user's orders in one status, or a few (active orders), newest first
+            models.Index(fields=['user_id', 'status', '-created_at', '-id'], name='orders_user_status_created_idx'),
         ]
     
     def __str__(self):
         return f"Order {self.id} - {self.status}"
+    
+    @classmethod
+    def can_transition(cls, old_status, new_status):
+        return new_status in cls.STATUS_TRANSITIONS.get(old_status, ())
 
 
 class OrderItem(models.Model):
@@ -50,3 +70,21 @@ class OrderItem(models.Model):
     @property
     def total_price(self):
         return self.quantity * self.price
+
+
+class OutboxEvent(models.Model):
+    """Broker event written in the same transaction as the change it describes"""
+    routing_key = models.CharField(max_length=100)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    attempts = models.IntegerField(default=0)
+    # Set while a relay is publishing the event
+    locked_until = models.DateTimeField(null=True, blank=True)
+    # Set once the event has failed OUTBOX_MAX_ATTEMPTS times; no longer relayed
+    parked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'order_outbox'
+    
+    def __str__(self):
+        return f"Outbox {self.id} - {self.routing_key}"
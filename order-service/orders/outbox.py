@@ -0,0 +1,135 @@
+import time
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from typing import Dict, Any, Iterable, List, Tuple
+from .models import OutboxEvent
+from .message_broker import build_order_event, get_rabbitmq_service
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_order_events(events: Iterable[Tuple[str, Dict[str, Any]]]):
+    """Write order events to the outbox with a single INSERT.
+
+    Call inside the transaction that makes the change; the relay publishes
+    the events only once that transaction has committed.
+    """
+    outbox_events = []
+    for event_type, kwargs in events:
+        routing_key, message = build_order_event(event_type, **kwargs)
+        outbox_events.append(OutboxEvent(routing_key=routing_key, payload=message))
+
+    return OutboxEvent.objects.bulk_create(outbox_events)
+
+
+def enqueue_order_event(event_type: str, **kwargs):
+    """Write a single order event to the outbox"""
+    return enqueue_order_events([(event_type, kwargs)])[0]
+
+
+class OutboxRelay:
+    """Drains the outbox table to RabbitMQ in id order, one batch at a time.
+
+    A batch is claimed with a short ``SKIP LOCKED`` transaction that leases
+    the rows to this relay, so several relays can share the table and no
+    row lock is held while waiting on the broker. Events are deleted only
+    up to the first one that was not confirmed; the rest of the batch is
+    released and sent again, after it, on the next pass. Delivery is
+    therefore at least once. An event that fails ``OUTBOX_MAX_ATTEMPTS``
+    times is parked so it no longer holds up the events behind it.
+    """
+
+    def __init__(self, batch_size: int = None, poll_interval: float = None):
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        self.lease_timeout = settings.OUTBOX_LEASE_TIMEOUT
+        self.max_attempts = settings.OUTBOX_MAX_ATTEMPTS
+        # Long enough for the publisher to exhaust its own confirm retries
+        self.confirm_wait = settings.RABBITMQ_CONFIRM_TIMEOUT * (settings.RABBITMQ_CONFIRM_MAX_RETRIES + 1)
+        self._running = False
+
+    def claim_batch(self) -> List[OutboxEvent]:
+        """Lease the next batch of pending events to this relay"""
+        now = timezone.now()
+        with transaction.atomic():
+            # SKIP LOCKED lets several relay processes claim at the same time
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now), parked_at__isnull=True)
+                .order_by('id')[:self.batch_size]
+            )
+            if events:
+                OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+                    locked_until=now + timedelta(seconds=self.lease_timeout)
+                )
+        return events
+
+    def relay_batch(self) -> int:
+        """Publish one batch of pending events; returns how many were published"""
+        events = self.claim_batch()
+        if not events:
+            return 0
+
+        service = get_rabbitmq_service()
+        published = []
+        failed = None
+        for event in events:
+            try:
+                published.append((event, service.publish_message(event.routing_key, event.payload)))
+            except Exception as e:
+                # Stop here so later events are not published ahead of this one
+                logger.error(f"Outbox relay failed on event {event.id}: {str(e)}")
+                failed = event
+                break
+
+        # With publisher confirms the whole batch is in flight at once; events
+        # leave the outbox only up to the first one the broker did not confirm
+        confirmed_ids = set()
+        for event, confirmation in published:
+            try:
+                if confirmation is not None:
+                    confirmation.result(timeout=self.confirm_wait)
+            except Exception as e:
+                logger.error(f"Outbox event {event.id} not confirmed: {str(e)}")
+                failed = event
+                break
+            confirmed_ids.add(event.id)
+
+        with transaction.atomic():
+            OutboxEvent.objects.filter(id__in=confirmed_ids).delete()
+            if failed is not None:
+                self._record_failure(failed)
+            # Give the rest of the batch back for the next pass
+            OutboxEvent.objects.filter(
+                id__in=[event.id for event in events if event.id not in confirmed_ids]
+            ).update(locked_until=None)
+        return len(confirmed_ids)
+
+    def _record_failure(self, event: OutboxEvent):
+        if event.attempts + 1 >= self.max_attempts:
+            logger.error(f"Parking outbox event {event.id} after {event.attempts + 1} failed attempts")
+            OutboxEvent.objects.filter(id=event.id).update(attempts=F('attempts') + 1, parked_at=timezone.now())
+        else:
+            OutboxEvent.objects.filter(id=event.id).update(attempts=F('attempts') + 1)
+
+    def run(self):
+        """Relay events until stopped (blocking)"""
+        self._running = True
+        logger.info(f"Outbox relay started (batch size {self.batch_size})")
+        while self._running:
+            try:
+                published = self.relay_batch()
+            except Exception as e:
+                logger.error(f"Outbox relay error: {str(e)}")
+                published = 0
+
+            # Keep draining while there is a backlog; otherwise poll
+            if published < self.batch_size:
+                time.sleep(self.poll_interval)
+
+    def stop(self):
+        self._running = False
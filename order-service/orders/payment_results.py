@@ -0,0 +1,109 @@
+import logging
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Case, When, Value, F
+from django.utils import timezone
+from typing import Dict, Any, List
+from .models import Order
+from .outbox import enqueue_order_events
+from .message_broker import get_rabbitmq_service
+
+logger = logging.getLogger(__name__)
+
+# payment_status -> order status it moves a placed order to
+PAYMENT_OUTCOMES = {
+    'success': 'confirmed',
+    'failed': 'cancelled',
+}
+
+
+def apply_payment_results(messages: List[Dict[str, Any]]) -> int:
+    """Apply a batch of payment result events in one transaction.
+
+    Only orders still ``placed`` are updated, so a redelivered or replayed
+    result is a no-op. Each order moves with one bulk UPDATE per outcome,
+    and its status-changed event goes to the outbox in the same transaction.
+    Returns the number of orders updated.
+    """
+    results = {}
+    for message in messages:
+        order_status = PAYMENT_OUTCOMES.get(message.get('payment_status'))
+        if order_status is None or 'order_id' not in message:
+            logger.warning(f"Ignoring payment result: {message}")
+            continue
+        # Later results for the same order win
+        results[int(message['order_id'])] = (order_status, message.get('payment_id'))
+
+    if not results:
+        return 0
+
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(id__in=results, status='placed')
+            .values('id', 'user_id', 'total_amount', 'queue_number')
+        )
+        if not orders:
+            return 0
+
+        now = timezone.now()
+        for order_status in set(PAYMENT_OUTCOMES.values()):
+            ids = [order['id'] for order in orders if results[order['id']][0] == order_status]
+            if not ids:
+                continue
+            Order.objects.filter(id__in=ids).update(
+                status=order_status,
+                payment_id=Case(
+                    *[
+                        When(id=order_id, then=Value(results[order_id][1]))
+                        for order_id in ids if results[order_id][1] is not None
+                    ],
+                    default=F('payment_id')
+                ),
+                updated_at=now
+            )
+
+        enqueue_order_events([
+            ('order_status_changed', {
+                'order_id': order['id'],
+                'old_status': 'placed',
+                'new_status': results[order['id']][0],
+                'order_data': {
+                    'order_id': order['id'],
+                    'user_id': order['user_id'],
+                    'total_amount': order['total_amount'],
+                    'queue_number': order['queue_number'],
+                    'updated_at': now.isoformat(),
+                },
+            })
+            for order in orders
+        ])
+
+        cancelled = [order['id'] for order in orders if results[order['id']][0] == 'cancelled']
+        if cancelled:
+            from .services import OrderService
+            transaction.on_commit(lambda: OrderService._remove_many_from_queue(cancelled))
+
+    logger.info(f"Applied {len(orders)} payment result(s) out of {len(messages)} message(s)")
+    return len(orders)
+
+
+def consume_payment_results(batch_size: int = None, max_wait: float = None, prefetch_count: int = None):
+    """Consume payment.success / payment.failed events until interrupted"""
+    service = get_rabbitmq_service()
+    queue_name = settings.PAYMENT_RESULTS_QUEUE
+    for routing_key in ('payment_success', 'payment_failed'):
+        service.declare_queue(queue_name, settings.RABBITMQ_ROUTING_KEYS[routing_key])
+
+    service.setup_batch_consumer(
+        queue_name,
+        apply_payment_results,
+        batch_size=batch_size or settings.PAYMENT_RESULTS_BATCH_SIZE,
+        max_wait=max_wait or settings.PAYMENT_RESULTS_BATCH_WAIT,
+        prefetch_count=prefetch_count or settings.PAYMENT_RESULTS_PREFETCH,
+        # A long-lived consumer must drop connections MySQL has timed out
+        before_batch=close_old_connections,
+        # Database outages requeue results rather than dropping them
+        transient_errors=(DatabaseError,)
+    )
+    service.start_consuming()
@@ -1,3 +1,9 @@
+import json
+import base64
+import binascii
+from collections import defaultdict
+from datetime import datetime
+from django.conf import settings
 from rest_framework import serializers
 from .models import Order, OrderItem
 
@@ -45,6 +51,98 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
 
 
+# Field objects reused by serialize_order_list so its output matches
+# OrderSerializer exactly (timezone handling, decimal quantization)
+_datetime_field = serializers.DateTimeField()
+_decimal_field = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=False)
+
+ORDER_LIST_FIELDS = [field for field in OrderSerializer.Meta.fields if field != "items"]
+ORDER_ITEM_LIST_FIELDS = ["id", "menu_item_id", "item_name", "quantity", "price", "special_instructions"]
+
+
+def _order_value_fields(fields):
+    """Columns to read for a projection; id and created_at are always needed"""
+    if fields is None:
+        return ORDER_LIST_FIELDS
+    unknown = set(fields) - set(OrderSerializer.Meta.fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [field for field in ORDER_LIST_FIELDS if field in fields or field in ("id", "created_at")]
+
+
+def _render_orders(orders, fields=None):
+    """Format values rows like OrderSerializer and apply the projection"""
+    if not orders:
+        return []
+
+    with_items = fields is None or "items" in fields
+    items_by_order = defaultdict(list)
+    if with_items:
+        items = OrderItem.objects.filter(
+            order_id__in=[order["id"] for order in orders]
+        ).order_by("id").values("order_id", *ORDER_ITEM_LIST_FIELDS)
+
+        for item in items:
+            order_id = item.pop("order_id")
+            price = item["price"]
+            item["price"] = _decimal_field.to_representation(price)
+            item["total_price"] = _decimal_field.to_representation(item["quantity"] * price)
+            items_by_order[order_id].append(item)
+
+    rendered = []
+    for order in orders:
+        if "total_amount" in order:
+            order["total_amount"] = _decimal_field.to_representation(order["total_amount"])
+        if "updated_at" in order:
+            order["updated_at"] = _datetime_field.to_representation(order["updated_at"])
+        order["created_at"] = _datetime_field.to_representation(order["created_at"])
+        if with_items:
+            order["items"] = items_by_order[order["id"]]
+        if fields is not None:
+            order = {field: value for field, value in order.items() if field in fields}
+        rendered.append(order)
+
+    return rendered
+
+
+def serialize_order_list(queryset, fields=None):
+    """Render orders exactly like OrderSerializer(many=True) in two queries.
+
+    Reads plain values rows for the orders and for all of their items at
+    once, skipping model instantiation and nested serializer overhead.
+    ``fields`` optionally projects the output to a subset of fields.
+    """
+    orders = list(queryset.prefetch_related(None).values(*_order_value_fields(fields)))
+    return _render_orders(orders, fields)
+
+
+def serialize_order_page(queryset, limit, fields=None):
+    """Render one keyset page; returns the orders and the next page's cursor"""
+    orders = list(queryset.prefetch_related(None).values(*_order_value_fields(fields))[:limit + 1])
+
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_order_cursor(orders[-1]["created_at"], orders[-1]["id"])
+
+    return _render_orders(orders, fields), next_cursor
+
+
+def encode_order_cursor(created_at, order_id):
+    """Opaque cursor for the (created_at, id) position of the last row"""
+    raw = json.dumps([created_at.isoformat(), order_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_order_cursor(cursor):
+    """Inverse of encode_order_cursor; raises ValueError on a bad cursor"""
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
 class OrderItemInputSerializer(serializers.Serializer):
     menu_item_id = serializers.CharField()
     quantity = serializers.IntegerField(min_value=1)
@@ -59,3 +157,16 @@ class CreateOrderSerializer(serializers.Serializer):
 
 class UpdateOrderStatusSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class OrderStatusTransitionSerializer(serializers.Serializer):
+    order_id = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class BulkUpdateOrderStatusSerializer(serializers.Serializer):
+    transitions = OrderStatusTransitionSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.ORDER_BULK_MAX_TRANSITIONS,
+    )
@@ -1,106 +1,265 @@
+import asyncio
+import aiohttp
 import requests
 import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from .models import Order, OrderItem
-from .message_broker import publish_order_event
+from .menu_cache import get_menu_cache
+from .service_client import CircuitOpenError, get_service_client
+from .outbox import enqueue_order_event, enqueue_order_events
 
 logger = logging.getLogger(__name__)
 
+# Worker pool for per-item menu-service lookups
+_menu_executor = None
+_menu_batch_supported = True
+_menu_lock = threading.Lock()
+
+
+def get_menu_executor() -> ThreadPoolExecutor:
+    """Get or create the bounded worker pool used for per-item menu lookups"""
+    global _menu_executor
+    if _menu_executor is None:
+        with _menu_lock:
+            if _menu_executor is None:
+                _menu_executor = ThreadPoolExecutor(
+                    max_workers=settings.MENU_FETCH_CONCURRENCY,
+                    thread_name_prefix='menu-fetch'
+                )
+    return _menu_executor
+
+
+class StatusTransitionError(Exception):
+    """Raised when an order cannot move to the requested status from its current one"""
+
 
 class OrderService:
     @staticmethod
     def create_order(user_id, items_data, special_instructions=None):
         """Create a new order with items"""
         try:
-            with transaction.atomic():
-                # Fetch menu item details and calculate total
-                enriched_items = []
-                total_amount = 0
+            # Resolve every menu item up front, before any DB connection is held
+            menu_items = OrderService._fetch_menu_items(
+                [item_data['menu_item_id'] for item_data in items_data]
+            )
+
+            order = OrderService._save_order(user_id, items_data, menu_items, special_instructions)
+
+            # Add order to queue only after the order is durable
+            transaction.on_commit(lambda: OrderService._add_to_queue(order.id, user_id))
+
+            return order
                 
-                for item_data in items_data:
-                    menu_item = OrderService._fetch_menu_item(item_data['menu_item_id'])
-                    if not menu_item:
-                        raise ValueError(f"Menu item {item_data['menu_item_id']} not found")
-                    
-                    enriched_item = {
+        except Exception as e:
+            logger.error(f"Failed to create order: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def acreate_order(user_id, items_data, special_instructions=None):
+        """Async ``create_order``: menu and queue calls run on the event loop.
+
+        The order rows are written in one transaction on a worker thread,
+        since the async ORM has no transactions; the queue-service call
+        follows once that has committed.
+        """
+        try:
+            menu_items = await OrderService._afetch_menu_items(
+                [item_data['menu_item_id'] for item_data in items_data]
+            )
+
+            order = await sync_to_async(OrderService._save_order)(
+                user_id, items_data, menu_items, special_instructions
+            )
+
+            await OrderService._aadd_to_queue(order.id, user_id)
+            return order
+
+        except Exception as e:
+            logger.error(f"Failed to create order: {str(e)}")
+            raise
+    
+    @staticmethod
+    def _save_order(user_id, items_data, menu_items, special_instructions):
+        """Write an order, its items and its outbox events in one transaction"""
+        with transaction.atomic():
+            # Enrich items with menu details and calculate total
+            enriched_items = []
+            total_amount = 0
+            
+            for item_data, menu_item in zip(items_data, menu_items):
+                enriched_item = {
+                    'menu_item_id': item_data['menu_item_id'],
+                    'item_name': menu_item['name'],
+                    'quantity': item_data['quantity'],
+                    'price': menu_item['price'],
+                    'special_instructions': item_data.get('special_instructions', '')
+                }
+                enriched_items.append(enriched_item)
+                total_amount += menu_item['price'] * item_data['quantity']
+            
+            # Create order
+            order = Order.objects.create(
+                user_id=user_id,
+                total_amount=total_amount,
+                status='placed',
+                special_instructions=special_instructions
+            )
+            
+            # Create order items
+            order_items = []
+            for item_data in enriched_items:
+                order_item = OrderItem(
+                    order=order,
+                    menu_item_id=item_data['menu_item_id'],
+                    item_name=item_data['item_name'],
+                    quantity=item_data['quantity'],
+                    price=item_data['price'],
+                    special_instructions=item_data['special_instructions']
+                )
+                order_items.append(order_item)
+            
+            OrderItem.objects.bulk_create(order_items)
+            
+            # Order event payload for downstream services
+            order_data = {
+                'order_id': order.id,
+                'user_id': order.user_id,
+                'total_amount': order.total_amount,
+                'items': [
+                    {
                         'menu_item_id': item_data['menu_item_id'],
-                        'item_name': menu_item['name'],
+                        'item_name': item_data['item_name'],
                         'quantity': item_data['quantity'],
-                        'price': menu_item['price'],
-                        'special_instructions': item_data.get('special_instructions', '')
+                        'price': item_data['price'],
+                        'special_instructions': item_data.get('special_instructions')
                     }
-                    enriched_items.append(enriched_item)
-                    total_amount += menu_item['price'] * item_data['quantity']
-                
-                # Create order
-                order = Order.objects.create(
-                    user_id=user_id,
-                    total_amount=total_amount,
-                    status='placed',
-                    special_instructions=special_instructions
-                )
-                
-                # Create order items
-                order_items = []
-                for item_data in enriched_items:
-                    order_item = OrderItem(
-                        order=order,
-                        menu_item_id=item_data['menu_item_id'],
-                        item_name=item_data['item_name'],
-                        quantity=item_data['quantity'],
-                        price=item_data['price'],
-                        special_instructions=item_data['special_instructions']
-                    )
-                    order_items.append(order_item)
-                
-                OrderItem.objects.bulk_create(order_items)
-                
-                # Publish order created event asynchronously
-                order_data = {
+                    for item_data in enriched_items
+                ],
+                'special_instructions': order.special_instructions,
+                'created_at': order.created_at.isoformat()
+            }
+            
+            # Record order created and payment initiation events in the
+            # outbox; the relay publishes them once this commits
+            enqueue_order_events([
+                ('order_created', order_data),
+                ('payment_initiated', {
                     'order_id': order.id,
                     'user_id': order.user_id,
-                    'total_amount': order.total_amount,
-                    'items': [
-                        {
-                            'menu_item_id': item_data['menu_item_id'],
-                            'item_name': item_data['item_name'],
-                            'quantity': item_data['quantity'],
-                            'price': item_data['price'],
-                            'special_instructions': item_data.get('special_instructions')
-                        }
-                        for item_data in enriched_items
-                    ],
-                    'special_instructions': order.special_instructions,
-                    'created_at': order.created_at.isoformat()
-                }
-                
-                # Add order to queue immediately
-                OrderService._add_to_queue(order.id, user_id)
-
-                # Publish order created event
-                publish_order_event('order_created', **order_data)
-
-                # Initiate payment asynchronously
-                publish_order_event(
-                    'payment_initiated',
-                    order_id=order.id,
-                    user_id=order.user_id,
-                    amount=order.total_amount
-                )
+                    'amount': order.total_amount
+                }),
+            ])
 
-                return order
-                
-        except Exception as e:
-            logger.error(f"Failed to create order: {str(e)}")
-            raise
+        return order
     
     @staticmethod
-    def _fetch_menu_item(menu_item_id):
+    def _fetch_menu_items(menu_item_ids):
+        """Fetch menu item details for a whole cart, returned in cart order.
+
+        Uses menu-service's batch endpoint when available and falls back to
+        bounded concurrent single-item lookups. Misses are claimed in the
+        menu cache first, so concurrent carts wanting the same cold item
+        send one request for it and the others wait for that result. Raises
+        ValueError as soon as any item cannot be resolved.
+        """
+        unique_ids = list(dict.fromkeys(str(menu_item_id) for menu_item_id in menu_item_ids))
+
+        cache = get_menu_cache()
+        menu_items = cache.get_many(unique_ids, OrderService._load_menu_item)
+        missing_ids = [menu_item_id for menu_item_id in unique_ids if menu_item_id not in menu_items]
+
+        if missing_ids:
+            owned, waiting = cache.claim_loads(missing_ids)
+            fetched = {}
+            try:
+                if owned:
+                    fetched = OrderService._fetch_menu_items_batch(owned)
+                    if fetched is None:
+                        fetched = OrderService._fetch_menu_items_concurrently(owned)
+            finally:
+                cache.finish_loads(owned, fetched or {})
+            menu_items.update(fetched)
+            if waiting:
+                menu_items.update(cache.wait_for(waiting))
+
+        for menu_item_id in unique_ids:
+            if menu_item_id not in menu_items:
+                raise ValueError(f"Menu item {menu_item_id} not found")
+
+        return [menu_items[str(menu_item_id)] for menu_item_id in menu_item_ids]
+
+    @staticmethod
+    def _fetch_menu_items_batch(menu_item_ids):
+        """Fetch menu items in one request, or None if batching is unavailable"""
+        global _menu_batch_supported
+        if not _menu_batch_supported or len(menu_item_ids) < 2:
+            return None
+
+        try:
+            # A batch lookup is a read, so it is safe to retry
+            response = get_service_client('menu').post(
+                '/api/menu/items/batch',
+                endpoint='batch',
+                retry=True,
+                json={'ids': menu_item_ids}
+            )
+
+            if response.status_code == 200:
+                return {
+                    str(menu_item.get('_id', menu_item.get('id'))): menu_item
+                    for menu_item in response.json()
+                }
+            if response.status_code in (404, 405):
+                # Older menu-service without the batch route; stop asking
+                logger.info("Menu service has no batch endpoint, using per-item lookups")
+                _menu_batch_supported = False
+            else:
+                logger.error(f"Menu service batch returned {response.status_code}: {response.text}")
+            return None
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to batch fetch from menu service: {str(e)}")
+            return None
+
+    @staticmethod
+    def _fetch_menu_items_concurrently(menu_item_ids):
+        """Fetch menu items one per request over a bounded worker pool"""
+        if len(menu_item_ids) == 1:
+            menu_item = OrderService._load_menu_item(menu_item_ids[0])
+            return {menu_item_ids[0]: menu_item} if menu_item else {}
+
+        executor = get_menu_executor()
+        futures = {
+            executor.submit(OrderService._load_menu_item, menu_item_id): menu_item_id
+            for menu_item_id in menu_item_ids
+        }
+
+        menu_items = {}
+        try:
+            for future in as_completed(futures):
+                menu_item = future.result()
+                if not menu_item:
+                    # Fail fast without waiting on the rest of the cart
+                    raise ValueError(f"Menu item {futures[future]} not found")
+                menu_items[futures[future]] = menu_item
+        finally:
+            for future in futures:
+                future.cancel()
+
+        return menu_items
+
+    @staticmethod
+    def _load_menu_item(menu_item_id):
         """Fetch menu item details from Menu Service"""
         try:
-            menu_url = f"{settings.MENU_SERVICE_URL}/api/menu/items/{menu_item_id}"
-            response = requests.get(menu_url, timeout=5)
+            response = get_service_client('menu').get(f"/api/menu/items/{menu_item_id}", endpoint='item')
             
             if response.status_code == 200:
                 return response.json()
@@ -112,17 +271,95 @@ class OrderService:
             logger.error(f"Failed to connect to menu service: {str(e)}")
             return None
     
+    @staticmethod
+    async def _afetch_menu_items(menu_item_ids):
+        """Async ``_fetch_menu_items``; per-item fallbacks run concurrently on the loop"""
+        unique_ids = list(dict.fromkeys(str(menu_item_id) for menu_item_id in menu_item_ids))
+
+        cache = get_menu_cache()
+        menu_items = cache.get_many(unique_ids, OrderService._load_menu_item)
+        missing_ids = [menu_item_id for menu_item_id in unique_ids if menu_item_id not in menu_items]
+
+        if missing_ids:
+            owned, waiting = cache.claim_loads(missing_ids)
+            fetched = {}
+            try:
+                if owned:
+                    fetched = await OrderService._afetch_menu_items_batch(owned)
+                    if fetched is None:
+                        loaded = await asyncio.gather(*(
+                            OrderService._aload_menu_item(menu_item_id) for menu_item_id in owned
+                        ))
+                        fetched = {
+                            menu_item_id: menu_item
+                            for menu_item_id, menu_item in zip(owned, loaded) if menu_item
+                        }
+            finally:
+                cache.finish_loads(owned, fetched or {})
+            menu_items.update(fetched)
+            if waiting:
+                # Other requests' loads may be on other threads; wait off the loop
+                menu_items.update(await sync_to_async(cache.wait_for, thread_sensitive=False)(waiting))
+
+        for menu_item_id in unique_ids:
+            if menu_item_id not in menu_items:
+                raise ValueError(f"Menu item {menu_item_id} not found")
+
+        return [menu_items[str(menu_item_id)] for menu_item_id in menu_item_ids]
+
+    @staticmethod
+    async def _afetch_menu_items_batch(menu_item_ids):
+        """Async ``_fetch_menu_items_batch``"""
+        global _menu_batch_supported
+        if not _menu_batch_supported or len(menu_item_ids) < 2:
+            return None
+
+        try:
+            status_code, body = await get_service_client('menu').arequest(
+                'POST', '/api/menu/items/batch', endpoint='batch', retry=True, json={'ids': menu_item_ids}
+            )
+            if status_code == 200:
+                return {
+                    str(menu_item.get('_id', menu_item.get('id'))): menu_item
+                    for menu_item in body
+                }
+            if status_code in (404, 405):
+                logger.info("Menu service has no batch endpoint, using per-item lookups")
+                _menu_batch_supported = False
+            else:
+                logger.error(f"Menu service batch returned {status_code}: {body}")
+            return None
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            logger.error(f"Failed to batch fetch from menu service: {str(e)}")
+            return None
+
+    @staticmethod
+    async def _aload_menu_item(menu_item_id):
+        """Async ``_load_menu_item``"""
+        try:
+            status_code, body = await get_service_client('menu').arequest(
+                'GET', f"/api/menu/items/{menu_item_id}", endpoint='item'
+            )
+            if status_code == 200:
+                return body
+            logger.error(f"Menu service returned {status_code}: {body}")
+            return None
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            logger.error(f"Failed to connect to menu service: {str(e)}")
+            return None
+    
     @staticmethod
     def _add_to_queue(order_id, user_id):
         """Add order to queue service"""
         try:
-            queue_url = f"{settings.QUEUE_SERVICE_URL}/api/queue/"
             payload = {
                 'order_id': order_id,
                 'user_id': user_id
             }
             
-            response = requests.post(queue_url, json=payload, timeout=5)
+            response = get_service_client('queue').post('/api/queue/', endpoint='add', json=payload)
             if response.status_code == 201:
                 return response.json()
             else:
@@ -133,18 +370,41 @@ class OrderService:
             logger.error(f"Failed to connect to queue service: {str(e)}")
             return None
     
+    @staticmethod
+    async def _aadd_to_queue(order_id, user_id):
+        """Async ``_add_to_queue``"""
+        try:
+            payload = {
+                'order_id': order_id,
+                'user_id': user_id
+            }
+            
+            status_code, body = await get_service_client('queue').arequest(
+                'POST', '/api/queue/', endpoint='add', json=payload
+            )
+            if status_code == 201:
+                return body
+            logger.error(f"Queue service returned {status_code}: {body}")
+            return None
+                
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            logger.error(f"Failed to connect to queue service: {str(e)}")
+            return None
+    
     @staticmethod
     def _initiate_payment(order_id, user_id, amount):
         """Initiate payment for order"""
         try:
-            payment_url = f"{settings.PAYMENT_SERVICE_URL}/api/payments/initiate"
             payload = {
                 'order_id': order_id,
                 'user_id': user_id,
                 'amount': float(amount)
             }
             
-            response = requests.post(payment_url, json=payload, timeout=5)
+            # payment-service dedupes initiations per order, so retrying is safe
+            response = get_service_client('payment').post(
+                '/api/payments/initiate', endpoint='initiate', retry=True, json=payload
+            )
             if response.status_code == 201:
                 return response.json()
             else:
@@ -157,50 +417,144 @@ class OrderService:
     
     @staticmethod
     def update_order_status(order_id, new_status):
-        """Update order status and publish async events"""
+        """Move an order along the status graph.
+
+        The current status is read without a lock and checked against
+        ``Order.STATUS_TRANSITIONS``, so an illegal transition is rejected
+        before any write. The move itself is one compare-and-set UPDATE of
+        ``status``/``updated_at`` that only matches while the order is still
+        in the status that was read; if a concurrent update got there first
+        the transition is stale and rejected. The status-changed event goes
+        to the outbox in the same transaction, and a finished order leaves
+        the queue after commit. Repeating the current status is a no-op.
+        """
         try:
             order = Order.objects.get(id=order_id)
-            old_status = order.status
-            order.status = new_status
-            order.save()
-            
-            logger.info(f"Order {order_id} status updated from {old_status} to {new_status}")
-            
-            # Prepare order data for messaging
-            order_data = {
-                'order_id': order.id,
-                'user_id': order.user_id,
-                'total_amount': order.total_amount,
-                'queue_number': order.queue_number,
-                'updated_at': order.updated_at.isoformat()
-            }
+        except Order.DoesNotExist:
+            raise ValueError(f"Order {order_id} not found")
+        
+        old_status = order.status
+        if old_status == new_status:
+            return order
+        if not Order.can_transition(old_status, new_status):
+            raise StatusTransitionError(f"Order {order_id} cannot move from {old_status} to {new_status}")
+        
+        order.status = new_status
+        order.updated_at = timezone.now()
+        with transaction.atomic():
+            updated = Order.objects.filter(id=order_id, status=old_status).update(
+                status=new_status,
+                updated_at=order.updated_at
+            )
+            if not updated:
+                raise StatusTransitionError(f"Order {order_id} is no longer {old_status}")
             
-            # Publish order status change event
-            publish_order_event(
+            enqueue_order_event(
                 'order_status_changed',
                 order_id=order_id,
                 old_status=old_status,
                 new_status=new_status,
-                order_data=order_data
+                order_data={
+                    'order_id': order.id,
+                    'user_id': order.user_id,
+                    'total_amount': order.total_amount,
+                    'queue_number': order.queue_number,
+                    'updated_at': order.updated_at.isoformat()
+                }
             )
             
-            # Handle specific status transitions asynchronously
-            if new_status == 'completed' or new_status == 'cancelled':
-                # When order is completed or cancelled, remove from queue
-                OrderService._remove_from_queue(order_id)
-                logger.info(f"Order {order_id} {new_status} - removed from queue")
+            if new_status in ('completed', 'cancelled'):
+                transaction.on_commit(lambda: OrderService._remove_from_queue(order_id))
+        
+        logger.info(f"Order {order_id} status updated from {old_status} to {new_status}")
+        return order
+    
+    @staticmethod
+    def bulk_update_order_status(transitions):
+        """Apply many (order_id, new_status) transitions in one transaction.
+
+        Every order must exist and every transition must be legal under
+        ``Order.STATUS_TRANSITIONS``, or nothing changes. Orders already in
+        their target status are left alone. The rest move with one UPDATE per
+        target status, their status-changed events go to the outbox as one
+        batch, and finished orders leave the queue in one call after commit.
+        Returns ``{'order_id', 'old_status', 'status'}`` for each moved order.
+        """
+        # Later transitions for the same order win
+        targets = {order_id: new_status for order_id, new_status in transitions}
+        
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update()
+                .filter(id__in=targets)
+                .values('id', 'user_id', 'total_amount', 'queue_number', 'status')
+            )
+            missing = set(targets) - {order['id'] for order in orders}
+            if missing:
+                raise ValueError(f"Orders not found: {sorted(missing)}")
             
-            return order
+            orders = [order for order in orders if order['status'] != targets[order['id']]]
+            illegal = [
+                f"{order['id']}: {order['status']} -> {targets[order['id']]}"
+                for order in orders if not Order.can_transition(order['status'], targets[order['id']])
+            ]
+            if illegal:
+                raise StatusTransitionError(f"Illegal status transitions: {', '.join(illegal)}")
+            if not orders:
+                return []
             
-        except Order.DoesNotExist:
-            raise ValueError(f"Order {order_id} not found")
+            now = timezone.now()
+            by_status = defaultdict(list)
+            for order in orders:
+                by_status[targets[order['id']]].append(order['id'])
+            for new_status, order_ids in by_status.items():
+                Order.objects.filter(id__in=order_ids).update(status=new_status, updated_at=now)
+            
+            enqueue_order_events([
+                ('order_status_changed', {
+                    'order_id': order['id'],
+                    'old_status': order['status'],
+                    'new_status': targets[order['id']],
+                    'order_data': {
+                        'order_id': order['id'],
+                        'user_id': order['user_id'],
+                        'total_amount': order['total_amount'],
+                        'queue_number': order['queue_number'],
+                        'updated_at': now.isoformat(),
+                    },
+                })
+                for order in orders
+            ])
+            
+            finished = by_status.get('completed', []) + by_status.get('cancelled', [])
+            if finished:
+                transaction.on_commit(lambda: OrderService._remove_many_from_queue(finished))
+        
+        logger.info(f"Bulk updated status of {len(orders)} orders")
+        return [
+            {'order_id': order['id'], 'old_status': order['status'], 'status': targets[order['id']]}
+            for order in orders
+        ]
+    
+    @staticmethod
+    def _remove_many_from_queue(order_ids):
+        """Remove several orders from the queue in one request"""
+        try:
+            response = get_service_client('queue').post(
+                '/api/queue/remove', endpoint='remove', retry=True, json={'order_ids': order_ids}
+            )
+            
+            if response.status_code != 200:
+                logger.error(f"Failed to remove orders from queue: {response.status_code} {response.text}")
+                
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to connect to queue service: {str(e)}")
     
     @staticmethod
     def _remove_from_queue(order_id):
         """Remove order from queue"""
         try:
-            queue_url = f"{settings.QUEUE_SERVICE_URL}/api/queue/order/{order_id}"
-            response = requests.delete(queue_url, timeout=5)
+            response = get_service_client('queue').delete(f"/api/queue/order/{order_id}", endpoint='remove')
             
             if response.status_code not in [200, 404]:
                 logger.error(f"Failed to remove order from queue: {response.status_code} {response.text}")
@@ -211,17 +565,34 @@ class OrderService:
     @staticmethod
     def get_user_orders(user_id, status=None):
         """Get orders for a specific user"""
-        queryset = Order.objects.filter(user_id=user_id).order_by('-created_at')
+        queryset = Order.objects.filter(user_id=user_id).prefetch_related('items').order_by('-created_at')
         
         if status:
             queryset = queryset.filter(status=status)
         
         return queryset
     
+    @staticmethod
+    def get_user_orders_page(user_id, status=None, after=None):
+        """Get a user's orders newest first, starting after a (created_at, id) position"""
+        queryset = Order.objects.filter(user_id=user_id)
+        
+        if status:
+            queryset = queryset.filter(status=status)
+        
+        if after:
+            created_at, order_id = after
+            # Seek on the (user_id, created_at, id) index instead of OFFSET
+            queryset = queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(id__lt=order_id)
+            )
+        
+        return queryset.order_by('-created_at', '-id')
+    
     @staticmethod
     def get_active_orders(user_id):
         """Get active orders for a user (not completed or cancelled)"""
         return Order.objects.filter(
             user_id=user_id,
             status__in=['placed', 'confirmed', 'preparing', 'ready']
-        ).order_by('-created_at')
\ No newline at end of file
+        ).prefetch_related('items').order_by('-created_at')
\ No newline at end of file
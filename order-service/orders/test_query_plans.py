@@ -0,0 +1,140 @@
+import os
+import json
+from unittest import skipUnless
+from django.db import connection
+from django.test import SimpleTestCase
+from .models import Order
+from .services import OrderService
+
+SEED_ORDERS = 1_000_000
+HEAVY_USER = 1
+HEAVY_USER_ORDERS = 20_000
+
+# (description, queryset factory, expected index, filesort allowed)
+QUERY_PLANS = [
+    (
+        'user history',
+        lambda: OrderService.get_user_orders(HEAVY_USER),
+        'orders_user_created_id_idx',
+        False,
+    ),
+    (
+        'user history filtered by status',
+        lambda: OrderService.get_user_orders(HEAVY_USER, 'completed'),
+        'orders_user_status_created_idx',
+        False,
+    ),
+    (
+        'first page',
+        lambda: OrderService.get_user_orders_page(HEAVY_USER)[:21],
+        'orders_user_created_id_idx',
+        False,
+    ),
+    (
+        'deep page',
+        lambda: OrderService.get_user_orders_page(HEAVY_USER, after=OrderQueryPlanTests.deep_cursor)[:21],
+        'orders_user_created_id_idx',
+        False,
+    ),
+    (
+        'deep page filtered by status',
+        lambda: OrderService.get_user_orders_page(HEAVY_USER, 'completed', OrderQueryPlanTests.deep_cursor)[:21],
+        'orders_user_status_created_idx',
+        False,
+    ),
+    (
+        # status IN (...) is a multi-range read, so MySQL sorts the matches;
+        # that sort only ever covers the user's few active orders
+        'active orders',
+        lambda: OrderService.get_active_orders(HEAVY_USER),
+        'orders_user_status_created_idx',
+        True,
+    ),
+    (
+        'order by id',
+        lambda: Order.objects.filter(id=OrderQueryPlanTests.deep_cursor[1]),
+        'PRIMARY',
+        False,
+    ),
+]
+
+
+def plan_nodes(node):
+    """Walk every object in a MySQL EXPLAIN FORMAT=JSON document"""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from plan_nodes(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from plan_nodes(value)
+
+
+@skipUnless(
+    os.getenv('ORDERS_QUERY_PLAN_SUITE') == '1',
+    'set ORDERS_QUERY_PLAN_SUITE=1 to seed 1M orders and check query plans'
+)
+class OrderQueryPlanTests(SimpleTestCase):
+    """EXPLAIN every OrderService query against a seeded orders table.
+
+    Fails when a query stops using its intended index, falls back to a full
+    scan, or starts sorting rows that an index should deliver in order.
+    """
+
+    databases = {'default'}
+    deep_cursor = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if connection.vendor != 'mysql':
+            raise cls.failureException('The query plan suite needs MySQL')
+
+        digits = ' UNION ALL '.join(f'SELECT {digit} AS d' for digit in range(10))
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO orders (user_id, total_amount, status, created_at, updated_at)
+                SELECT
+                    CASE WHEN n < %s THEN %s ELSE 2 + (n %% 10000) END,
+                    50 + (n %% 400),
+                    CASE
+                        WHEN n %% 50 = 0 THEN ELT(1 + (n DIV 50) %% 4, 'placed', 'confirmed', 'preparing', 'ready')
+                        WHEN n %% 13 = 0 THEN 'cancelled'
+                        ELSE 'completed'
+                    END,
+                    TIMESTAMP('2024-01-01') + INTERVAL (n * 30) SECOND,
+                    TIMESTAMP('2024-01-01') + INTERVAL (n * 30) SECOND
+                FROM (
+                    SELECT d0.d + 10 * d1.d + 100 * d2.d + 1000 * d3.d + 10000 * d4.d + 100000 * d5.d AS n
+                    FROM ({digits}) d0, ({digits}) d1, ({digits}) d2,
+                         ({digits}) d3, ({digits}) d4, ({digits}) d5
+                ) seq
+                WHERE n < %s
+            ''', [HEAVY_USER_ORDERS, HEAVY_USER, SEED_ORDERS])
+            cursor.execute('ANALYZE TABLE orders')
+
+        middle = Order.objects.filter(user_id=HEAVY_USER).order_by('-created_at', '-id')[HEAVY_USER_ORDERS // 2]
+        cls.deep_cursor = (middle.created_at, middle.id)
+
+    @classmethod
+    def tearDownClass(cls):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM orders')
+        super().tearDownClass()
+
+    def test_service_queries_use_their_indexes(self):
+        for description, queryset_factory, expected_index, filesort_allowed in QUERY_PLANS:
+            with self.subTest(description):
+                plan = json.loads(queryset_factory().explain(format='json'))
+                tables = [node for node in plan_nodes(plan) if 'table_name' in node]
+
+                for table in tables:
+                    self.assertNotEqual(table.get('access_type'), 'ALL', f'full table scan:\n{plan}')
+                    self.assertNotEqual(table.get('access_type'), 'index', f'full index scan:\n{plan}')
+
+                keys = [table.get('key') for table in tables if table['table_name'] == 'orders']
+                self.assertIn(expected_index, keys, f'expected {expected_index}:\n{plan}')
+
+                if not filesort_allowed:
+                    filesorts = [node for node in plan_nodes(plan) if node.get('using_filesort')]
+                    self.assertFalse(filesorts, f'filesort:\n{plan}')
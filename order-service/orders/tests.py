@@ -1,3 +1,808 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+import pika
+import requests
+from django.db import OperationalError
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from . import async_views
+from .event_codec import SCHEMA_VERSION, SCHEMA_VERSION_HEADER, decode_event, encode_event
+from .models import Order, OrderItem, OutboxEvent
+from .menu_cache import MenuItemCache, handle_menu_event
+from .message_broker import ConfirmingPublisher, DeliveryNotConfirmed, PublisherPool, RabbitMQService, _PublisherChannel
+from .outbox import OutboxRelay
+from .payment_results import apply_payment_results, consume_payment_results
+from .serializers import OrderSerializer, serialize_order_list
+from .services import OrderService, StatusTransitionError
+from .service_client import CircuitOpenError, ServiceClient
 
-# Create your tests here.
+
+def create_orders(user_id, count, items_per_order=3, status='placed'):
+    orders = Order.objects.bulk_create([
+        Order(user_id=user_id, total_amount=Decimal('120.50'), status=status)
+        for _ in range(count)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            menu_item_id=f'item-{index}',
+            item_name=f'Item {index}',
+            quantity=index + 1,
+            price=Decimal('40.17'),
+        )
+        for order in orders
+        for index in range(items_per_order)
+    ])
+    return orders
+
+
+class OrderListQueryCountTests(TestCase):
+    """List endpoints must not issue a query per order"""
+
+    def test_user_orders_query_count_is_constant(self):
+        create_orders(user_id=1, count=1)
+        create_orders(user_id=2, count=25)
+
+        for user_id in (1, 2):
+            with self.assertNumQueries(2):
+                response = self.client.get(f'/api/orders/user/{user_id}/')
+            self.assertEqual(response.status_code, 200)
+
+    def test_active_orders_query_count_is_constant(self):
+        create_orders(user_id=1, count=2, status='preparing')
+        create_orders(user_id=2, count=30, status='ready')
+
+        for user_id in (1, 2):
+            with self.assertNumQueries(2):
+                response = self.client.get(f'/api/orders/user/{user_id}/active/')
+            self.assertEqual(response.status_code, 200)
+
+    def test_empty_history_costs_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(serialize_order_list(OrderService.get_user_orders(99)), [])
+
+    def test_fast_serializer_matches_order_serializer(self):
+        create_orders(user_id=3, count=4)
+        orders = OrderService.get_user_orders(3)
+
+        self.assertEqual(serialize_order_list(orders), OrderSerializer(orders, many=True).data)
+
+
+class UserOrdersPaginationTests(TestCase):
+    """Keyset pagination of /api/orders/user/<id>/"""
+
+    def setUp(self):
+        self.orders = create_orders(user_id=7, count=12, items_per_order=2)
+
+    def fetch_all_pages(self, limit, **params):
+        seen, cursor = [], None
+        while True:
+            query = {'limit': limit, **params}
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get('/api/orders/user/7/', query)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.json()['results'])
+            cursor = response.json()['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_pages_cover_history_newest_first_without_overlap(self):
+        seen = self.fetch_all_pages(limit=5)
+
+        expected = list(Order.objects.filter(user_id=7).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual([order['id'] for order in seen], expected)
+
+    def test_deep_page_costs_the_same_as_first_page(self):
+        first = self.client.get('/api/orders/user/7/', {'limit': 3}).json()
+        cursor = first['next_cursor']
+        for _ in range(2):
+            cursor = self.client.get('/api/orders/user/7/', {'limit': 3, 'cursor': cursor}).json()['next_cursor']
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders/user/7/', {'limit': 3, 'cursor': cursor})
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_fields_projection(self):
+        response = self.client.get('/api/orders/user/7/', {'limit': 4, 'fields': 'id,status'})
+
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'status'})
+
+    def test_projection_without_items_skips_item_query(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/orders/user/7/', {'limit': 4, 'fields': 'id,total_amount'})
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/orders/user/7/', {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_legacy_unpaginated_shape(self):
+        response = self.client.get('/api/orders/user/7/')
+
+        self.assertEqual(len(response.json()), 12)
+
+
+class PaymentResultTests(TestCase):
+    """Batched, idempotent application of payment result events"""
+
+    def setUp(self):
+        self.paid, self.declined, self.shipped = create_orders(user_id=5, count=3, items_per_order=1)
+        Order.objects.filter(id=self.shipped.id).update(status='completed')
+
+    def results(self):
+        return [
+            {'order_id': self.paid.id, 'payment_status': 'success', 'payment_id': 'pay_1'},
+            {'order_id': self.declined.id, 'payment_status': 'failed', 'payment_id': 'pay_2'},
+            {'order_id': self.shipped.id, 'payment_status': 'success', 'payment_id': 'pay_3'},
+        ]
+
+    def test_batch_moves_placed_orders_and_records_events(self):
+        self.assertEqual(apply_payment_results(self.results()), 2)
+
+        self.paid.refresh_from_db()
+        self.declined.refresh_from_db()
+        self.shipped.refresh_from_db()
+        self.assertEqual((self.paid.status, self.paid.payment_id), ('confirmed', 'pay_1'))
+        self.assertEqual((self.declined.status, self.declined.payment_id), ('cancelled', 'pay_2'))
+        self.assertEqual((self.shipped.status, self.shipped.payment_id), ('completed', None))
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_redelivery_is_a_no_op(self):
+        apply_payment_results(self.results())
+
+        self.assertEqual(apply_payment_results(self.results()), 0)
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_unknown_results_are_ignored(self):
+        self.assertEqual(apply_payment_results([{'order_id': self.paid.id, 'payment_status': 'pending'}]), 0)
+
+
+class MenuItemCacheTests(SimpleTestCase):
+    """Expiry, stale serving, eviction and invalidation of menu snapshots"""
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch('orders.menu_cache.time').start()
+        clock.monotonic.side_effect = lambda: self.now
+        self.addCleanup(mock.patch.stopall)
+        self.cache = MenuItemCache(ttl=10, stale_ttl=5, max_entries=2)
+
+    def test_fresh_entry_is_a_hit(self):
+        self.cache.set('a', {'price': 30})
+
+        self.assertEqual(self.cache.get('a'), {'price': 30})
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_entry_expires_after_ttl_and_stale_ttl(self):
+        self.cache.set('a', {'price': 30})
+        self.now += 15
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        self.cache.set('a', {'price': 30})
+        self.now += 12
+        release = threading.Event()
+        loader = mock.Mock(side_effect=lambda key: release.wait(5) and {'price': 35})
+
+        self.assertEqual(self.cache.get('a', loader), {'price': 30})
+        self.assertEqual(self.cache.get('a', loader), {'price': 30})
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == 'menu-cache-refresh-a':
+                thread.join(5)
+
+        loader.assert_called_once_with('a')
+        self.assertEqual(self.cache.get('a'), {'price': 35})
+        self.assertEqual(self.cache.stats()['stale_serves'], 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set('a', {'price': 30})
+        self.cache.set('b', {'price': 25})
+        self.cache.get('a')
+        self.cache.set('c', {'price': 20})
+
+        self.assertEqual(set(self.cache.get_many(['a', 'b', 'c'])), {'a', 'c'})
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_menu_events_invalidate_one_item_or_everything(self):
+        self.cache.set('a', {'price': 30})
+        self.cache.set('b', {'price': 25})
+
+        with mock.patch('orders.menu_cache.get_menu_cache', return_value=self.cache):
+            handle_menu_event({'menu_item_id': 'a'})
+            self.assertEqual(set(self.cache.get_many(['a', 'b'])), {'b'})
+
+            handle_menu_event({'event': 'menu_reloaded'})
+            self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_load_started_before_an_invalidation_is_not_cached(self):
+        owned, waiting = self.cache.claim_loads(['a', 'b'])
+        self.assertEqual((owned, waiting), (['a', 'b'], {}))
+        _, waiting = self.cache.claim_loads(['a'])
+
+        self.cache.invalidate('a')
+        self.cache.finish_loads(owned, {'a': {'price': 30}, 'b': {'price': 25}})
+
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'b': {'price': 25}})
+        self.assertEqual(self.cache.wait_for(waiting), {'a': {'price': 30}})
+
+    def test_load_started_after_an_invalidation_is_cached(self):
+        self.cache.invalidate()
+        owned, _ = self.cache.claim_loads(['a'])
+        self.cache.finish_loads(owned, {'a': {'price': 30}})
+
+        self.assertEqual(self.cache.get('a'), {'price': 30})
+
+    def test_wait_for_gives_up_after_the_load_timeout(self):
+        self.cache.load_timeout = 0
+        self.cache.claim_loads(['a'])
+        _, waiting = self.cache.claim_loads(['a'])
+
+        self.assertEqual(self.cache.wait_for(waiting), {})
+
+
+class MenuFetchStampedeTests(SimpleTestCase):
+    """Concurrent carts share one menu-service request per cold item"""
+
+    def test_concurrent_carts_send_one_batch(self):
+        cache = MenuItemCache()
+        started, release, waiting = threading.Event(), threading.Event(), threading.Event()
+        items = {'a': {'name': 'Idli', 'price': 30}, 'b': {'name': 'Vada', 'price': 25}}
+
+        def fetch_batch(menu_item_ids):
+            started.set()
+            release.wait(5)
+            return {menu_item_id: items[menu_item_id] for menu_item_id in menu_item_ids}
+
+        wait_for = cache.wait_for
+
+        def follow(pending):
+            waiting.set()
+            return wait_for(pending)
+
+        results = []
+        with mock.patch('orders.services.get_menu_cache', return_value=cache), \
+                mock.patch.object(cache, 'wait_for', side_effect=follow), \
+                mock.patch.object(OrderService, '_fetch_menu_items_batch', side_effect=fetch_batch) as batch:
+            carts = [
+                threading.Thread(target=lambda: results.append(OrderService._fetch_menu_items(['a', 'b'])))
+                for _ in range(2)
+            ]
+            carts[0].start()
+            started.wait(5)
+            carts[1].start()
+            waiting.wait(5)
+            release.set()
+            for cart in carts:
+                cart.join(5)
+
+        self.assertEqual(batch.call_count, 1)
+        self.assertEqual(results, [[items['a'], items['b']]] * 2)
+
+
+class PaymentResultConsumerTests(SimpleTestCase):
+    """Database outages requeue payment results instead of dropping them"""
+
+    def setUp(self):
+        self.service = RabbitMQService()
+        self.service.connection = mock.Mock(is_closed=False)
+        self.service.channel = mock.Mock()
+        mock.patch('orders.message_broker.time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def deliver(self, on_message, count):
+        for tag in range(1, count + 1):
+            on_message(
+                self.service.channel,
+                mock.Mock(delivery_tag=tag),
+                mock.Mock(content_type=None, headers=None),
+                json.dumps({'order_id': tag, 'payment_status': 'success'}).encode()
+            )
+
+    @mock.patch('orders.payment_results.apply_payment_results', side_effect=OperationalError('gone away'))
+    @mock.patch('orders.payment_results.close_old_connections')
+    @mock.patch('orders.payment_results.get_rabbitmq_service')
+    def test_operational_error_requeues_the_batch(self, get_service, close_connections, apply_results):
+        get_service.return_value = self.service
+        self.service.declare_queue = mock.Mock()
+        self.service.start_consuming = mock.Mock()
+
+        consume_payment_results(batch_size=2)
+        on_message = self.service.channel.basic_consume.call_args.kwargs['on_message_callback']
+        self.deliver(on_message, 2)
+
+        close_connections.assert_called_once()
+        self.service.channel.basic_nack.assert_called_once_with(delivery_tag=2, multiple=True, requeue=True)
+        self.service.channel.basic_ack.assert_not_called()
+
+
+def confirmed():
+    future = Future()
+    future.set_result(None)
+    return future
+
+
+def not_confirmed():
+    future = Future()
+    future.set_exception(DeliveryNotConfirmed('order.created: nacked'))
+    return future
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=3)
+class OutboxRelayTests(TestCase):
+    """Leased, in-order draining of the outbox"""
+
+    def setUp(self):
+        self.events = OutboxEvent.objects.bulk_create([
+            OutboxEvent(routing_key='order.created', payload={'order_id': index}) for index in range(4)
+        ])
+        self.service = mock.Mock()
+        mock.patch('orders.outbox.get_rabbitmq_service', return_value=self.service).start()
+        self.addCleanup(mock.patch.stopall)
+        self.relay = OutboxRelay(batch_size=10)
+
+    def pending_ids(self):
+        return list(OutboxEvent.objects.order_by('id').values_list('id', flat=True))
+
+    def test_confirmed_batch_is_deleted(self):
+        self.service.publish_message.side_effect = lambda routing_key, payload: confirmed()
+
+        self.assertEqual(self.relay.relay_batch(), 4)
+        self.assertEqual(self.pending_ids(), [])
+        self.assertEqual(
+            [call.args[1]['order_id'] for call in self.service.publish_message.call_args_list], [0, 1, 2, 3]
+        )
+
+    def test_publish_failure_stops_the_batch(self):
+        self.service.publish_message.side_effect = [None, ConnectionError('broker down')]
+
+        self.assertEqual(self.relay.relay_batch(), 1)
+        self.assertEqual(self.service.publish_message.call_count, 2)
+        self.assertEqual(self.pending_ids(), [event.id for event in self.events[1:]])
+        self.assertEqual(OutboxEvent.objects.get(id=self.events[1].id).attempts, 1)
+        self.assertFalse(OutboxEvent.objects.filter(locked_until__isnull=False).exists())
+
+    def test_events_after_an_unconfirmed_one_are_kept(self):
+        self.service.publish_message.side_effect = [confirmed(), not_confirmed(), confirmed(), confirmed()]
+
+        self.assertEqual(self.relay.relay_batch(), 1)
+        self.assertEqual(self.pending_ids(), [event.id for event in self.events[1:]])
+
+        self.service.publish_message.side_effect = lambda routing_key, payload: confirmed()
+        self.relay.relay_batch()
+        self.assertEqual(
+            [call.args[1]['order_id'] for call in self.service.publish_message.call_args_list[4:]], [1, 2, 3]
+        )
+
+    def test_failing_event_is_parked(self):
+        self.service.publish_message.side_effect = lambda routing_key, payload: (
+            not_confirmed() if payload['order_id'] == 0 else confirmed()
+        )
+
+        for _ in range(3):
+            self.assertEqual(self.relay.relay_batch(), 0)
+        self.assertIsNotNone(OutboxEvent.objects.get(id=self.events[0].id).parked_at)
+
+        self.assertEqual(self.relay.relay_batch(), 3)
+        self.assertEqual(self.pending_ids(), [self.events[0].id])
+
+    def test_claimed_events_are_skipped_until_the_lease_expires(self):
+        claimed = self.relay.claim_batch()
+
+        self.assertEqual(len(claimed), 4)
+        self.assertEqual(self.relay.claim_batch(), [])
+
+        OutboxEvent.objects.filter(id=self.events[2].id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([event.id for event in self.relay.claim_batch()], [self.events[2].id])
+
+    def test_claim_skips_rows_locked_by_another_relay(self):
+        select_for_update = OutboxEvent.objects.select_for_update
+        with mock.patch.object(OutboxEvent.objects, 'select_for_update', wraps=select_for_update) as lock:
+            self.relay.claim_batch()
+
+        lock.assert_called_once_with(skip_locked=True)
+
+
+class EventCodecTests(SimpleTestCase):
+    """Every codec round-trips an order event and stamps its schema version"""
+
+    message = {
+        'event_type': 'order_created',
+        'order_id': 42,
+        'total_amount': Decimal('120.50'),
+        'created_at': datetime(2025, 10, 20, 9, 15),
+        'items': [{'menu_item_id': 'dosa', 'quantity': 2}],
+    }
+    expected = {
+        'event_type': 'order_created',
+        'order_id': 42,
+        'total_amount': 120.5,
+        'created_at': '2025-10-20T09:15:00',
+        'items': [{'menu_item_id': 'dosa', 'quantity': 2}],
+    }
+
+    def test_round_trip(self):
+        for codec_name, content_type in (
+            ('json', 'application/json'),
+            ('orjson', 'application/json'),
+            ('msgpack', 'application/msgpack'),
+        ):
+            with self.subTest(codec=codec_name):
+                body, encoded_type, headers = encode_event(self.message, codec_name)
+
+                self.assertEqual(encoded_type, content_type)
+                self.assertEqual(headers, {SCHEMA_VERSION_HEADER: SCHEMA_VERSION})
+                self.assertEqual(decode_event(body, encoded_type, headers), self.expected)
+
+    def test_json_codecs_share_a_wire_format(self):
+        body, _, _ = encode_event(self.message, 'json')
+        fast_body, _, _ = encode_event(self.message, 'orjson')
+
+        self.assertEqual(json.loads(body), json.loads(fast_body))
+
+    def test_message_without_headers_or_content_type_decodes_as_json(self):
+        body = json.dumps({'order_id': 42, 'payment_status': 'success'}).encode()
+
+        self.assertEqual(decode_event(body), {'order_id': 42, 'payment_status': 'success'})
+        self.assertEqual(decode_event(body, 'application/json', {}), {'order_id': 42, 'payment_status': 'success'})
+
+    def test_unknown_content_type_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_event(b'<order/>', 'application/xml')
+
+
+class PublisherPoolTests(SimpleTestCase):
+    """Request threads borrow pre-opened channels and never wait on a handshake"""
+
+    def setUp(self):
+        # Not started: channels are handed in and replaced by hand
+        self.pool = PublisherPool('amqp://localhost', 'canteen.orders', size=1, acquire_timeout=0.01)
+
+    def channel(self, is_open=True):
+        return _PublisherChannel(mock.Mock(is_open=is_open), mock.Mock(is_open=is_open))
+
+    def publish(self):
+        self.pool.publish('order.created', b'{}', pika.BasicProperties())
+
+    def test_publish_borrows_and_returns_a_channel(self):
+        publisher = self.channel()
+        self.pool._idle.put(publisher)
+
+        self.publish()
+
+        publisher.channel.basic_publish.assert_called_once()
+        self.assertEqual(self.pool.available, 1)
+
+    def test_no_ready_channel_fails_fast(self):
+        with self.assertRaises(ConnectionError):
+            self.publish()
+
+    def test_failed_publish_replaces_the_channel(self):
+        broken, fresh = self.channel(), self.channel()
+        broken.channel.basic_publish.side_effect = pika.exceptions.ChannelClosed(406, 'PRECONDITION_FAILED')
+        self.pool._idle.put(broken)
+
+        with self.assertRaises(pika.exceptions.ChannelClosed):
+            self.publish()
+        broken.connection.close.assert_called_once()
+        self.assertEqual(self.pool.available, 0)
+
+        self.pool._reconnects.get_nowait()
+        with mock.patch.object(self.pool, '_open', return_value=fresh):
+            self.pool._replace()
+        self.publish()
+        fresh.channel.basic_publish.assert_called_once()
+
+    def test_health_check_replaces_dead_idle_channels(self):
+        alive, dead = self.channel(), self.channel(is_open=False)
+        self.pool._idle.put(alive)
+        self.pool._idle.put(dead)
+
+        self.pool._check_idle()
+
+        self.assertEqual(self.pool.available, 1)
+        self.assertEqual(self.pool._reconnects.qsize(), 1)
+        alive.connection.process_data_events.assert_called_once_with(time_limit=0)
+
+
+class ConfirmingPublisherTests(SimpleTestCase):
+    """Broker acks and nacks are matched to published messages by delivery tag"""
+
+    def setUp(self):
+        # Driven by hand in place of the IO loop thread
+        self.publisher = ConfirmingPublisher('amqp://localhost', 'canteen.orders', confirm_timeout=5, max_retries=1)
+        self.publisher._connection = mock.Mock()
+        self.publisher._channel = mock.Mock()
+
+    def publish(self, count):
+        futures = [self.publisher.publish('order.created', b'{}', pika.BasicProperties()) for _ in range(count)]
+        self.publisher._drain()
+        return futures
+
+    def confirm(self, method):
+        self.publisher._on_delivery_confirmation(mock.Mock(method=method))
+
+    def test_ack_resolves_its_delivery_tag_only(self):
+        futures = self.publish(3)
+
+        self.confirm(pika.spec.Basic.Ack(delivery_tag=2))
+
+        self.assertEqual([future.done() for future in futures], [False, True, False])
+        self.assertIs(futures[1].result(), True)
+
+    def test_multiple_ack_resolves_every_tag_up_to_it(self):
+        futures = self.publish(3)
+
+        self.confirm(pika.spec.Basic.Ack(delivery_tag=2, multiple=True))
+
+        self.assertEqual([future.done() for future in futures], [True, True, False])
+        self.assertEqual(self.publisher.in_flight, 1)
+
+    def test_nack_republishes_the_message(self):
+        (future,) = self.publish(1)
+
+        self.confirm(pika.spec.Basic.Nack(delivery_tag=1))
+
+        self.assertEqual(self.publisher._channel.basic_publish.call_count, 2)
+        self.assertFalse(future.done())
+        self.confirm(pika.spec.Basic.Ack(delivery_tag=2))
+        self.assertIs(future.result(), True)
+
+    def test_unconfirmed_message_fails_after_its_retries(self):
+        (future,) = self.publish(1)
+        self.publisher.confirm_timeout = -1
+
+        self.publisher._check_timeouts()
+        self.assertEqual(self.publisher._channel.basic_publish.call_count, 2)
+        self.publisher._check_timeouts()
+
+        with self.assertRaises(DeliveryNotConfirmed):
+            future.result(timeout=0)
+        self.assertEqual(self.publisher.in_flight, 0)
+
+
+class BulkOrderStatusTests(TestCase):
+    """All-or-nothing bulk status transitions"""
+
+    def setUp(self):
+        self.orders = create_orders(user_id=9, count=3, items_per_order=1)
+
+    def test_transitions_are_applied_with_one_event_each(self):
+        first, second, third = self.orders
+        response = self.client.put(
+            '/api/orders/status/',
+            {'transitions': [
+                {'order_id': first.id, 'status': 'confirmed'},
+                {'order_id': second.id, 'status': 'confirmed'},
+                {'order_id': first.id, 'status': 'cancelled'},
+            ]},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['updated']), 2)
+        statuses = dict(Order.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {first.id: 'cancelled', second.id: 'confirmed', third.id: 'placed'})
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_unknown_order_rolls_back_the_batch(self):
+        response = self.client.put(
+            '/api/orders/status/',
+            {'transitions': [
+                {'order_id': self.orders[0].id, 'status': 'confirmed'},
+                {'order_id': 999999, 'status': 'confirmed'},
+            ]},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Order.objects.exclude(status='placed').exists())
+        self.assertEqual(OutboxEvent.objects.count(), 0)
+
+    def test_empty_batch_is_rejected(self):
+        response = self.client.put('/api/orders/status/', {'transitions': []}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_illegal_transition_rejects_the_batch(self):
+        response = self.client.put(
+            '/api/orders/status/',
+            {'transitions': [
+                {'order_id': self.orders[0].id, 'status': 'confirmed'},
+                {'order_id': self.orders[1].id, 'status': 'ready'},
+            ]},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exclude(status='placed').exists())
+
+
+@mock.patch('orders.services.OrderService._remove_from_queue')
+class OrderStatusTransitionTests(TestCase):
+    """Single-order transitions follow Order.STATUS_TRANSITIONS with a compare-and-set write"""
+
+    def setUp(self):
+        (self.order,) = create_orders(user_id=11, count=1, items_per_order=1)
+
+    def put_status(self, new_status):
+        return self.client.put(
+            f'/api/orders/{self.order.id}/status/', {'status': new_status}, content_type='application/json'
+        )
+
+    def test_legal_transition_is_one_read_and_one_compare_and_set_write(self, remove):
+        # SELECT, then SAVEPOINT, UPDATE, outbox INSERT, RELEASE SAVEPOINT
+        with self.assertNumQueries(5):
+            OrderService.update_order_status(self.order.id, 'confirmed')
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'confirmed')
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.payload['old_status'], event.payload['new_status']), ('placed', 'confirmed'))
+        remove.assert_not_called()
+
+    def test_cancelling_leaves_the_queue_after_commit(self, remove):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            OrderService.update_order_status(self.order.id, 'cancelled')
+            remove.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        remove.assert_called_once_with(self.order.id)
+
+    def test_illegal_transition_is_rejected_without_a_write(self, remove):
+        with self.assertNumQueries(1):
+            with self.assertRaises(StatusTransitionError):
+                OrderService.update_order_status(self.order.id, 'ready')
+
+        self.assertEqual(self.put_status('completed').status_code, 409)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_stale_transition_is_rejected(self, remove):
+        stale = Order.objects.get(id=self.order.id)
+        Order.objects.filter(id=self.order.id).update(status='cancelled')
+
+        with mock.patch.object(Order.objects, 'get', return_value=stale):
+            with self.assertRaises(StatusTransitionError):
+                OrderService.update_order_status(self.order.id, 'confirmed')
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_repeating_the_current_status_is_a_no_op(self, remove):
+        response = self.put_status('placed')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class AsyncOrderViewTests(TestCase):
+    """The async views return the same bodies as the DRF views"""
+
+    def setUp(self):
+        (self.order,) = create_orders(user_id=13, count=1, items_per_order=2)
+        self.factory = AsyncRequestFactory()
+
+    async def test_get_order_matches_sync_view(self):
+        response = await async_views.get_order(self.factory.get('/'), order_id=self.order.id)
+        expected = await self.async_client.get(f'/api/orders/{self.order.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected.content)
+
+    async def test_missing_order_is_404(self):
+        response = await async_views.get_order(self.factory.get('/'), order_id=999999)
+
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch.object(OrderService, '_aadd_to_queue')
+    @mock.patch.object(OrderService, '_afetch_menu_items')
+    async def test_create_order_awaits_menu_and_queue(self, fetch_menu_items, add_to_queue):
+        fetch_menu_items.return_value = [{'name': 'Dosa', 'price': Decimal('60.00')}]
+
+        request = self.factory.post(
+            '/', {'user_id': 21, 'items': [{'menu_item_id': 'dosa', 'quantity': 2}]}, content_type='application/json'
+        )
+        response = await async_views.create_order(request)
+
+        self.assertEqual(response.status_code, 201)
+        order = await Order.objects.aget(user_id=21)
+        self.assertEqual(order.total_amount, Decimal('120.00'))
+        add_to_queue.assert_awaited_once_with(order.id, 21)
+        self.assertEqual(await OutboxEvent.objects.acount(), 2)
+
+
+class ServiceClientTests(SimpleTestCase):
+    """Retries and circuit breaking in the inter-service HTTP client"""
+
+    def setUp(self):
+        self.client = ServiceClient('menu', 'http://menu', retries=2, backoff=0, failure_threshold=3, reset_timeout=60)
+        self.send = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_idempotent_calls_are_retried(self):
+        ok = mock.Mock(status_code=200)
+        self.send.side_effect = [requests.exceptions.ConnectionError(), ok]
+
+        self.assertIs(self.client.get('/api/menu/items/1', endpoint='item'), ok)
+        self.assertEqual(self.send.call_count, 2)
+
+    def test_posts_are_not_retried_by_default(self):
+        self.send.side_effect = requests.exceptions.ConnectTimeout()
+
+        with self.assertRaises(requests.exceptions.ConnectTimeout):
+            self.client.post('/api/queue/', endpoint='add', json={})
+        self.assertEqual(self.send.call_count, 1)
+
+    def test_open_circuit_fails_without_calling_upstream(self):
+        self.send.return_value = mock.Mock(status_code=503)
+
+        self.assertEqual(self.client.get('/api/menu/items/1').status_code, 503)
+        self.assertEqual(self.send.call_count, 3)
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('/api/menu/items/1')
+        self.assertEqual(self.send.call_count, 3)
+
+    def test_repeated_server_errors_open_the_circuit(self):
+        self.send.return_value = mock.Mock(status_code=500)
+
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/menu/items/1').status_code, 500)
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual(self.client.breaker.stats()['state'], 'open')
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('/api/menu/items/1')
+
+    def test_successful_trial_closes_the_circuit(self):
+        self.send.return_value = mock.Mock(status_code=503)
+        self.client.get('/api/menu/items/1')
+
+        self.client.breaker.reset_timeout = 0
+        self.send.return_value = mock.Mock(status_code=200)
+        self.client.get('/api/menu/items/1')
+
+        self.assertEqual(self.client.breaker.stats()['state'], 'closed')
+
+    def open_circuit_for_trial(self):
+        self.send.return_value = mock.Mock(status_code=503)
+        self.client.get('/api/menu/items/1')
+        self.client.breaker.reset_timeout = 0
+
+    def test_unexpected_error_releases_the_trial(self):
+        self.open_circuit_for_trial()
+        self.send.side_effect = ValueError('bad response')
+
+        with self.assertRaises(ValueError):
+            self.client.post('/api/queue/', json={})
+        self.assertTrue(self.client.breaker.allow())
+
+    async def test_cancelled_trial_releases_the_trial(self):
+        self.open_circuit_for_trial()
+        entered, never = asyncio.Event(), asyncio.Event()
+
+        class HangingResponse:
+            async def __aenter__(self):
+                entered.set()
+                await never.wait()
+
+            async def __aexit__(self, *exc_info):
+                return False
+
+        session = mock.Mock()
+        session.request.return_value = HangingResponse()
+        with mock.patch('orders.service_client.get_async_session', return_value=session):
+            call = asyncio.ensure_future(self.client.arequest('POST', '/api/queue/'))
+            await entered.wait()
+            call.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await call
+
+        self.assertTrue(self.client.breaker.allow())
@@ -1,11 +1,18 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Under ASGI the order endpoints can be served by their async versions
+order_views = async_views if settings.ORDER_ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.create_order, name='create_order'),
-    path('<int:order_id>/', views.get_order, name='get_order'),
-    path('user/<int:user_id>/', views.get_user_orders, name='get_user_orders'),
-    path('user/<int:user_id>/active/', views.get_user_active_orders, name='get_user_active_orders'),
-    path('<int:order_id>/status/', views.update_order_status, name='update_order_status'),
+    path('', order_views.create_order, name='create_order'),
+    path('<int:order_id>/', order_views.get_order, name='get_order'),
+    path('user/<int:user_id>/', order_views.get_user_orders, name='get_user_orders'),
+    path('user/<int:user_id>/active/', order_views.get_user_active_orders, name='get_user_active_orders'),
+    path('<int:order_id>/status/', order_views.update_order_status, name='update_order_status'),
+    path('status/', views.bulk_update_order_status, name='bulk_update_order_status'),
+    path('menu-cache/stats/', views.menu_cache_stats, name='menu_cache_stats'),
+    path('upstreams/stats/', views.upstream_stats, name='upstream_stats'),
     path('health/', views.health_check, name='health_check'),
 ]
\ No newline at end of file
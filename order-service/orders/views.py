@@ -3,8 +3,19 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from .models import Order
-from .serializers import OrderSerializer, CreateOrderSerializer, UpdateOrderStatusSerializer
-from .services import OrderService
+from django.conf import settings
+from .serializers import (
+    OrderSerializer,
+    CreateOrderSerializer,
+    UpdateOrderStatusSerializer,
+    BulkUpdateOrderStatusSerializer,
+    serialize_order_list,
+    serialize_order_page,
+    decode_order_cursor,
+)
+from .services import OrderService, StatusTransitionError
+from .menu_cache import get_menu_cache
+from .service_client import service_client_stats
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,12 +60,33 @@ def get_order(request, order_id):
 
 @api_view(['GET'])
 def get_user_orders(request, user_id):
-    """Get all orders for a user"""
+    """Get orders for a user, one keyset page at a time.
+
+    Query params: ``status``, ``limit``, ``cursor`` (``next_cursor`` from the
+    previous page) and ``fields`` (comma-separated projection). While
+    ORDER_LIST_LEGACY_UNPAGINATED is on, requests without ``limit`` or
+    ``cursor`` still get the full history as a plain list.
+    """
     try:
-        status_filter = request.query_params.get('status')
-        orders = OrderService.get_user_orders(user_id, status_filter)
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        params = request.query_params
+        status_filter = params.get('status')
+        fields = params.get('fields')
+        fields = set(fields.split(',')) if fields else None
+
+        if settings.ORDER_LIST_LEGACY_UNPAGINATED and 'limit' not in params and 'cursor' not in params:
+            orders = OrderService.get_user_orders(user_id, status_filter)
+            return Response(serialize_order_list(orders, fields))
+
+        limit = min(int(params.get('limit', settings.ORDER_PAGE_SIZE)), settings.ORDER_PAGE_SIZE_MAX)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        after = decode_order_cursor(params['cursor']) if params.get('cursor') else None
+
+        orders = OrderService.get_user_orders_page(user_id, status_filter, after)
+        results, next_cursor = serialize_order_page(orders, limit, fields)
+        return Response({'results': results, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error fetching orders for user {user_id}: {str(e)}")
         return Response({'error': 'Failed to fetch orders'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -65,8 +97,7 @@ def get_user_active_orders(request, user_id):
     """Get active orders for a user"""
     try:
         orders = OrderService.get_active_orders(user_id)
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        return Response(serialize_order_list(orders))
     except Exception as e:
         logger.error(f"Error fetching active orders for user {user_id}: {str(e)}")
         return Response({'error': 'Failed to fetch active orders'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -89,6 +120,8 @@ def update_order_status(request, order_id):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
+    except StatusTransitionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
     except ValueError as e:
         return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -96,6 +129,41 @@ def update_order_status(request, order_id):
         return Response({'error': 'Failed to update order status'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['PUT'])
+def bulk_update_order_status(request):
+    """Move many orders to new statuses at once"""
+    serializer = BulkUpdateOrderStatusSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        updated = OrderService.bulk_update_order_status([
+            (transition['order_id'], transition['status'])
+            for transition in serializer.validated_data['transitions']
+        ])
+        return Response({'updated': updated})
+        
+    except StatusTransitionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.error(f"Error bulk updating order status: {str(e)}")
+        return Response({'error': 'Failed to update order status'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+def menu_cache_stats(request):
+    """Menu item cache hit/miss counters"""
+    return Response(get_menu_cache().stats())
+
+
+@api_view(['GET'])
+def upstream_stats(request):
+    """Circuit breaker state per upstream service"""
+    return Response(service_client_stats())
+
+
 @api_view(['GET'])
 def health_check(request):
     """Health check endpoint"""
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'orderservice.settings')
 
 application = get_asgi_application()
+
+# Open the RabbitMQ publisher pool in the background so requests never wait on it
+from orders.message_broker import get_rabbitmq_service  # noqa: E402
+
+get_rabbitmq_service().publisher
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'orderservice.settings')
 
 application = get_wsgi_application()
+
+# Open the RabbitMQ publisher pool in the background so requests never wait on it
+from orders.message_broker import get_rabbitmq_service  # noqa: E402
+
+get_rabbitmq_service().publisher
@@ -1,14 +1,34 @@
 #!/bin/bash
 set -e
 
+# Usage: ./start.sh [serve|migrate]
+#   migrate  one-shot step: apply migrations, then exit
+#   serve    start the web server (default); SERVER_MODE=development uses runserver,
+#            SERVER_MODE=asgi serves the async views with Uvicorn workers
+COMMAND="${1:-serve}"
+
 # Wait for MySQL to be ready
 echo "Waiting for MySQL to be ready..."
 python wait-for-db.py
 
-# Run migrations
-echo "Running database migrations..."
-python manage.py migrate --noinput
+if [ "$COMMAND" = "migrate" ]; then
+    echo "Running database migrations..."
+    exec python manage.py migrate --noinput
+fi
+
+if [ "$SERVER_MODE" = "development" ]; then
+    # Start the Django development server
+    echo "Starting Django development server..."
+    exec python manage.py runserver 0.0.0.0:8083
+fi
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # Event-loop workers running the async order views
+    echo "Starting Gunicorn with Uvicorn workers..."
+    export ORDER_ASYNC_VIEWS="${ORDER_ASYNC_VIEWS:-True}"
+    exec gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker orderservice.asgi:application
+fi
 
-# Start the Django development server
-echo "Starting Django server..."
-python manage.py runserver 0.0.0.0:8083
\ No newline at end of file
+# Multi-worker production server; send HUP for a graceful reload
+echo "Starting Gunicorn..."
+exec gunicorn -c gunicorn.conf.py orderservice.wsgi:application
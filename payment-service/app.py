@@ -3,7 +3,10 @@ from flask_cors import CORS
 import logging
 import threading
 from config import Config
-from services import PaymentService
+from services import PaymentService, is_stalled, is_valid_attempt
+from models import render_json
+from payment_processor import get_payment_processor, ProcessorBusy
+from service_client import get_service_client, service_client_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,20 +22,67 @@ CORS(app, origins='*',
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
      allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'])
 
+# Pooled, circuit-broken client for order-service status callbacks
+order_client = get_service_client(
+    'order',
+    Config.ORDER_SERVICE_URL,
+    pool_size=Config.ORDER_SERVICE_MAX_CONNECTIONS,
+    timeouts={'status': Config.ORDER_STATUS_TIMEOUT},
+    connect_timeout=Config.SERVICE_CLIENT_CONNECT_TIMEOUT,
+    retries=Config.SERVICE_CLIENT_RETRIES,
+    backoff=Config.SERVICE_CLIENT_BACKOFF,
+    failure_threshold=Config.SERVICE_CLIENT_FAILURE_THRESHOLD,
+    reset_timeout=Config.SERVICE_CLIENT_RESET_TIMEOUT
+)
+
 # Initialize payment service
-payment_service = PaymentService(Config.DATABASE_PATH, Config.ORDER_SERVICE_URL)
+payment_service = PaymentService(
+    Config.DATABASE_PATH,
+    Config.ORDER_SERVICE_URL,
+    Config.DATABASE_POOL_SIZE,
+    order_client,
+    Config.ORDER_NOTIFY_WORKERS
+)
+if Config.PAYMENT_RUNTIME == 'async':
+    # One event loop runs the consumer, mock processing and notifications
+    from async_runtime import AsyncPaymentEngine
+    payment_processor = AsyncPaymentEngine(payment_service, Config).start()
+else:
+    payment_processor = get_payment_processor(
+        payment_service,
+        Config.PAYMENT_WORKERS,
+        Config.PAYMENT_MAX_PENDING,
+        Config.PAYMENT_PROCESSING_DELAY
+    )
 
 # Initialize RabbitMQ if available
 rabbitmq_service = None
 try:
     from message_broker import get_rabbitmq_service
-    rabbitmq_service = get_rabbitmq_service(Config.RABBITMQ_URL)
+    rabbitmq_service = get_rabbitmq_service(
+        Config.RABBITMQ_URL,
+        Config.RABBITMQ_PUBLISHER_CONFIRMS,
+        Config.RABBITMQ_EVENT_CODEC,
+        Config.RABBITMQ_PUBLISH_BATCH_SIZE,
+        Config.RABBITMQ_PUBLISH_LINGER,
+        Config.RABBITMQ_PUBLISH_BUFFER_SIZE,
+        Config.RABBITMQ_CONFIRM_TIMEOUT,
+        Config.RABBITMQ_CONFIRM_MAX_RETRIES
+    )
     
-    if rabbitmq_service:
+    if rabbitmq_service and Config.PAYMENT_RUNTIME != 'async':
         # Set up consumer in a separate thread
         def start_rabbitmq_consumer():
             try:
-                rabbitmq_service.setup_consumer(payment_service)
+                rabbitmq_service.setup_consumer(
+                    payment_service,
+                    payment_processor,
+                    Config.PAYMENT_SUBMIT_TIMEOUT,
+                    Config.RABBITMQ_PREFETCH_COUNT,
+                    Config.RABBITMQ_CONSUMER_WORKERS,
+                    Config.RABBITMQ_ACK_BATCH_SIZE,
+                    Config.RABBITMQ_ACK_INTERVAL
+                )
                 rabbitmq_service.start_consuming()
             except Exception as e:
                 logger.error(f"RabbitMQ consumer error: {str(e)}")
@@ -65,20 +115,41 @@ def initiate_payment():
         user_id = data['user_id']
         amount = data['amount']
         payment_method = data.get('payment_method', 'mock')
+        attempt = data.get('attempt', 1)
         
         # Validate amount
         if amount <= 0:
             return jsonify({'error': 'Amount must be greater than 0'}), 400
         
+        if not is_valid_attempt(attempt):
+            return jsonify({'error': 'attempt must be a positive integer'}), 400
+        
+        # Claim a processing slot first, so a full processor sheds load
+        # before anything is written
+        if payment_method == 'mock':
+            try:
+                payment_processor.reserve(timeout=Config.PAYMENT_SUBMIT_TIMEOUT)
+            except ProcessorBusy:
+                return jsonify({'error': 'Payment processing is at capacity, retry shortly'}), 503, {'Retry-After': '1'}
+        
         # Initiate payment
-        payment = payment_service.initiate_payment(order_id, user_id, amount, payment_method)
+        try:
+            payment, created = payment_service.initiate_payment(order_id, user_id, amount, payment_method, attempt)
+        except Exception:
+            if payment_method == 'mock':
+                payment_processor.release()
+            raise
+        
+        # A retried request gets the payment it already created, which is
+        # scheduled again only if it was never settled
+        if not created and not (payment_method == 'mock' and is_stalled(payment, payment_processor.delay)):
+            if payment_method == 'mock':
+                payment_processor.release()
+            return jsonify(payment.to_dict()), 200
         
         # Process mock payment in background
         if payment_method == 'mock':
-            threading.Thread(
-                target=payment_service.process_mock_payment,
-                args=(payment.payment_id,)
-            ).start()
+            payment_processor.schedule(payment.payment_id)
         
         return jsonify(payment.to_dict()), 201
         
@@ -139,6 +210,75 @@ def update_payment_status(payment_id):
         logger.error(f"Error updating payment status: {str(e)}")
         return jsonify({'error': 'Failed to update payment status'}), 500
 
+@app.route('/api/payments/bulk/status', methods=['PUT'])
+def bulk_update_payment_status():
+    """Update the status of many payments in one transaction"""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('updates'), list) or not data['updates']:
+            return jsonify({'error': 'updates must be a non-empty list'}), 400
+        
+        if len(data['updates']) > Config.BULK_MAX_ITEMS:
+            return jsonify({'error': f'At most {Config.BULK_MAX_ITEMS} updates per request'}), 400
+        
+        valid_statuses = ['pending', 'success', 'failed', 'cancelled']
+        updates = []
+        for update in data['updates']:
+            if not isinstance(update, dict) or 'payment_id' not in update or 'status' not in update:
+                return jsonify({'error': 'Each update needs payment_id and status'}), 400
+            if not isinstance(update['payment_id'], str):
+                return jsonify({'error': 'payment_id must be a string'}), 400
+            if update['status'] not in valid_statuses:
+                return jsonify({'error': f'Invalid status. Must be one of: {valid_statuses}'}), 400
+            updates.append((update['payment_id'], update['status']))
+        
+        payments, not_found = payment_service.bulk_update_payment_status(updates)
+        
+        body = render_json({'payments': payments, 'not_found': not_found})
+        return app.response_class(body, status=200, mimetype='application/json')
+        
+    except Exception as e:
+        logger.error(f"Error bulk updating payment status: {str(e)}")
+        return jsonify({'error': 'Failed to update payment status'}), 500
+
+@app.route('/api/payments/bulk/lookup', methods=['POST'])
+def bulk_get_payments():
+    """Get many payments by payment_ids, or the latest payment of many order_ids"""
+    try:
+        data = request.get_json()
+        
+        if not isinstance(data, dict) or not ('payment_ids' in data or 'order_ids' in data):
+            return jsonify({'error': 'payment_ids or order_ids must be a list'}), 400
+        
+        # Validate the field that will actually be used
+        field, key_type = ('payment_ids', str) if 'payment_ids' in data else ('order_ids', int)
+        keys = data[field]
+        if not isinstance(keys, list) or not all(
+            isinstance(key, key_type) and not isinstance(key, bool) for key in keys
+        ):
+            return jsonify({'error': f'{field} must be a list of {"strings" if key_type is str else "integers"}'}), 400
+        if len(keys) > Config.BULK_MAX_ITEMS:
+            return jsonify({'error': f'At most {Config.BULK_MAX_ITEMS} ids per request'}), 400
+        
+        if field == 'payment_ids':
+            payments = payment_service.get_payments(keys)
+            found = {payment.payment_id for payment in payments}
+        else:
+            by_order = payment_service.get_payments_by_orders(keys)
+            payments = [by_order[order_id] for order_id in dict.fromkeys(keys) if order_id in by_order]
+            found = set(by_order)
+        
+        body = render_json({
+            'payments': payments,
+            'not_found': [key for key in dict.fromkeys(keys) if key not in found]
+        })
+        return app.response_class(body, status=200, mimetype='application/json')
+        
+    except Exception as e:
+        logger.error(f"Error getting payments: {str(e)}")
+        return jsonify({'error': 'Failed to get payments'}), 500
+
 @app.route('/api/payments/order/<int:order_id>', methods=['GET'])
 def get_payment_by_order(order_id):
     """Get payment by order ID"""
@@ -158,13 +298,27 @@ def get_payment_by_order(order_id):
 def get_payment_stats():
     """Get payment statistics"""
     try:
-        stats = payment_service.get_payment_stats()
+        period = request.args.get('period', 'day')
+        if period not in ('day', 'hour'):
+            return jsonify({'error': 'Invalid period. Must be one of: day, hour'}), 400
+        
+        stats = payment_service.get_payment_stats(period)
         return jsonify(stats), 200
         
     except Exception as e:
         logger.error(f"Error getting payment stats: {str(e)}")
         return jsonify({'error': 'Failed to get payment stats'}), 500
 
+@app.route('/api/payments/processor/stats', methods=['GET'])
+def get_processor_stats():
+    """Get payment processor queue depth, wait time and latency"""
+    return jsonify(payment_processor.stats()), 200
+
+@app.route('/api/payments/upstreams/stats', methods=['GET'])
+def get_upstream_stats():
+    """Get circuit breaker state per upstream service"""
+    return jsonify(service_client_stats()), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -0,0 +1,262 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+import aiohttp
+import aio_pika
+
+from event_codec import encode_event, decode_event
+from message_broker import build_payment_result_event
+from payment_processor import ProcessorBusy, LatencyWindow
+from services import is_stalled
+from service_client import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+class AsyncPaymentEngine:
+    """Asyncio runtime for payment processing.
+
+    One event loop, on its own thread, runs the ``payment.initiated``
+    consumer (aio-pika), every in-flight mock payment (a sleeping task, not
+    a sleeping thread), result publishing and the order-service HTTP
+    fallback (one pooled aiohttp session). SQLite calls are handed to a
+    small executor sized to the connection pool, since sqlite3 has no
+    non-blocking API.
+
+    It exposes the same ``reserve``/``release``/``schedule``/``stats``
+    interface as ``PaymentProcessor``, so the Flask endpoints can hand
+    payments to it unchanged.
+    """
+
+    def __init__(self, payment_service, config):
+        self.payment_service = payment_service
+        self.rabbitmq_url = config.RABBITMQ_URL
+        self.exchange_name = 'canteen.orders'
+        self.event_codec = config.RABBITMQ_EVENT_CODEC
+        self.publisher_confirms = config.RABBITMQ_PUBLISHER_CONFIRMS
+        self.prefetch_count = config.RABBITMQ_PREFETCH_COUNT
+        self.order_client = payment_service.order_client
+        self.max_pending = config.PAYMENT_MAX_PENDING
+        self.delay = config.PAYMENT_PROCESSING_DELAY
+        self.http_connections = config.ORDER_SERVICE_MAX_CONNECTIONS
+
+        self._db_executor = ThreadPoolExecutor(
+            max_workers=config.DATABASE_POOL_SIZE,
+            thread_name_prefix='payment-db'
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name='payment-async-runtime', daemon=True)
+        self._started = threading.Event()
+        self._slots = None
+        self._settling = set()
+        self._session = None
+        self._connection = None
+        self._exchange = None
+
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_time = LatencyWindow()
+        self.processing_time = LatencyWindow()
+
+    def start(self) -> 'AsyncPaymentEngine':
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._setup())
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _setup(self):
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.http_connections, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=5)
+        )
+        await self._consume()
+
+    async def _db(self, func, *args):
+        return await self._loop.run_in_executor(self._db_executor, func, *args)
+
+    # Consumer
+
+    async def _consume(self):
+        try:
+            self._connection = await aio_pika.connect_robust(self.rabbitmq_url)
+            channel = await self._connection.channel(publisher_confirms=self.publisher_confirms)
+            await channel.set_qos(prefetch_count=self.prefetch_count)
+
+            self._exchange = await channel.declare_exchange(
+                self.exchange_name, aio_pika.ExchangeType.TOPIC, durable=True
+            )
+            queue = await channel.declare_queue('payment.service.queue', durable=True)
+            await queue.bind(self._exchange, routing_key='payment.initiated')
+            await queue.consume(self._on_message)
+
+            logger.info("Payment Service: async RabbitMQ consumer set up")
+        except Exception as e:
+            logger.error(f"Failed to set up async consumer: {str(e)}")
+
+    async def _on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        try:
+            event = decode_event(message.body, message.content_type, message.headers)
+            if event.get('event_type') != 'payment_initiated':
+                await message.ack()
+                return
+
+            # Waiting here holds the delivery unacked, so prefetch stops
+            # the broker from pushing more while the engine is full
+            await self._slots.acquire()
+            self._pending += 1
+            try:
+                payment, created = await self._db(
+                    self.payment_service.initiate_payment,
+                    event['order_id'], event['user_id'], event['amount'], 'mock', event.get('attempt', 1)
+                )
+            except Exception:
+                self._release_slot()
+                raise
+
+            # Redelivered message: the payment is already being processed,
+            # unless the process that created it died before scheduling it
+            if not created and not is_stalled(payment, self.delay):
+                self._release_slot()
+                await message.ack()
+                return
+
+            self._schedule_settle(payment.payment_id)
+            await message.ack()
+            logger.info(f"Payment {payment.payment_id} initiated for order {event['order_id']}")
+
+        except Exception as e:
+            logger.error(f"Error processing payment message: {str(e)}")
+            await message.nack(requeue=False)
+
+    # Mock processing
+
+    def _release_slot(self):
+        self._pending -= 1
+        self._slots.release()
+
+    def _schedule_settle(self, payment_id: str):
+        task = self._loop.create_task(self._settle(payment_id, time.monotonic() + self.delay))
+        self._settling.add(task)
+        task.add_done_callback(self._settling.discard)
+
+    async def _settle(self, payment_id: str, due_at: float):
+        await asyncio.sleep(max(0.0, due_at - time.monotonic()))
+        started = time.monotonic()
+        self.wait_time.add(started - due_at)
+
+        status = self.payment_service.mock_payment_outcome()
+        try:
+            payment = await self._db(self.payment_service.save_payment_status, payment_id, status, 'pending')
+            if payment is None:
+                logger.info(f"Payment {payment_id} was already settled")
+            else:
+                if status == 'success':
+                    await self._publish_result(payment.order_id, payment_id, status)
+                logger.info(f"Payment {payment_id} status updated to {status}")
+            self.completed += 1
+        except Exception as e:
+            logger.error(f"Failed to process mock payment {payment_id}: {str(e)}")
+            self.failed += 1
+        finally:
+            self.processing_time.add(time.monotonic() - started)
+            self._release_slot()
+
+    async def _publish_result(self, order_id: int, payment_id: str, status: str):
+        """Publish the result; fall back to HTTP if the broker is unavailable"""
+        try:
+            if self._exchange is None:
+                raise ConnectionError("not connected to RabbitMQ")
+
+            routing_key, message = build_payment_result_event(order_id, status, payment_id)
+            body, content_type, headers = encode_event(message, self.event_codec)
+            await self._exchange.publish(
+                aio_pika.Message(
+                    body,
+                    content_type=content_type,
+                    headers=headers,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=routing_key
+            )
+            logger.info(f"Published payment result via RabbitMQ for order {order_id}")
+        except Exception as e:
+            logger.error(f"Failed to publish payment result: {str(e)}")
+            await self._notify_order_service(order_id, status)
+
+    async def _notify_order_service(self, order_id: int, payment_status: str):
+        """Notify order service about payment status"""
+        order_status = 'confirmed' if payment_status == 'success' else 'cancelled'
+        try:
+            # Shares the threaded client's circuit breaker and timeouts
+            status, body = await self.order_client.arequest(
+                self._session, 'PUT', f"/api/orders/{order_id}/status/", endpoint='status',
+                json={'status': order_status}
+            )
+            if status not in [200, 201]:
+                logger.error(f"Order service returned {status}: {body}")
+            else:
+                logger.info(f"Order {order_id} status updated to {order_status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            logger.error(f"Failed to notify order service: {str(e)}")
+
+    # Thread-safe interface used by the Flask endpoints
+
+    def reserve(self, timeout: Optional[float] = None):
+        """Claim a processing slot, raising ProcessorBusy after ``timeout``"""
+        async def acquire():
+            # The timeout runs on the loop, so a slot is either taken or not
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise ProcessorBusy(f"{self._pending} payments already pending")
+            self._pending += 1
+
+        asyncio.run_coroutine_threadsafe(acquire(), self._loop).result()
+
+    def release(self):
+        self._loop.call_soon_threadsafe(self._release_slot)
+
+    def schedule(self, payment_id: str):
+        self._loop.call_soon_threadsafe(self._schedule_settle, payment_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'runtime': 'async',
+            'max_pending': self.max_pending,
+            'pending': self._pending,
+            'settling': len(self._settling),
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'wait_time': self.wait_time.snapshot(),
+            'processing_time': self.processing_time.snapshot(),
+        }
+
+    def close(self, timeout: float = 5):
+        """Stop consuming, give in-flight payments ``timeout`` seconds, then stop the loop"""
+        async def shutdown():
+            if self._settling:
+                await asyncio.wait(list(self._settling), timeout=timeout)
+            if self._connection is not None:
+                await self._connection.close()
+            await self._session.close()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout + 1)
+        except Exception as e:
+            logger.error(f"Error shutting down async runtime: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+        self._db_executor.shutdown(wait=False)
@@ -0,0 +1,30 @@
+"""Rebuild the payment_stats aggregates from the payments table.
+
+    python backfill_stats.py [--database data/payments.db]
+"""
+import argparse
+import logging
+from config import Config
+from database import Database
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=Config.DATABASE_PATH)
+    args = parser.parse_args()
+
+    db = Database(args.database, pool_size=1)
+    with db.connection() as conn:
+        db.rebuild_payment_stats(conn.cursor())
+        conn.commit()
+        buckets = conn.execute('SELECT COUNT(*) FROM payment_stats').fetchone()[0]
+    db.close()
+
+    logger.info(f"Rebuilt {buckets} payment stats buckets from {args.database}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Concurrent payment writes: pooled WAL connections vs. connect-per-call.
+
+Each thread initiates payments and moves them to a terminal status, the
+same two round trips the payment.initiated consumer makes per order.
+
+    python benchmarks/db_concurrency.py --threads 16 --payments 200
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contextlib import contextmanager  # noqa: E402
+from database import Database  # noqa: E402
+from services import PaymentService  # noqa: E402
+
+
+class ConnectPerCallDatabase(Database):
+    """The previous behaviour: rollback journal and a fresh connection per call"""
+
+    def init_database(self):
+        super().init_database()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def worker(service, first_order_id, payments, errors, lock):
+    for order_id in range(first_order_id, first_order_id + payments):
+        try:
+            payment, _ = service.initiate_payment(order_id=order_id, user_id=1, amount=99.0)
+            # 'failed' keeps the run off the broker/HTTP notification path
+            service.update_payment_status(payment.payment_id, 'failed')
+        except sqlite3.Error:
+            with lock:
+                errors[0] += 1
+
+
+def run(label, database, threads, payments):
+    service = PaymentService.__new__(PaymentService)
+    service.db = database
+    service.order_service_url = 'http://localhost:0'
+
+    errors, lock = [0], threading.Lock()
+    workers = [
+        threading.Thread(target=worker, args=(service, index * payments, payments, errors, lock))
+        for index in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = threads * payments
+    print(f"{label:<18}{total / elapsed:>12.0f}{elapsed:>10.2f}{errors[0]:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--payments', type=int, default=200, help='payments per thread')
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads x {args.payments} payments")
+    print(f"{'database':<18}{'payments/s':>12}{'seconds':>10}{'errors':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        run('connect-per-call', ConnectPerCallDatabase(os.path.join(directory, 'legacy', 'payments.db')),
+            args.threads, args.payments)
+        pooled = Database(os.path.join(directory, 'pooled', 'payments.db'), pool_size=args.threads)
+        run('pooled WAL', pooled, args.threads, args.payments)
+        pooled.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""CPU and memory cost of mapping and rendering 100k payments.
+
+Compares the previous dict-backed Payment (field-by-name row copy,
+to_dict, json.dumps) with the slotted Payment, its precompiled row mapper
+and render_json.
+
+    python benchmarks/payment_render.py --payments 100000
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Payment, render_json  # noqa: E402
+
+
+class DictPayment:
+    """The previous Payment model, kept here for comparison"""
+
+    def __init__(self, payment_id, order_id, user_id, amount, status='pending', payment_method=None, created_at=None, updated_at=None, id=None, attempt=1):
+        self.id = id
+        self.payment_id = payment_id
+        self.order_id = order_id
+        self.attempt = attempt
+        self.user_id = user_id
+        self.amount = amount
+        self.status = status
+        self.payment_method = payment_method
+        self.created_at = created_at or datetime.now()
+        self.updated_at = updated_at or datetime.now()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'payment_id': self.payment_id,
+            'order_id': self.order_id,
+            'attempt': self.attempt,
+            'user_id': self.user_id,
+            'amount': self.amount,
+            'status': self.status,
+            'payment_method': self.payment_method,
+            'created_at': self.created_at.isoformat() if isinstance(self.created_at, datetime) else self.created_at,
+            'updated_at': self.updated_at.isoformat() if isinstance(self.updated_at, datetime) else self.updated_at
+        }
+
+    @classmethod
+    def from_db_row(cls, row):
+        return cls(
+            id=row['id'],
+            payment_id=row['payment_id'],
+            order_id=row['order_id'],
+            attempt=row['attempt'],
+            user_id=row['user_id'],
+            amount=row['amount'],
+            status=row['status'],
+            payment_method=row['payment_method'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at']
+        )
+
+
+def load_rows(count):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('''
+        CREATE TABLE payments (
+            id INTEGER PRIMARY KEY, payment_id TEXT, order_id INTEGER, attempt INTEGER,
+            user_id INTEGER, amount REAL, status TEXT, payment_method TEXT,
+            created_at TIMESTAMP, updated_at TIMESTAMP
+        )
+    ''')
+    now = str(datetime.now())
+    conn.executemany(
+        'INSERT INTO payments VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)',
+        [(n, f'pay_{n:012x}', n, n % 5000, 149.5, 'success', 'mock', now, now) for n in range(1, count + 1)]
+    )
+    return conn.execute('SELECT * FROM payments').fetchall()
+
+
+def measure(label, build, render, rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    payments = build(rows)
+    mapped = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    body = render(payments)
+    rendered = time.perf_counter()
+    print(
+        f"{label:<10}{(mapped - start) * 1000:>10.1f}{(rendered - mapped) * 1000:>12.1f}"
+        f"{peak / len(rows):>14.0f}{len(body):>12}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payments', type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = load_rows(args.payments)
+    print(f"{args.payments} payments")
+    print(f"{'model':<10}{'map ms':>10}{'render ms':>12}{'bytes/object':>14}{'json bytes':>12}")
+    measure(
+        'dict',
+        lambda rows: [DictPayment.from_db_row(row) for row in rows],
+        lambda payments: json.dumps({'payments': [payment.to_dict() for payment in payments]}).encode(),
+        rows
+    )
+    measure('slotted', Payment.from_db_rows, lambda payments: render_json({'payments': payments}), rows)
+
+
+if __name__ == '__main__':
+    main()
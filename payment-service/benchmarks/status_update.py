@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Per-update latency of PaymentService.save_payment_status.
+
+Compares the previous update, commit, then re-select on a second pooled
+connection with the single UPDATE ... RETURNING statement (and its
+pre-3.35 fallback).
+
+    python benchmarks/status_update.py --payments 2000 --rounds 5
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime
+from statistics import quantiles
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SUPPORTS_RETURNING  # noqa: E402
+from services import PaymentService  # noqa: E402
+
+
+def update_then_select(service, payment_id, status):
+    """The previous read-after-write round trip"""
+    with service.db.connection() as conn:
+        conn.execute(
+            'UPDATE payments SET status = ?, updated_at = ? WHERE payment_id = ?',
+            (status, datetime.now(), payment_id)
+        )
+        conn.commit()
+    return service.get_payment(payment_id)
+
+
+def measure(label, update, payment_ids, rounds):
+    latencies = []
+    statuses = ('failed', 'cancelled')  # off the notification path
+    for round_number in range(rounds):
+        status = statuses[round_number % 2]
+        for payment_id in payment_ids:
+            start = time.perf_counter()
+            update(payment_id, status)
+            latencies.append(time.perf_counter() - start)
+
+    cuts = quantiles(latencies, n=100)
+    print(
+        f"{label:<22}{sum(latencies) / len(latencies) * 1e6:>10.1f}"
+        f"{cuts[49] * 1e6:>10.1f}{cuts[98] * 1e6:>10.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payments', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        service = PaymentService(os.path.join(directory, 'data', 'payments.db'), 'http://localhost:0')
+        payment_ids = [
+            service.initiate_payment(order_id, user_id=1, amount=99.0)[0].payment_id
+            for order_id in range(args.payments)
+        ]
+
+        print(f"{args.payments} payments x {args.rounds} rounds")
+        print(f"{'strategy':<22}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+        measure('update + select', lambda *a: update_then_select(service, *a), payment_ids, args.rounds)
+
+        service.db.supports_returning = False
+        measure('update + select (1tx)', service.save_payment_status, payment_ids, args.rounds)
+
+        if SUPPORTS_RETURNING:
+            service.db.supports_returning = True
+            measure('update returning', service.save_payment_status, payment_ids, args.rounds)
+        service.db.close()
+
+
+if __name__ == '__main__':
+    main()
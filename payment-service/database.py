@@ -1,26 +1,50 @@
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+# UPDATE ... RETURNING arrived in SQLite 3.35
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
 class Database:
-    def __init__(self, db_path):
+    """SQLite access through a pool of long-lived, tuned connections.
+
+    The database runs in WAL mode so readers never block the writer, and
+    each pooled connection keeps its own prepared statement cache, so
+    borrowing one costs neither an open nor a re-prepare.
+    """
+
+    def __init__(self, db_path, pool_size=8, busy_timeout_ms=5000, cached_statements=256):
         self.db_path = db_path
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.supports_returning = SUPPORTS_RETURNING
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
         self.init_database()
-    
+
     def init_database(self):
         """Initialize the database and create tables if they don't exist"""
         # Ensure directory exists
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
+
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
+
+        # WAL is persistent: set once, it applies to every later connection
+        cursor.execute('PRAGMA journal_mode=WAL')
+
         # Create payments table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS payments (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 payment_id TEXT UNIQUE NOT NULL,
                 order_id INTEGER NOT NULL,
+                attempt INTEGER NOT NULL DEFAULT 1,
                 user_id INTEGER NOT NULL,
                 amount REAL NOT NULL,
                 status TEXT DEFAULT 'pending',
@@ -29,17 +53,166 @@ class Database:
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        
+
+        # Databases created before payments were keyed by attempt: number
+        # any earlier duplicates per order so the unique index can be built
+        columns = [column[1] for column in cursor.execute('PRAGMA table_info(payments)')]
+        if 'attempt' not in columns:
+            cursor.execute('ALTER TABLE payments ADD COLUMN attempt INTEGER NOT NULL DEFAULT 1')
+            cursor.execute('''
+                UPDATE payments SET attempt = (
+                    SELECT COUNT(*) FROM payments AS earlier
+                    WHERE earlier.order_id = payments.order_id AND earlier.id <= payments.id
+                )
+            ''')
+
         # Create indexes
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_order_id ON payments(order_id)')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_order_attempt ON payments(order_id, attempt)')
+        cursor.execute('DROP INDEX IF EXISTS idx_payments_order_id')  # covered by idx_payments_order_attempt
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_payment_id ON payments(payment_id)')
-        
+
+        self._create_payment_stats(cursor)
+
         conn.commit()
         conn.close()
-    
+
+    def _create_payment_stats(self, cursor):
+        """Create the rolling stats table and the triggers that maintain it.
+
+        Every payment is counted in a 'day' bucket (YYYY-MM-DD) and an 'hour'
+        bucket (YYYY-MM-DD HH) of its created_at. The triggers run inside the
+        writing statement, so the aggregates can never drift from the rows.
+        """
+        existed = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'payment_stats'"
+        ).fetchone()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS payment_stats (
+                period TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                total_payments INTEGER NOT NULL DEFAULT 0,
+                successful_payments INTEGER NOT NULL DEFAULT 0,
+                total_revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (period, bucket)
+            ) WITHOUT ROWID
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS payment_stats_on_insert AFTER INSERT ON payments
+            BEGIN
+                INSERT INTO payment_stats (period, bucket, total_payments, successful_payments, total_revenue)
+                VALUES
+                    ('day', substr(NEW.created_at, 1, 10), 1, NEW.status = 'success',
+                     CASE WHEN NEW.status = 'success' THEN NEW.amount ELSE 0 END),
+                    ('hour', substr(NEW.created_at, 1, 13), 1, NEW.status = 'success',
+                     CASE WHEN NEW.status = 'success' THEN NEW.amount ELSE 0 END)
+                ON CONFLICT (period, bucket) DO UPDATE SET
+                    total_payments = total_payments + excluded.total_payments,
+                    successful_payments = successful_payments + excluded.successful_payments,
+                    total_revenue = total_revenue + excluded.total_revenue;
+            END
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS payment_stats_on_status AFTER UPDATE OF status ON payments
+            WHEN (OLD.status = 'success') IS NOT (NEW.status = 'success')
+            BEGIN
+                UPDATE payment_stats SET
+                    successful_payments = successful_payments + (NEW.status = 'success') - (OLD.status = 'success'),
+                    total_revenue = total_revenue
+                        + CASE WHEN NEW.status = 'success' THEN NEW.amount ELSE 0 END
+                        - CASE WHEN OLD.status = 'success' THEN OLD.amount ELSE 0 END
+                WHERE (period = 'day' AND bucket = substr(NEW.created_at, 1, 10))
+                   OR (period = 'hour' AND bucket = substr(NEW.created_at, 1, 13));
+            END
+        ''')
+
+        # First start on an existing database: seed the buckets from history
+        if not existed:
+            self.rebuild_payment_stats(cursor)
+
+    def rebuild_payment_stats(self, cursor):
+        """Recompute every stats bucket from the payments table"""
+        cursor.execute('DELETE FROM payment_stats')
+        for period, length in (('day', 10), ('hour', 13)):
+            cursor.execute('''
+                INSERT INTO payment_stats (period, bucket, total_payments, successful_payments, total_revenue)
+                SELECT
+                    ?,
+                    substr(created_at, 1, ?),
+                    COUNT(*),
+                    SUM(status = 'success'),
+                    SUM(CASE WHEN status = 'success' THEN amount ELSE 0 END)
+                FROM payments
+                GROUP BY substr(created_at, 1, ?)
+            ''', (period, length, length))
+
     def get_connection(self):
-        """Get a database connection"""
-        conn = sqlite3.connect(self.db_path)
+        """Open a new tuned database connection (prefer ``connection()``)"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # pooled connections move between threads
+            cached_statements=self.cached_statements
+        )
         conn.row_factory = sqlite3.Row  # Enable column access by name
-        return conn
\ No newline at end of file
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+        conn.execute('PRAGMA synchronous=NORMAL')  # durable at checkpoints; safe with WAL
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for the duration of a ``with`` block.
+
+        Uncommitted work is rolled back when the block exits, so a failed
+        operation never leaks an open transaction to the next borrower.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                conn.close()
+                with self._lock:
+                    self._created -= 1
+            else:
+                self._pool.put(conn)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.pool_size
+            if create:
+                self._created += 1
+
+        if create:
+            try:
+                return self.get_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._pool.get(timeout=self.busy_timeout_ms / 1000)
+        except queue.Empty:
+            raise sqlite3.OperationalError('Timed out waiting for a pooled database connection')
+
+    def close(self):
+        """Close every idle pooled connection"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
@@ -1,19 +1,468 @@
 import pika
-import json
+import time
+import queue
 import logging
 import threading
-from typing import Dict, Any, Callable
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from event_codec import encode_event, decode_event
+from payment_processor import ProcessorBusy
+from services import is_stalled
 
 logger = logging.getLogger(__name__)
 
+class DeliveryNotConfirmed(Exception):
+    """Raised on a publish future when the broker never confirmed the message"""
+
+
+class _PendingPublish:
+    __slots__ = ('future', 'routing_key', 'body', 'properties', 'attempts', 'sent_at')
+
+    def __init__(self, future, routing_key, body, properties):
+        self.future = future
+        self.routing_key = routing_key
+        self.body = body
+        self.properties = properties
+        self.attempts = 0
+        self.sent_at = None
+
+
+class ConfirmingPublisher:
+    """Publisher with pipelined publisher confirms.
+
+    Runs its own pika ``SelectConnection`` IO loop on a background thread.
+    ``publish`` is thread-safe and returns a ``Future`` straight away, so
+    many messages are in flight at once. The broker's acks (including
+    ``multiple`` acks) are matched to messages by delivery tag. Nacked,
+    timed-out or connection-lost messages are retried up to ``max_retries``
+    times, after which the future fails with ``DeliveryNotConfirmed`` so the
+    caller can park the message. Retries may reorder messages.
+    """
+
+    def __init__(self, url: str, exchange: str, confirm_timeout: float = 5, max_retries: int = 3):
+        self.url = url
+        self.exchange = exchange
+        self.confirm_timeout = confirm_timeout
+        self.max_retries = max_retries
+        self._submitted = queue.Queue()
+        self._retry = collections.deque()
+        self._pending = {}
+        self._delivery_tag = 0
+        self._connection = None
+        self._channel = None
+        self._reconnect_delay = 0.5
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rabbitmq-confirming-publisher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self._channel is not None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def publish(self, routing_key: str, body, properties: pika.BasicProperties) -> Future:
+        """Queue a message for publishing; the future resolves on broker ack.
+
+        Raises ConnectionError while disconnected, so callers with their own
+        durable retry (like the outbox relay) do not pile up duplicates.
+        """
+        if not self.ready:
+            raise ConnectionError('Confirming publisher is not connected to RabbitMQ')
+        future = Future()
+        self._submitted.put(_PendingPublish(future, routing_key, body, properties))
+        self._wake()
+        return future
+
+    def _wake(self):
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._drain)
+            except Exception:
+                # Connection is being replaced; the new channel drains on open
+                pass
+
+    # -- IO loop thread only below this line --
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._connection = pika.SelectConnection(
+                pika.URLParameters(self.url),
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed
+            )
+            self._connection.ioloop.start()
+            self._channel = None
+            if not self._stopping.is_set():
+                self._stopping.wait(self._reconnect_delay)
+                self._reconnect_delay = min(self._reconnect_delay * 2, 30)
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error):
+        logger.error(f"Confirming publisher failed to connect to RabbitMQ: {str(error)}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self._channel = None
+        # Anything unconfirmed must be sent again on the next connection
+        for tag in sorted(self._pending, reverse=True):
+            self._retry.appendleft(self._pending.pop(tag))
+        if not self._stopping.is_set():
+            logger.warning(f"Confirming publisher connection closed: {reason}")
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.exchange_declare(
+            exchange=self.exchange,
+            exchange_type='topic',
+            durable=True,
+            callback=lambda frame: channel.confirm_delivery(
+                ack_nack_callback=self._on_delivery_confirmation,
+                callback=lambda frame: self._on_confirm_mode(channel)
+            )
+        )
+
+    def _on_channel_closed(self, channel, reason):
+        # A channel-level error (e.g. missing exchange); start over cleanly
+        self._channel = None
+        if self._connection.is_open:
+            self._connection.close()
+
+    def _on_confirm_mode(self, channel):
+        self._channel = channel
+        self._delivery_tag = 0
+        self._reconnect_delay = 0.5
+        self._connection.ioloop.call_later(1, self._check_timeouts)
+        self._drain()
+
+    def _drain(self):
+        if self._channel is None:
+            return
+        while self._retry:
+            self._send(self._retry.popleft())
+        while True:
+            try:
+                pending = self._submitted.get_nowait()
+            except queue.Empty:
+                break
+            self._send(pending)
+
+    def _send(self, pending: _PendingPublish):
+        self._delivery_tag += 1
+        pending.sent_at = time.monotonic()
+        self._pending[self._delivery_tag] = pending
+        self._channel.basic_publish(
+            exchange=self.exchange,
+            routing_key=pending.routing_key,
+            body=pending.body,
+            properties=pending.properties
+        )
+
+    def _on_delivery_confirmation(self, method_frame):
+        confirm = method_frame.method
+        if confirm.multiple:
+            tags = [tag for tag in self._pending if tag <= confirm.delivery_tag]
+        else:
+            tags = [confirm.delivery_tag] if confirm.delivery_tag in self._pending else []
+
+        acked = isinstance(confirm, pika.spec.Basic.Ack)
+        for tag in tags:
+            pending = self._pending.pop(tag)
+            if acked:
+                pending.future.set_result(True)
+            else:
+                self._failed(pending, 'nacked by broker')
+        if not acked:
+            self._drain()
+
+    def _check_timeouts(self):
+        if self._channel is None:
+            return
+        deadline = time.monotonic() - self.confirm_timeout
+        expired = [tag for tag, pending in self._pending.items() if pending.sent_at < deadline]
+        for tag in expired:
+            self._failed(self._pending.pop(tag), 'confirm timed out')
+        if expired:
+            self._drain()
+        self._connection.ioloop.call_later(1, self._check_timeouts)
+
+    def _failed(self, pending: _PendingPublish, reason: str):
+        pending.attempts += 1
+        if pending.attempts > self.max_retries:
+            logger.error(f"Giving up on message to {pending.routing_key}: {reason}")
+            pending.future.set_exception(DeliveryNotConfirmed(f"{pending.routing_key}: {reason}"))
+        else:
+            self._retry.append(pending)
+
+    def _stop_loop(self):
+        if self._connection.is_open:
+            self._connection.close()
+        else:
+            self._connection.ioloop.stop()
+
+    def close(self, timeout: float = 5):
+        """Wait briefly for outstanding confirms, then stop the IO loop"""
+        deadline = time.monotonic() + timeout
+        while (self._pending or not self._submitted.empty()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stopping.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._stop_loop)
+            except Exception:
+                pass
+        self._thread.join(timeout=timeout)
+
+
+class BatchingPublisher:
+    """Publishes payment results from one dedicated thread.
+
+    ``publish`` only enqueues, so completing a payment never waits on
+    broker I/O or shares a channel across threads. The publisher thread
+    owns its own connection and takes messages in batches of up to
+    ``batch_size``, waiting at most ``linger`` seconds for a batch to fill.
+    The buffer holds ``buffer_size`` messages. When it is full, ``publish``
+    raises ``ConnectionError`` and the caller falls back. ``close`` drains
+    what is buffered before disconnecting.
+    """
+
+    _STOP = object()
+
+    def __init__(self, url: str, exchange: str, batch_size: int = 100, linger: float = 0.005, buffer_size: int = 10000):
+        self.url = url
+        self.exchange = exchange
+        self.batch_size = batch_size
+        self.linger = linger
+        self._buffer = queue.Queue(maxsize=buffer_size)
+        self._connection = None
+        self._channel = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='rabbitmq-batching-publisher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def buffered(self) -> int:
+        return self._buffer.qsize()
+
+    def publish(self, routing_key: str, body, properties: pika.BasicProperties) -> Future:
+        """Buffer a message; the future resolves once its batch is written"""
+        if self._closed:
+            raise ConnectionError('Batching publisher is closed')
+        future = Future()
+        try:
+            self._buffer.put_nowait((routing_key, body, properties, future))
+        except queue.Full:
+            raise ConnectionError('Payment result buffer is full')
+        return future
+
+    def _next_batch(self):
+        """Block for the first message, then linger briefly for more"""
+        try:
+            first = self._buffer.get(timeout=1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size and batch[-1] is not self._STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._buffer.get(timeout=remaining) if remaining > 0 else self._buffer.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            if batch and batch[-1] is self._STOP:
+                batch.pop()
+                stopping = True
+            if batch:
+                self._send(batch)
+            else:
+                self._keep_alive()
+        self._disconnect()
+
+    def _send(self, batch):
+        # Messages before ``sent`` were handed to the broker; a retry resumes
+        # after them rather than publishing them twice
+        sent = 0
+        for attempt in range(2):
+            try:
+                if self._channel is None or self._channel.is_closed:
+                    self._connect()
+                for routing_key, body, properties, _ in batch[sent:]:
+                    self._channel.basic_publish(
+                        exchange=self.exchange,
+                        routing_key=routing_key,
+                        body=body,
+                        properties=properties
+                    )
+                    sent += 1
+                # Service heartbeats and surface a broker-closed channel
+                self._connection.process_data_events(0)
+                break
+            except Exception as e:
+                logger.error(f"Failed to publish {len(batch) - sent} payment result(s): {str(e)}")
+                self._disconnect()
+                if attempt:
+                    # Only the unsent results fail, so callers fall back for those alone
+                    for *_, future in batch[sent:]:
+                        future.set_exception(ConnectionError(str(e)))
+                    break
+
+        for *_, future in batch[:sent]:
+            future.set_result(None)
+
+    def _keep_alive(self):
+        # Service heartbeats while idle
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.process_data_events(0)
+        except Exception:
+            self._disconnect()
+
+    def _connect(self):
+        self._connection = pika.BlockingConnection(pika.URLParameters(self.url))
+        self._channel = self._connection.channel()
+        self._channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+
+    def _disconnect(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+
+    def close(self, timeout: float = 5):
+        """Stop accepting results and drain the buffer before disconnecting"""
+        self._closed = True
+        try:
+            self._buffer.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=timeout)
+
+
+class _AckBatcher:
+    """Settles deliveries from handler threads on the consumer thread.
+
+    Handlers finish out of order; ``complete`` records the outcome and
+    settlement walks the outstanding delivery tags from the oldest. A run of
+    contiguous successes is acked with a single ``multiple=True`` ack once
+    ``batch_size`` have piled up or ``interval`` seconds have passed, so a
+    slow handler never gets acked early and a message is only ever acked
+    after it was handled (at-least-once). Nacks go out individually.
+    """
+
+    ACK = 'ack'
+    REQUEUE = 'requeue'
+    REJECT = 'reject'
+
+    def __init__(self, connection, channel, batch_size: int = 16, interval: float = 0.05):
+        self.connection = connection
+        self.channel = channel
+        self.batch_size = batch_size
+        self.interval = interval
+        self._outstanding = collections.OrderedDict()  # delivery tag -> outcome (None while running)
+        self._acked_tag = None
+        self._acked_count = 0
+        self._timer = None
+
+    def track(self, delivery_tag: int):
+        self._outstanding[delivery_tag] = None
+
+    def complete(self, delivery_tag: int, outcome: str):
+        """Record a handler outcome; safe to call from any thread"""
+        self.connection.add_callback_threadsafe(lambda: self._settle(delivery_tag, outcome))
+
+    def _settle(self, delivery_tag: int, outcome: str):
+        self._outstanding[delivery_tag] = outcome
+
+        while self._outstanding:
+            tag, result = next(iter(self._outstanding.items()))
+            if result is None:
+                break
+            del self._outstanding[tag]
+
+            if result == self.ACK:
+                self._acked_tag = tag
+                self._acked_count += 1
+            else:
+                self.flush()
+                self.channel.basic_nack(delivery_tag=tag, requeue=result == self.REQUEUE)
+
+        if self._acked_count >= self.batch_size:
+            self.flush()
+        elif self._acked_count and self._timer is None:
+            self._timer = self.connection.call_later(self.interval, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Ack every contiguous success settled so far in one frame"""
+        if self._timer is not None:
+            self.connection.remove_timeout(self._timer)
+            self._timer = None
+        if self._acked_tag is not None:
+            self.channel.basic_ack(delivery_tag=self._acked_tag, multiple=True)
+            self._acked_tag = None
+            self._acked_count = 0
+
+
+def build_payment_result_event(order_id: int, payment_status: str, payment_id: str = None):
+    """Return the (routing_key, message) pair for a payment result"""
+    message = {
+        'event_type': 'payment_completed',
+        'order_id': order_id,
+        'payment_status': payment_status,
+        'payment_id': payment_id
+    }
+    return f'payment.{payment_status}', message
+
+
 class RabbitMQService:
     """RabbitMQ Service for Payment Service messaging"""
     
-    def __init__(self, rabbitmq_url: str):
+    def __init__(self, rabbitmq_url: str, publisher_confirms: bool = False, event_codec: str = 'orjson',
+                 publish_batch_size: int = 100, publish_linger: float = 0.005, publish_buffer_size: int = 10000,
+                 confirm_timeout: float = 5, confirm_max_retries: int = 3):
         self.rabbitmq_url = rabbitmq_url
         self.connection = None
         self.channel = None
         self.exchange = 'canteen.orders'
+        self.event_codec = event_codec
+        self.confirming_publisher = None
+        self.result_publisher = None
+        self._handler_pool = None
+        if publisher_confirms:
+            self.confirming_publisher = ConfirmingPublisher(
+                rabbitmq_url, self.exchange, confirm_timeout, confirm_max_retries
+            ).start()
+        else:
+            self.result_publisher = BatchingPublisher(
+                rabbitmq_url, self.exchange, publish_batch_size, publish_linger, publish_buffer_size
+            ).start()
         self._connect()
         
     def _connect(self):
@@ -37,8 +486,15 @@ class RabbitMQService:
             logger.error(f"Failed to connect to RabbitMQ: {str(e)}")
             raise
     
-    def setup_consumer(self, payment_service):
-        """Set up consumer for payment initiation events"""
+    def setup_consumer(self, payment_service, payment_processor, submit_timeout: float = 2.0,
+                       prefetch_count: int = 64, workers: int = 8,
+                       ack_batch_size: int = 16, ack_interval: float = 0.05):
+        """Set up consumer for payment initiation events.
+
+        The broker keeps at most ``prefetch_count`` unacked deliveries in this
+        process; ``workers`` threads handle them and ``_AckBatcher`` acks them
+        back in contiguous batches.
+        """
         try:
             if not self.connection or self.connection.is_closed:
                 self._connect()
@@ -54,14 +510,29 @@ class RabbitMQService:
                 routing_key='payment.initiated'
             )
             
-            def callback(ch, method, properties, body):
+            # Bound in-memory buffering; acks held back for a batch count
+            # against it until the flush interval releases them
+            self.channel.basic_qos(prefetch_count=prefetch_count)
+            
+            acks = _AckBatcher(self.connection, self.channel, ack_batch_size, ack_interval)
+            self._handler_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='payment-consumer')
+            
+            def handle(delivery_tag, properties, body):
                 try:
-                    message = json.loads(body.decode('utf-8'))
-                    self._handle_payment_message(message, payment_service)
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    message = decode_event(body, properties.content_type, properties.headers)
+                    self._handle_payment_message(message, payment_service, payment_processor, submit_timeout)
+                    acks.complete(delivery_tag, _AckBatcher.ACK)
+                except ProcessorBusy as e:
+                    # Hand the message back so another replica (or a later retry) takes it
+                    logger.warning(f"Deferring payment message: {str(e)}")
+                    acks.complete(delivery_tag, _AckBatcher.REQUEUE)
                 except Exception as e:
                     logger.error(f"Error processing payment message: {str(e)}")
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    acks.complete(delivery_tag, _AckBatcher.REJECT)
+            
+            def callback(ch, method, properties, body):
+                acks.track(method.delivery_tag)
+                self._handler_pool.submit(handle, method.delivery_tag, properties, body)
             
             self.channel.basic_consume(
                 queue=queue_name,
@@ -74,7 +545,7 @@ class RabbitMQService:
             logger.error(f"Failed to set up consumer: {str(e)}")
             raise
     
-    def _handle_payment_message(self, message: Dict[str, Any], payment_service):
+    def _handle_payment_message(self, message: Dict[str, Any], payment_service, payment_processor, submit_timeout: float):
         """Handle payment initiation message"""
         try:
             if message.get('event_type') == 'payment_initiated':
@@ -84,20 +555,32 @@ class RabbitMQService:
                 
                 logger.info(f"Processing payment initiation for order {order_id}")
                 
+                # Claim a processing slot first, so a full processor pushes
+                # back on the broker instead of piling up pending rows
+                payment_processor.reserve(timeout=submit_timeout)
+                
                 # Initiate payment
-                payment = payment_service.initiate_payment(
-                    order_id=order_id,
-                    user_id=user_id,
-                    amount=amount,
-                    payment_method='mock'
-                )
+                try:
+                    payment, created = payment_service.initiate_payment(
+                        order_id=order_id,
+                        user_id=user_id,
+                        amount=amount,
+                        payment_method='mock',
+                        attempt=message.get('attempt', 1)
+                    )
+                except Exception:
+                    payment_processor.release()
+                    raise
+                
+                # Redelivered message: the payment is already being processed,
+                # unless the process that created it died before scheduling it
+                if not created and not is_stalled(payment, payment_processor.delay):
+                    payment_processor.release()
+                    return
                 
                 if payment:
-                    # Start async payment processing
-                    threading.Thread(
-                        target=payment_service.process_mock_payment,
-                        args=(payment.payment_id,)
-                    ).start()
+                    # Schedule mock processing on the bounded processor
+                    payment_processor.schedule(payment.payment_id)
                     
                     logger.info(f"Payment {payment.payment_id} initiated for order {order_id}")
                 
@@ -105,36 +588,45 @@ class RabbitMQService:
             logger.error(f"Failed to handle payment message: {str(e)}")
             raise
     
-    def publish_payment_result(self, order_id: int, payment_status: str, payment_id: str = None):
-        """Publish payment result event"""
+    def publish_payment_result(self, order_id: int, payment_status: str, payment_id: str = None) -> Optional[Future]:
+        """Publish payment result event.
+
+        Returns a future that resolves once the event is written (or, with
+        publisher confirms on, acknowledged by the broker). Raises
+        ConnectionError when the event cannot be taken, so the caller can
+        fall back.
+        """
+        confirmations = self.publish_payment_results([(order_id, payment_status, payment_id)])
+        return confirmations[0] if confirmations else None
+    
+    def publish_payment_results(self, results: List[Tuple[int, str, Optional[str]]]) -> Optional[List[Future]]:
+        """Publish a batch of (order_id, payment_status, payment_id) results.
+
+        Same contract as ``publish_payment_result``, with one future per
+        result. Nothing here touches the network; the publisher thread does.
+        """
         try:
-            if not self.connection or self.connection.is_closed:
-                self._connect()
-            
-            message = {
-                'event_type': 'payment_completed',
-                'order_id': order_id,
-                'payment_status': payment_status,
-                'payment_id': payment_id
-            }
-            
-            routing_key = f'payment.{payment_status}'
-            
-            self.channel.basic_publish(
-                exchange=self.exchange,
-                routing_key=routing_key,
-                body=json.dumps(message, default=str),
-                properties=pika.BasicProperties(
+            publisher = self.confirming_publisher or self.result_publisher
+            confirmations = []
+            for order_id, payment_status, payment_id in results:
+                routing_key, message = build_payment_result_event(order_id, payment_status, payment_id)
+                body, content_type, headers = encode_event(message, self.event_codec)
+                properties = pika.BasicProperties(
                     delivery_mode=2,  # Make message persistent
-                    content_type='application/json'
+                    content_type=content_type,
+                    headers=headers
                 )
-            )
+                confirmations.append(publisher.publish(routing_key, body, properties))
             
-            logger.info(f"Published payment result: {payment_status} for order {order_id}")
+            logger.info(f"Queued {len(confirmations)} payment result(s) for publishing")
+            return confirmations
             
+        except ConnectionError:
+            raise
         except Exception as e:
             logger.error(f"Failed to publish payment result: {str(e)}")
             # Don't raise to avoid breaking payment flow
+            return None
     
     def start_consuming(self):
         """Start consuming messages (blocking)"""
@@ -151,6 +643,13 @@ class RabbitMQService:
     def close(self):
         """Close RabbitMQ connection"""
         try:
+            if self.confirming_publisher:
+                self.confirming_publisher.close()
+            if self.result_publisher:
+                self.result_publisher.close()
+            if self._handler_pool:
+                # Unacked deliveries are redelivered after the connection closes
+                self._handler_pool.shutdown(wait=False, cancel_futures=True)
             if self.channel and not self.channel.is_closed:
                 self.channel.close()
             if self.connection and not self.connection.is_closed:
@@ -162,9 +661,16 @@ class RabbitMQService:
 # Global instance
 _rabbitmq_service = None
 
-def get_rabbitmq_service(rabbitmq_url: str = None) -> RabbitMQService:
+def get_rabbitmq_service(rabbitmq_url: str = None, publisher_confirms: bool = False, event_codec: str = 'orjson',
+                         publish_batch_size: int = 100, publish_linger: float = 0.005,
+                         publish_buffer_size: int = 10000, confirm_timeout: float = 5,
+                         confirm_max_retries: int = 3) -> RabbitMQService:
     """Get or create RabbitMQ service instance"""
     global _rabbitmq_service
     if _rabbitmq_service is None and rabbitmq_url:
-        _rabbitmq_service = RabbitMQService(rabbitmq_url)
+        _rabbitmq_service = RabbitMQService(
+            rabbitmq_url, publisher_confirms, event_codec,
+            publish_batch_size, publish_linger, publish_buffer_size,
+            confirm_timeout, confirm_max_retries
+        )
     return _rabbitmq_service
\ No newline at end of file
@@ -1,40 +1,91 @@
+import json
+from operator import itemgetter
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+@dataclass(slots=True)
 class Payment:
-    def __init__(self, payment_id, order_id, user_id, amount, status='pending', payment_method=None, created_at=None, updated_at=None, id=None):
-        self.id = id
-        self.payment_id = payment_id
-        self.order_id = order_id
-        self.user_id = user_id
-        self.amount = amount
-        self.status = status
-        self.payment_method = payment_method
-        self.created_at = created_at or datetime.now()
-        self.updated_at = updated_at or datetime.now()
-    
+    payment_id: str
+    order_id: int
+    user_id: int
+    amount: float
+    status: str = 'pending'
+    payment_method: Optional[str] = None
+    created_at: Any = None
+    updated_at: Any = None
+    id: Optional[int] = None
+    attempt: int = 1
+
+    def __post_init__(self):
+        self.created_at = self.created_at or datetime.now()
+        self.updated_at = self.updated_at or datetime.now()
+
     def to_dict(self):
+        created_at, updated_at = self.created_at, self.updated_at
         return {
             'id': self.id,
             'payment_id': self.payment_id,
             'order_id': self.order_id,
+            'attempt': self.attempt,
             'user_id': self.user_id,
             'amount': self.amount,
             'status': self.status,
             'payment_method': self.payment_method,
-            'created_at': self.created_at.isoformat() if isinstance(self.created_at, datetime) else self.created_at,
-            'updated_at': self.updated_at.isoformat() if isinstance(self.updated_at, datetime) else self.updated_at
+            # Rows read back from SQLite already hold text timestamps
+            'created_at': created_at if created_at.__class__ is str else created_at.isoformat(),
+            'updated_at': updated_at if updated_at.__class__ is str else updated_at.isoformat()
         }
-    
+
     @classmethod
     def from_db_row(cls, row):
-        return cls(
-            id=row['id'],
-            payment_id=row['payment_id'],
-            order_id=row['order_id'],
-            user_id=row['user_id'],
-            amount=row['amount'],
-            status=row['status'],
-            payment_method=row['payment_method'],
-            created_at=row['created_at'],
-            updated_at=row['updated_at']
-        )
\ No newline at end of file
+        return row_mapper(tuple(row.keys()))(row)
+
+    @classmethod
+    def from_db_rows(cls, rows):
+        if not rows:
+            return []
+        mapper = row_mapper(tuple(rows[0].keys()))
+        return [mapper(row) for row in rows]
+
+# Column layout -> function building a Payment from a row with that layout
+_row_mappers = {}
+
+def row_mapper(columns):
+    """Return a row-to-Payment function precompiled for a result's columns.
+
+    The column positions are resolved once per query shape, so mapping a
+    row is one ``itemgetter`` call and a positional constructor call,
+    with no per-field name lookups.
+    """
+    mapper = _row_mappers.get(columns)
+    if mapper is None:
+        values = itemgetter(*(columns.index(field) for field in Payment.__slots__))
+
+        def mapper(row):
+            return Payment(*values(row))
+
+        _row_mappers[columns] = mapper
+    return mapper
+
+def render_json(value) -> bytes:
+    """Serialize a response containing Payments straight to JSON bytes.
+
+    orjson writes slotted dataclasses and datetimes natively, so no
+    intermediate dict is built per payment.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_to_json).encode()
+
+def _to_json(value):
+    if isinstance(value, Payment):
+        return value.to_dict()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
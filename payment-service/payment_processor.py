@@ -0,0 +1,199 @@
+import time
+import heapq
+import queue
+import logging
+import itertools
+import threading
+import collections
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class ProcessorBusy(Exception):
+    """Raised when the processor is at capacity and the caller should back off"""
+
+
+class LatencyWindow:
+    """Count, mean, max and percentiles over the most recent samples"""
+
+    def __init__(self, size: int = 1024):
+        self._samples = collections.deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        samples = sorted(self._samples)
+
+        def percentile(fraction):
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 2)
+
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(self.max * 1000, 2),
+        }
+
+
+class PaymentProcessor:
+    """Bounded executor for mock payment processing.
+
+    ``schedule`` parks a payment on a timer heap instead of sleeping a thread
+    through the simulated processing delay. One scheduler thread moves due
+    payments onto a ready queue that ``workers`` threads drain. At most
+    ``max_pending`` payments are scheduled, ready or running at once; beyond
+    that ``reserve`` blocks for up to ``timeout`` seconds and then raises
+    ``ProcessorBusy``, which callers turn into backpressure.
+    """
+
+    def __init__(self, payment_service, workers: int = 8, max_pending: int = 1000, delay: float = 1.0):
+        self.payment_service = payment_service
+        self.workers = workers
+        self.max_pending = max_pending
+        self.delay = delay
+
+        self._timers = []
+        self._sequence = itertools.count()
+        self._ready = queue.Queue()
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._running = 0
+        self._stopping = False
+        self._threads = []
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_time = LatencyWindow()
+        self.processing_time = LatencyWindow()
+
+    def start(self) -> 'PaymentProcessor':
+        self._threads.append(threading.Thread(target=self._schedule, name='payment-scheduler', daemon=True))
+        for index in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f'payment-worker-{index}', daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def reserve(self, timeout: Optional[float] = None):
+        """Claim a processing slot ahead of creating the payment.
+
+        Blocks for up to ``timeout`` seconds while the processor is full,
+        then raises ``ProcessorBusy``. Follow with ``schedule`` or, if the
+        payment could not be created, ``release``.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._stopping or self._pending < self.max_pending, timeout
+            ):
+                self.rejected += 1
+                raise ProcessorBusy(f"{self._pending} payments already pending")
+            if self._stopping:
+                raise ProcessorBusy("Payment processor is shutting down")
+            self._pending += 1
+
+    def release(self):
+        """Give back a slot claimed by ``reserve`` that will not be scheduled"""
+        with self._condition:
+            self._pending -= 1
+            self._condition.notify_all()
+
+    def schedule(self, payment_id: str):
+        """Process a payment in a reserved slot once the mock delay has passed"""
+        with self._condition:
+            heapq.heappush(self._timers, (time.monotonic() + self.delay, next(self._sequence), payment_id))
+            self._condition.notify_all()
+
+    def submit(self, payment_id: str, timeout: Optional[float] = None):
+        """Reserve a slot and schedule an existing payment"""
+        self.reserve(timeout)
+        self.schedule(payment_id)
+
+    def _schedule(self):
+        with self._condition:
+            while not self._stopping:
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    due_at, _, payment_id = heapq.heappop(self._timers)
+                    self._ready.put((due_at, payment_id))
+
+                timeout = self._timers[0][0] - now if self._timers else None
+                self._condition.wait(timeout)
+
+    def _work(self):
+        while True:
+            item = self._ready.get()
+            if item is None:
+                return
+
+            due_at, payment_id = item
+            started = time.monotonic()
+            with self._condition:
+                self._running += 1
+                self.wait_time.add(started - due_at)
+
+            try:
+                self.payment_service.settle_mock_payment(payment_id)
+                succeeded = True
+            except Exception as e:
+                logger.error(f"Failed to process mock payment {payment_id}: {str(e)}")
+                succeeded = False
+
+            with self._condition:
+                self._running -= 1
+                self._pending -= 1
+                self.processing_time.add(time.monotonic() - started)
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'scheduled': len(self._timers),
+                'ready': self._ready.qsize(),
+                'running': self._running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'wait_time': self.wait_time.snapshot(),
+                'processing_time': self.processing_time.snapshot(),
+            }
+
+    def close(self, timeout: float = 5):
+        """Stop accepting payments and let the workers finish the ready queue.
+
+        Payments still on the timer heap stay ``pending`` in the database.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for _ in range(self.workers):
+            self._ready.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+# Global instance
+_payment_processor = None
+
+def get_payment_processor(payment_service=None, workers: int = 8, max_pending: int = 1000, delay: float = 1.0) -> PaymentProcessor:
+    """Get or create the payment processor"""
+    global _payment_processor
+    if _payment_processor is None and payment_service is not None:
+        _payment_processor = PaymentProcessor(payment_service, workers, max_pending, delay).start()
+    return _payment_processor
@@ -0,0 +1,217 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Gateway errors worth retrying; every 5xx counts against the upstream
+RETRY_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    are refused for ``reset_timeout`` seconds. Then a single trial call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._trial = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"{self.name} circuit closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                if not self._trial:
+                    self.opened += 1
+                    logger.warning(f"{self.name} circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._opened_at is None:
+                state = 'closed'
+            elif self._trial or time.monotonic() - self._opened_at >= self.reset_timeout:
+                state = 'half_open'
+            else:
+                state = 'open'
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+
+
+class ServiceClient:
+    """HTTP client for one upstream service.
+
+    Requests share a keep-alive connection pool and a circuit breaker.
+    Timeouts are set per endpoint (a short connect timeout plus a read
+    timeout), and idempotent calls are retried on connection errors and
+    gateway errors with full-jitter exponential backoff. While the circuit
+    is open, calls raise ``CircuitOpenError`` at once, so a degraded upstream
+    costs callers nothing instead of a timeout each.
+    """
+
+    def __init__(self, name: str, base_url: str, pool_size: int = 10, timeouts: Dict[str, float] = None,
+                 timeout: float = 5.0, connect_timeout: float = 0.5, retries: int = 2, backoff: float = 0.05,
+                 failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeouts = timeouts or {}
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def timeout_for(self, endpoint: Optional[str]) -> float:
+        return self.timeouts.get(endpoint, self.timeout)
+
+    def _attempts(self, method: str, retry: Optional[bool]) -> int:
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        return self.retries + 1 if retry else 1
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _check_circuit(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def request(self, method: str, path: str, endpoint: str = None, retry: bool = None, **kwargs) -> requests.Response:
+        """Send a request; ``retry`` defaults to retrying idempotent methods only"""
+        kwargs.setdefault('timeout', (self.connect_timeout, self.timeout_for(endpoint)))
+        attempts = self._attempts(method, retry)
+
+        for attempt in range(attempts):
+            self._check_circuit()
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.breaker.record_failure()
+                retryable = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                if not retryable or attempt == attempts - 1:
+                    raise
+            except BaseException:
+                # Anything else still ends the attempt, releasing a half-open trial
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+            time.sleep(self._backoff(attempt))
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> requests.Response:
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', path, **kwargs)
+
+    async def arequest(self, session: aiohttp.ClientSession, method: str, path: str, endpoint: str = None,
+                       retry: bool = None, json: Any = None) -> Tuple[int, Any]:
+        """Async ``request`` over the caller's aiohttp session.
+
+        Returns ``(status, body)``, with the body decoded from JSON when the
+        response is JSON and as text otherwise.
+        """
+        timeout = aiohttp.ClientTimeout(total=self.timeout_for(endpoint), connect=self.connect_timeout)
+        attempts = self._attempts(method, retry)
+
+        for attempt in range(attempts):
+            self._check_circuit()
+            try:
+                async with session.request(
+                    method, f"{self.base_url}{path}", json=json, timeout=timeout
+                ) as response:
+                    if response.content_type == 'application/json':
+                        body = await response.json()
+                    else:
+                        body = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+            except BaseException:
+                # Cancellation or an undecodable body still ends the attempt,
+                # releasing a half-open trial
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status < 500:
+                    self.breaker.record_success()
+                    return response.status, body
+                self.breaker.record_failure()
+                if response.status not in RETRY_STATUSES or attempt == attempts - 1:
+                    return response.status, body
+            await asyncio.sleep(self._backoff(attempt))
+
+
+# Global clients, one per upstream service
+_service_clients = {}
+
+def get_service_client(name: str, base_url: str = None, **options) -> ServiceClient:
+    """Get or create the shared client for an upstream service"""
+    if name not in _service_clients and base_url is not None:
+        _service_clients[name] = ServiceClient(name, base_url, **options)
+    return _service_clients.get(name)
+
+def service_client_stats() -> Dict[str, Any]:
+    """Circuit state of every upstream client created so far"""
+    return {name: client.breaker.stats() for name, client in list(_service_clients.items())}
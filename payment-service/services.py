@@ -1,19 +1,49 @@
 import uuid
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from database import Database
 from models import Payment
+from service_client import ServiceClient
 
 logger = logging.getLogger(__name__)
 
+def is_valid_attempt(attempt):
+    """Attempts key payments per order, so only 1, 2, 3, ... are accepted"""
+    return isinstance(attempt, int) and not isinstance(attempt, bool) and attempt >= 1
+
+def is_stalled(payment, delay):
+    """True for a payment still pending well after its processing delay.
+
+    The process that created it may have died between the INSERT and
+    scheduling it, so a replayed initiation has to schedule it again.
+    """
+    if payment.status != 'pending':
+        return False
+    created_at = payment.created_at
+    if created_at.__class__ is str:
+        created_at = datetime.fromisoformat(created_at)
+    return (datetime.now() - created_at).total_seconds() > delay
+
 class PaymentService:
-    def __init__(self, db_path, order_service_url):
-        self.db = Database(db_path)
+    def __init__(self, db_path, order_service_url, db_pool_size=8, order_client=None, notify_workers=4):
+        self.db = Database(db_path, pool_size=db_pool_size)
         self.order_service_url = order_service_url
+        self.order_client = order_client or ServiceClient('order', order_service_url)
+        # HTTP fallbacks for unconfirmed results; kept off the publisher threads
+        self._notify_executor = ThreadPoolExecutor(max_workers=notify_workers, thread_name_prefix='order-notify')
     
-    def initiate_payment(self, order_id, user_id, amount, payment_method='mock'):
-        """Initiate a new payment"""
+    def initiate_payment(self, order_id, user_id, amount, payment_method='mock', attempt=1):
+        """Initiate a payment, idempotently per (order_id, attempt).
+
+        Returns ``(payment, created)``. A replay of an attempt that already
+        exists (broker redelivery, HTTP retry) returns the stored payment with
+        ``created=False`` so the caller does not charge it again.
+        """
+        if not is_valid_attempt(attempt):
+            raise ValueError(f"attempt must be a positive integer, got {attempt!r}")
+        
         try:
             # Generate unique payment ID
             payment_id = f"pay_{uuid.uuid4().hex[:12]}"
@@ -25,33 +55,43 @@ class PaymentService:
                 user_id=user_id,
                 amount=amount,
                 status='pending',
-                payment_method=payment_method
+                payment_method=payment_method,
+                attempt=attempt
             )
             
-            # Save to database
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO payments (payment_id, order_id, user_id, amount, status, payment_method, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                payment.payment_id,
-                payment.order_id,
-                payment.user_id,
-                payment.amount,
-                payment.status,
-                payment.payment_method,
-                payment.created_at,
-                payment.updated_at
-            ))
-            
-            payment.id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            # Save to database; the unique (order_id, attempt) index turns a
+            # replay into a no-op instead of a second payment
+            with self.db.connection() as conn:
+                cursor = conn.execute('''
+                    INSERT INTO payments (payment_id, order_id, attempt, user_id, amount, status, payment_method, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (order_id, attempt) DO NOTHING
+                ''', (
+                    payment.payment_id,
+                    payment.order_id,
+                    payment.attempt,
+                    payment.user_id,
+                    payment.amount,
+                    payment.status,
+                    payment.payment_method,
+                    payment.created_at,
+                    payment.updated_at
+                ))
+                
+                if cursor.rowcount == 0:
+                    row = conn.execute(
+                        'SELECT * FROM payments WHERE order_id = ? AND attempt = ?',
+                        (order_id, attempt)
+                    ).fetchone()
+                    conn.commit()
+                    logger.info(f"Payment initiation for order {order_id} (attempt {attempt}) replayed")
+                    return Payment.from_db_row(row), False
+                
+                payment.id = cursor.lastrowid
+                conn.commit()
             
             logger.info(f"Payment {payment_id} initiated for order {order_id}")
-            return payment
+            return payment, True
             
         except Exception as e:
             logger.error(f"Failed to initiate payment: {str(e)}")
@@ -60,12 +100,8 @@ class PaymentService:
     def get_payment(self, payment_id):
         """Get payment by payment ID"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM payments WHERE payment_id = ?', (payment_id,))
-            row = cursor.fetchone()
-            conn.close()
+            with self.db.connection() as conn:
+                row = conn.execute('SELECT * FROM payments WHERE payment_id = ?', (payment_id,)).fetchone()
             
             if row:
                 return Payment.from_db_row(row)
@@ -78,12 +114,11 @@ class PaymentService:
     def get_payment_by_order(self, order_id):
         """Get payment by order ID"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM payments WHERE order_id = ? ORDER BY created_at DESC LIMIT 1', (order_id,))
-            row = cursor.fetchone()
-            conn.close()
+            with self.db.connection() as conn:
+                row = conn.execute(
+                    'SELECT * FROM payments WHERE order_id = ? ORDER BY attempt DESC LIMIT 1',
+                    (order_id,)
+                ).fetchone()
             
             if row:
                 return Payment.from_db_row(row)
@@ -93,50 +128,52 @@ class PaymentService:
             logger.error(f"Failed to get payment for order {order_id}: {str(e)}")
             raise
     
+    def save_payment_status(self, payment_id, status, from_status=None):
+        """Write a status change and return the updated payment, without notifying anyone.
+
+        With ``from_status``, only a payment still in that status is changed,
+        and None is returned otherwise.
+        """
+        where, params = 'payment_id = ?', (status, datetime.now(), payment_id)
+        if from_status is not None:
+            where, params = 'payment_id = ? AND status = ?', params + (from_status,)
+        
+        with self.db.connection() as conn:
+            if self.db.supports_returning:
+                # One statement writes the row and hands it back
+                rows = conn.execute(f'''
+                    UPDATE payments 
+                    SET status = ?, updated_at = ?
+                    WHERE {where}
+                    RETURNING *
+                ''', params).fetchall()
+            else:
+                cursor = conn.execute(f'''
+                    UPDATE payments 
+                    SET status = ?, updated_at = ?
+                    WHERE {where}
+                ''', params)
+                rows = []
+                if cursor.rowcount:
+                    # Same connection and transaction, so no second borrow
+                    rows = conn.execute('SELECT * FROM payments WHERE payment_id = ?', (payment_id,)).fetchall()
+            
+            conn.commit()
+        
+        if not rows:
+            if from_status is not None:
+                return None
+            raise ValueError(f"Payment {payment_id} not found")
+        return Payment.from_db_row(rows[0])
+    
     def update_payment_status(self, payment_id, status):
         """Update payment status"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE payments 
-                SET status = ?, updated_at = ?
-                WHERE payment_id = ?
-            ''', (status, datetime.now(), payment_id))
-            
-            if cursor.rowcount == 0:
-                conn.close()
-                raise ValueError(f"Payment {payment_id} not found")
-            
-            conn.commit()
-            conn.close()
-            
-            # Get updated payment
-            payment = self.get_payment(payment_id)
+            payment = self.save_payment_status(payment_id, status)
             
             # Notify order service if payment is successful
             if status == 'success' and payment:
-                try:
-                    # Try async messaging first, fallback to HTTP
-                    try:
-                        from message_broker import get_rabbitmq_service
-                        rabbitmq = get_rabbitmq_service()
-                        if rabbitmq:
-                            rabbitmq.publish_payment_result(
-                                order_id=payment.order_id,
-                                payment_status=status,
-                                payment_id=payment_id
-                            )
-                            logger.info(f"Published payment result via RabbitMQ for order {payment.order_id}")
-                        else:
-                            # Fallback to HTTP notification
-                            self._notify_order_service(payment.order_id, payment_id, status)
-                    except (ImportError, Exception):
-                        # Fallback to HTTP notification
-                        self._notify_order_service(payment.order_id, payment_id, status)
-                except Exception as e:
-                    logger.error(f"Failed to notify order service: {str(e)}")
+                self._notify_payment_results([payment])
             
             logger.info(f"Payment {payment_id} status updated to {status}")
             return payment
@@ -145,32 +182,160 @@ class PaymentService:
             logger.error(f"Failed to update payment status: {str(e)}")
             raise
     
+    def bulk_update_payment_status(self, updates):
+        """Apply many (payment_id, status) changes in one transaction.
+
+        Returns ``(payments, not_found)``. Successful payments are announced
+        to order-service as one publish batch.
+        """
+        try:
+            now = datetime.now()
+            payment_ids = list(dict.fromkeys(payment_id for payment_id, _ in updates))
+            with self.db.connection() as conn:
+                conn.executemany(
+                    'UPDATE payments SET status = ?, updated_at = ? WHERE payment_id = ?',
+                    [(status, now, payment_id) for payment_id, status in updates]
+                )
+                # Read back inside the transaction, so no other writer can
+                # change the rows between the update and the notifications
+                rows = self._select_in('SELECT * FROM payments WHERE payment_id IN ({})', payment_ids, conn=conn)
+                conn.commit()
+            
+            by_id = {payment.payment_id: payment for payment in Payment.from_db_rows(rows)}
+            payments = [by_id[payment_id] for payment_id in payment_ids if payment_id in by_id]
+            not_found = [payment_id for payment_id in payment_ids if payment_id not in by_id]
+            
+            succeeded = dict(updates)
+            self._notify_payment_results([
+                payment for payment in payments if succeeded.get(payment.payment_id) == 'success'
+            ])
+            
+            logger.info(f"Bulk updated {len(payments)} payment(s), {len(not_found)} not found")
+            return payments, not_found
+            
+        except Exception as e:
+            logger.error(f"Failed to bulk update payment status: {str(e)}")
+            raise
+    
+    def get_payments(self, payment_ids):
+        """Get payments by payment ID, in request order, skipping unknown IDs"""
+        try:
+            rows = self._select_in('SELECT * FROM payments WHERE payment_id IN ({})', list(dict.fromkeys(payment_ids)))
+            by_id = {payment.payment_id: payment for payment in Payment.from_db_rows(rows)}
+            return [by_id[payment_id] for payment_id in dict.fromkeys(payment_ids) if payment_id in by_id]
+            
+        except Exception as e:
+            logger.error(f"Failed to get payments: {str(e)}")
+            raise
+    
+    def get_payments_by_orders(self, order_ids):
+        """Get the latest payment attempt for each order, keyed by order ID"""
+        try:
+            rows = self._select_in(
+                'SELECT * FROM payments WHERE order_id IN ({}) ORDER BY order_id, attempt',
+                list(dict.fromkeys(order_ids))
+            )
+            # Later attempts overwrite earlier ones
+            return {payment.order_id: payment for payment in Payment.from_db_rows(rows)}
+            
+        except Exception as e:
+            logger.error(f"Failed to get payments for orders: {str(e)}")
+            raise
+    
+    def _select_in(self, query, values, chunk_size=500, conn=None):
+        """Run ``query`` with its IN list filled from ``values``, in chunks
+        that stay under SQLite's bound parameter limit; on ``conn`` if given,
+        otherwise on a borrowed connection"""
+        if conn is None:
+            with self.db.connection() as conn:
+                return self._select_in(query, values, chunk_size, conn)
+        
+        rows = []
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            rows.extend(conn.execute(query.format(', '.join('?' * len(chunk))), chunk).fetchall())
+        return rows
+    
+    def _notify_payment_results(self, payments):
+        """Announce successful payments, preferring one broker batch over HTTP"""
+        if not payments:
+            return
+        
+        try:
+            # Try async messaging first, fallback to HTTP
+            try:
+                from message_broker import get_rabbitmq_service
+                rabbitmq = get_rabbitmq_service()
+                if rabbitmq:
+                    confirmations = rabbitmq.publish_payment_results([
+                        (payment.order_id, payment.status, payment.payment_id) for payment in payments
+                    ])
+                    for payment, confirmation in zip(payments, confirmations or []):
+                        def on_confirmed(future, payment=payment):
+                            # Runs on the publisher's thread, so the HTTP
+                            # fallback for an unconfirmed result is handed off
+                            if future.exception():
+                                self._notify_executor.submit(
+                                    self._notify_order_service, payment.order_id, payment.payment_id, payment.status
+                                )
+                        
+                        confirmation.add_done_callback(on_confirmed)
+                    logger.info(f"Published {len(payments)} payment result(s) via RabbitMQ")
+                else:
+                    # Fallback to HTTP notification
+                    for payment in payments:
+                        self._notify_order_service(payment.order_id, payment.payment_id, payment.status)
+            except (ImportError, Exception):
+                # Fallback to HTTP notification
+                for payment in payments:
+                    self._notify_order_service(payment.order_id, payment.payment_id, payment.status)
+        except Exception as e:
+            logger.error(f"Failed to notify order service: {str(e)}")
+    
     def process_mock_payment(self, payment_id):
         """Process a mock payment (simulate payment processing)"""
         import time
-        import random
         
+        # Simulate processing delay
+        time.sleep(1)
+        return self.settle_mock_payment(payment_id)
+    
+    def settle_mock_payment(self, payment_id):
+        """Decide the outcome of a mock payment once its delay has elapsed.
+
+        Only a pending payment is settled, so settling one twice (a replay
+        rescheduled it) keeps the first outcome.
+        """
         try:
-            # Simulate processing delay
-            time.sleep(1)
-            
-            # Mock payment success (90% success rate)
-            success = random.random() < 0.9
-            
-            if success:
-                return self.update_payment_status(payment_id, 'success')
-            else:
-                return self.update_payment_status(payment_id, 'failed')
-                
+            status = self.mock_payment_outcome()
+            payment = self.save_payment_status(payment_id, status, from_status='pending')
         except Exception as e:
             logger.error(f"Failed to process mock payment: {str(e)}")
-            return self.update_payment_status(payment_id, 'failed')
+            status = 'failed'
+            payment = self.save_payment_status(payment_id, status, from_status='pending')
+        
+        if payment is None:
+            payment = self.get_payment(payment_id)
+            if payment is None:
+                raise ValueError(f"Payment {payment_id} not found")
+            logger.info(f"Payment {payment_id} already settled as {payment.status}")
+            return payment
+        
+        if status == 'success':
+            self._notify_payment_results([payment])
+        logger.info(f"Payment {payment_id} status updated to {status}")
+        return payment
+    
+    @staticmethod
+    def mock_payment_outcome():
+        """Mock payment success (90% success rate)"""
+        import random
+        
+        return 'success' if random.random() < 0.9 else 'failed'
     
     def _notify_order_service(self, order_id, payment_id, payment_status):
         """Notify order service about payment status"""
         try:
-            url = f"{self.order_service_url}/api/orders/{order_id}/status/"
-            
             # Update order status based on payment status
             order_status = 'confirmed' if payment_status == 'success' else 'cancelled'
             
@@ -178,7 +343,8 @@ class PaymentService:
                 'status': order_status
             }
             
-            response = requests.put(url, json=payload, timeout=5)
+            # Repeating a status is a no-op in order-service, so the PUT is retried
+            response = self.order_client.put(f"/api/orders/{order_id}/status/", endpoint='status', json=payload)
             
             if response.status_code not in [200, 201]:
                 logger.error(f"Order service returned {response.status_code}: {response.text}")
@@ -188,24 +354,22 @@ class PaymentService:
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to notify order service: {str(e)}")
     
-    def get_payment_stats(self):
-        """Get payment statistics"""
+    def get_payment_stats(self, period='day', at=None):
+        """Get payment statistics for the day (or hour) containing ``at``, default now"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            # Get today's stats
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_payments,
-                    SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as successful_payments,
-                    SUM(CASE WHEN status = 'success' THEN amount ELSE 0 END) as total_revenue
-                FROM payments 
-                WHERE DATE(created_at) = DATE('now')
-            ''')
-            
-            row = cursor.fetchone()
-            conn.close()
+            at = at or datetime.now()
+            bucket = at.strftime('%Y-%m-%d') if period == 'day' else at.strftime('%Y-%m-%d %H')
+            
+            with self.db.connection() as conn:
+                # One primary key lookup on the trigger-maintained aggregates
+                row = conn.execute('''
+                    SELECT total_payments, successful_payments, total_revenue
+                    FROM payment_stats
+                    WHERE period = ? AND bucket = ?
+                ''', (period, bucket)).fetchone()
+            
+            if not row:
+                row = {'total_payments': 0, 'successful_payments': 0, 'total_revenue': 0}
             
             return {
                 'total_payments': row['total_payments'] or 0,
@@ -221,4 +385,4 @@ class PaymentService:
                 'successful_payments': 0,
                 'total_revenue': 0,
                 'success_rate': 0
-            }
\ No newline at end of file
+            }
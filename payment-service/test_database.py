@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+from database import Database
+
+INSERT = '''
+    INSERT INTO payments (payment_id, order_id, attempt, user_id, amount, status, created_at, updated_at)
+    VALUES (?, ?, ?, 7, ?, ?, ?, ?)
+'''
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'payments.db'), pool_size=2)
+    yield db
+    db.close()
+
+
+def insert(conn, payment_id, order_id, amount, status='pending', attempt=1, created_at='2025-10-20 09:15:00',
+           on_conflict=''):
+    conn.execute(INSERT + on_conflict, (payment_id, order_id, attempt, amount, status, created_at, created_at))
+
+
+def stats(conn):
+    return [tuple(row) for row in conn.execute('SELECT * FROM payment_stats ORDER BY period, bucket')]
+
+
+def rebuilt_stats(db, conn):
+    conn.execute('SAVEPOINT rebuild')
+    try:
+        db.rebuild_payment_stats(conn)
+        return stats(conn)
+    finally:
+        conn.execute('ROLLBACK TO rebuild')
+        conn.execute('RELEASE rebuild')
+
+
+def test_duplicate_attempt_is_rejected(db):
+    with db.connection() as conn:
+        insert(conn, 'pay_1', order_id=1, amount=100.0)
+
+        with pytest.raises(sqlite3.IntegrityError):
+            insert(conn, 'pay_2', order_id=1, amount=100.0)
+        insert(conn, 'pay_3', order_id=1, amount=100.0, attempt=2)
+        conn.commit()
+
+        assert conn.execute('SELECT COUNT(*) FROM payments WHERE order_id = 1').fetchone()[0] == 2
+
+
+def test_ignored_duplicate_is_not_counted(db):
+    with db.connection() as conn:
+        insert(conn, 'pay_1', order_id=1, amount=100.0)
+        insert(conn, 'pay_2', order_id=1, amount=100.0, on_conflict='ON CONFLICT (order_id, attempt) DO NOTHING')
+        conn.commit()
+
+        assert stats(conn) == [('day', '2025-10-20', 1, 0, 0.0), ('hour', '2025-10-20 09', 1, 0, 0.0)]
+
+
+def test_stats_match_a_rebuild_after_inserts_and_status_changes(db):
+    with db.connection() as conn:
+        insert(conn, 'pay_1', order_id=1, amount=100.0)
+        insert(conn, 'pay_2', order_id=2, amount=40.5, status='success', created_at='2025-10-20 10:05:00')
+        insert(conn, 'pay_3', order_id=3, amount=60.0, created_at='2025-10-21 08:00:00')
+        conn.commit()
+        assert stats(conn) == rebuilt_stats(db, conn)
+
+        for payment_id, status in (
+            ('pay_1', 'success'),   # pending -> success
+            ('pay_2', 'failed'),    # success -> failed
+            ('pay_3', 'failed'),    # pending -> failed, no money moves
+            ('pay_1', 'success'),   # unchanged, trigger does not fire
+        ):
+            conn.execute('UPDATE payments SET status = ? WHERE payment_id = ?', (status, payment_id))
+        conn.commit()
+
+        assert stats(conn) == rebuilt_stats(db, conn)
+        assert ('day', '2025-10-20', 2, 1, 100.0) in stats(conn)
@@ -0,0 +1,195 @@
+from concurrent.futures import Future
+from unittest import mock
+
+import pika
+import pytest
+
+from message_broker import (
+    BatchingPublisher, ConfirmingPublisher, DeliveryNotConfirmed, RabbitMQService, _AckBatcher
+)
+from models import Payment
+
+
+@pytest.fixture
+def service():
+    # Handlers under test never touch the connection
+    return RabbitMQService.__new__(RabbitMQService)
+
+
+def initiation(attempt=1):
+    return {'event_type': 'payment_initiated', 'order_id': 1, 'user_id': 7, 'amount': 120.0, 'attempt': attempt}
+
+
+def replayed(created_at):
+    payment = Payment(payment_id='pay_1', order_id=1, user_id=7, amount=120.0, created_at=created_at)
+    payment_service = mock.Mock()
+    payment_service.initiate_payment.return_value = (payment, False)
+    return payment_service
+
+
+def test_replay_of_a_scheduled_payment_releases_its_slot(service):
+    processor = mock.Mock(delay=1.0)
+
+    service._handle_payment_message(initiation(), replayed(created_at=None), processor, 1.0)
+
+    processor.release.assert_called_once()
+    processor.schedule.assert_not_called()
+
+
+def test_replay_of_a_stalled_payment_schedules_it_again(service):
+    processor = mock.Mock(delay=1.0)
+
+    service._handle_payment_message(initiation(), replayed(created_at='2025-01-01 09:00:00.000000'), processor, 1.0)
+
+    processor.schedule.assert_called_once_with('pay_1')
+    processor.release.assert_not_called()
+
+
+@pytest.fixture
+def confirming_publisher():
+    # Driven by hand in place of the IO loop thread
+    publisher = ConfirmingPublisher('amqp://localhost', 'canteen.orders', confirm_timeout=5, max_retries=1)
+    publisher._connection = mock.Mock()
+    publisher._channel = mock.Mock()
+    return publisher
+
+
+def publish(publisher, count):
+    futures = [publisher.publish('payment.completed', b'{}', pika.BasicProperties()) for _ in range(count)]
+    publisher._drain()
+    return futures
+
+
+def confirm(publisher, method):
+    publisher._on_delivery_confirmation(mock.Mock(method=method))
+
+
+def test_ack_resolves_its_delivery_tag_only(confirming_publisher):
+    futures = publish(confirming_publisher, 3)
+
+    confirm(confirming_publisher, pika.spec.Basic.Ack(delivery_tag=2))
+
+    assert [future.done() for future in futures] == [False, True, False]
+    assert futures[1].result() is True
+
+
+def test_multiple_ack_resolves_every_tag_up_to_it(confirming_publisher):
+    futures = publish(confirming_publisher, 3)
+
+    confirm(confirming_publisher, pika.spec.Basic.Ack(delivery_tag=2, multiple=True))
+
+    assert [future.done() for future in futures] == [True, True, False]
+    assert confirming_publisher.in_flight == 1
+
+
+def test_nack_republishes_the_message(confirming_publisher):
+    (future,) = publish(confirming_publisher, 1)
+
+    confirm(confirming_publisher, pika.spec.Basic.Nack(delivery_tag=1))
+
+    assert confirming_publisher._channel.basic_publish.call_count == 2
+    assert not future.done()
+    confirm(confirming_publisher, pika.spec.Basic.Ack(delivery_tag=2))
+    assert future.result() is True
+
+
+def test_unconfirmed_message_fails_after_its_retries(confirming_publisher):
+    (future,) = publish(confirming_publisher, 1)
+    confirming_publisher.confirm_timeout = -1
+
+    confirming_publisher._check_timeouts()
+    assert confirming_publisher._channel.basic_publish.call_count == 2
+    confirming_publisher._check_timeouts()
+
+    with pytest.raises(DeliveryNotConfirmed):
+        future.result(timeout=0)
+    assert confirming_publisher.in_flight == 0
+
+
+@pytest.fixture
+def batching_publisher():
+    publisher = BatchingPublisher('amqp://localhost', 'canteen.orders')
+    publisher.channel = mock.Mock()
+
+    def connect():
+        publisher._connection = mock.Mock()
+        publisher._channel = publisher.channel
+
+    publisher._connect = connect
+    return publisher
+
+
+def results(count):
+    return [('payment.completed', f'{{"order_id": {index}}}'.encode(), None, Future()) for index in range(count)]
+
+
+def test_retry_resumes_after_the_messages_already_sent(batching_publisher):
+    batch = results(3)
+    batching_publisher.channel.basic_publish.side_effect = [None, ConnectionError('reset'), None, None]
+
+    batching_publisher._send(batch)
+
+    bodies = [call.kwargs['body'] for call in batching_publisher.channel.basic_publish.call_args_list]
+    assert bodies == [batch[0][1], batch[1][1], batch[1][1], batch[2][1]]
+    assert [future.result(timeout=0) for *_, future in batch] == [None, None, None]
+
+
+def test_second_failure_fails_only_the_unsent_messages(batching_publisher):
+    batch = results(3)
+    batching_publisher.channel.basic_publish.side_effect = [None, ConnectionError('reset'), ConnectionError('reset')]
+
+    batching_publisher._send(batch)
+
+    assert batch[0][3].result(timeout=0) is None
+    for *_, future in batch[1:]:
+        with pytest.raises(ConnectionError):
+            future.result(timeout=0)
+
+
+@pytest.fixture
+def acks():
+    connection = mock.Mock()
+    # Run consumer-thread callbacks inline
+    connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+    return _AckBatcher(connection, mock.Mock(), batch_size=3, interval=0.05)
+
+
+def deliver(acks, count):
+    for tag in range(1, count + 1):
+        acks.track(tag)
+
+
+def test_acks_wait_for_the_oldest_delivery(acks):
+    deliver(acks, 3)
+
+    acks.complete(2, _AckBatcher.ACK)
+    acks.complete(3, _AckBatcher.ACK)
+    acks.channel.basic_ack.assert_not_called()
+
+    acks.complete(1, _AckBatcher.ACK)
+    acks.channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+
+
+def test_flush_acks_only_the_contiguous_prefix(acks):
+    deliver(acks, 3)
+
+    acks.complete(1, _AckBatcher.ACK)
+    acks.complete(3, _AckBatcher.ACK)
+    acks.connection.call_later.assert_called_once()
+    acks.flush()
+
+    acks.channel.basic_ack.assert_called_once_with(delivery_tag=1, multiple=True)
+
+
+def test_nack_flushes_the_acks_before_it(acks):
+    deliver(acks, 3)
+
+    acks.complete(1, _AckBatcher.ACK)
+    acks.complete(2, _AckBatcher.REJECT)
+    acks.complete(3, _AckBatcher.REQUEUE)
+
+    assert acks.channel.mock_calls == [
+        mock.call.basic_ack(delivery_tag=1, multiple=True),
+        mock.call.basic_nack(delivery_tag=2, requeue=False),
+        mock.call.basic_nack(delivery_tag=3, requeue=True),
+    ]
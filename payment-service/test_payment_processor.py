@@ -0,0 +1,86 @@
+import threading
+from unittest import mock
+
+import pytest
+
+from payment_processor import PaymentProcessor, ProcessorBusy
+
+
+class RecordingService:
+    """Stands in for PaymentService, recording the order payments settle in"""
+
+    def __init__(self, expected):
+        self.settled = []
+        self.done = threading.Event()
+        self.expected = expected
+
+    def settle_mock_payment(self, payment_id):
+        self.settled.append(payment_id)
+        if len(self.settled) == self.expected:
+            self.done.set()
+
+
+def test_reserve_blocks_then_raises_when_full():
+    processor = PaymentProcessor(mock.Mock(), workers=1, max_pending=2)
+    processor.reserve()
+    processor.reserve()
+
+    with pytest.raises(ProcessorBusy):
+        processor.reserve(timeout=0.01)
+    assert processor.stats()['rejected'] == 1
+
+
+def test_release_frees_a_slot_for_a_waiting_reserve():
+    processor = PaymentProcessor(mock.Mock(), workers=1, max_pending=1)
+    processor.reserve()
+    reserved = threading.Event()
+
+    def reserve():
+        processor.reserve(timeout=5)
+        reserved.set()
+
+    waiter = threading.Thread(target=reserve)
+    waiter.start()
+    assert not reserved.wait(0.05)
+    processor.release()
+    waiter.join(5)
+
+    assert reserved.is_set()
+    assert processor.stats()['pending'] == 1
+
+
+def test_closed_processor_rejects_reservations():
+    processor = PaymentProcessor(mock.Mock(), workers=1).start()
+    processor.close()
+
+    with pytest.raises(ProcessorBusy):
+        processor.reserve(timeout=0)
+
+
+def test_payments_settle_in_due_order_and_free_their_slots():
+    service = RecordingService(expected=3)
+    processor = PaymentProcessor(service, workers=1, max_pending=3).start()
+    try:
+        for payment_id, delay in (('pay_late', 0.3), ('pay_early', 0.1), ('pay_middle', 0.2)):
+            processor.delay = delay
+            processor.submit(payment_id, timeout=0)
+
+        assert service.done.wait(5)
+        assert service.settled == ['pay_early', 'pay_middle', 'pay_late']
+        assert processor.stats()['completed'] == 3
+        processor.reserve(timeout=1)
+    finally:
+        processor.close()
+
+
+def test_failed_settlement_still_frees_its_slot():
+    service = mock.Mock()
+    service.settle_mock_payment.side_effect = RuntimeError('database is locked')
+    processor = PaymentProcessor(service, workers=1, max_pending=1, delay=0).start()
+    try:
+        processor.submit('pay_1', timeout=0)
+        processor.reserve(timeout=5)
+
+        assert processor.stats()['failed'] == 1
+    finally:
+        processor.close()
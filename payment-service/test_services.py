@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from services import PaymentService, is_stalled
+
+
+@pytest.fixture
+def payment_service(tmp_path):
+    service = PaymentService(str(tmp_path / 'payments.db'), 'http://order-service:8000', order_client=mock.Mock())
+    service._notify_payment_results = mock.Mock()
+    yield service
+    service._notify_executor.shutdown()
+
+
+def backdate(payment_service, payment_id, seconds):
+    with payment_service.db.connection() as conn:
+        conn.execute(
+            'UPDATE payments SET created_at = ? WHERE payment_id = ?',
+            (datetime.now() - timedelta(seconds=seconds), payment_id)
+        )
+        conn.commit()
+
+
+def test_replay_returns_the_stored_payment(payment_service):
+    payment, created = payment_service.initiate_payment(1, 7, 120.0)
+    replayed, replay_created = payment_service.initiate_payment(1, 7, 120.0)
+
+    assert (created, replay_created) == (True, False)
+    assert replayed.payment_id == payment.payment_id
+
+
+def test_pending_replay_is_stalled_only_after_the_delay(payment_service):
+    payment, _ = payment_service.initiate_payment(2, 7, 80.0)
+
+    replayed, _ = payment_service.initiate_payment(2, 7, 80.0)
+    assert not is_stalled(replayed, delay=1.0)
+
+    backdate(payment_service, payment.payment_id, seconds=5)
+    replayed, _ = payment_service.initiate_payment(2, 7, 80.0)
+    assert is_stalled(replayed, delay=1.0)
+
+
+def test_settled_payment_is_never_stalled(payment_service):
+    payment, _ = payment_service.initiate_payment(3, 7, 50.0)
+    payment_service.save_payment_status(payment.payment_id, 'failed')
+    backdate(payment_service, payment.payment_id, seconds=5)
+
+    replayed, _ = payment_service.initiate_payment(3, 7, 50.0)
+    assert not is_stalled(replayed, delay=1.0)
+
+
+def test_settling_twice_keeps_the_first_outcome(payment_service):
+    payment, _ = payment_service.initiate_payment(4, 7, 60.0)
+
+    with mock.patch.object(PaymentService, 'mock_payment_outcome', side_effect=['success', 'failed']):
+        first = payment_service.settle_mock_payment(payment.payment_id)
+        second = payment_service.settle_mock_payment(payment.payment_id)
+
+    assert (first.status, second.status) == ('success', 'success')
+    payment_service._notify_payment_results.assert_called_once()
+
+
+def test_settling_an_unknown_payment_raises(payment_service):
+    with pytest.raises(ValueError):
+        payment_service.settle_mock_payment('pay_missing')
+
+
+def test_bulk_update_reads_back_inside_its_transaction(payment_service):
+    first, _ = payment_service.initiate_payment(5, 7, 40.0)
+    second, _ = payment_service.initiate_payment(6, 7, 45.0)
+    select_in = payment_service._select_in
+    in_transaction = []
+
+    def record(query, values, chunk_size=500, conn=None):
+        in_transaction.append(conn is not None and conn.in_transaction)
+        return select_in(query, values, chunk_size, conn)
+
+    with mock.patch.object(payment_service, '_select_in', side_effect=record):
+        payments, not_found = payment_service.bulk_update_payment_status([
+            (second.payment_id, 'failed'), (first.payment_id, 'success'), ('pay_missing', 'success')
+        ])
+
+    assert in_transaction == [True]
+    assert [(payment.payment_id, payment.status) for payment in payments] == [
+        (second.payment_id, 'failed'), (first.payment_id, 'success')
+    ]
+    assert not_found == ['pay_missing']
+    (notified,) = payment_service._notify_payment_results.call_args.args
+    assert [payment.payment_id for payment in notified] == [first.payment_id]
@@ -130,6 +130,30 @@ func (h *QueueHandler) RemoveFromQueue(c *gin.Context) {
 	c.JSON(http.StatusOK, gin.H{"message": "Order removed from queue successfully"})
 }
 
+func (h *QueueHandler) RemoveManyFromQueue(c *gin.Context) {
+	var req models.RemoveQueueRequest
+	if err := c.ShouldBindJSON(&req); err != nil {
+		c.JSON(http.StatusBadRequest, gin.H{"error": err.Error()})
+		return
+	}
+
+	err := h.queueService.RemoveManyFromQueue(req.OrderIDs)
+	if err != nil {
+		c.JSON(http.StatusInternalServerError, gin.H{"error": err.Error()})
+		return
+	}
+
+	// Broadcast queue removals via WebSocket
+	for _, orderID := range req.OrderIDs {
+		h.wsHub.Broadcast(models.WebSocketMessage{
+			Type: "queue_removed",
+			Data: gin.H{"order_id": orderID},
+		})
+	}
+
+	c.JSON(http.StatusOK, gin.H{"message": "Orders removed from queue successfully", "removed": len(req.OrderIDs)})
+}
+
 func (h *QueueHandler) GetQueueStats(c *gin.Context) {
 	stats, err := h.queueService.GetQueueStats()
 	if err != nil {
@@ -76,6 +76,7 @@ func main() {
 		api.GET("/active", queueHandler.GetActiveQueue)
 		api.PUT("/order/:orderId", queueHandler.UpdateQueueStatus)
 		api.DELETE("/order/:orderId", queueHandler.RemoveFromQueue)
+		api.POST("/remove", queueHandler.RemoveManyFromQueue)
 		api.GET("/stats", queueHandler.GetQueueStats)
 	}
 
@@ -28,6 +28,10 @@ type UpdateQueueStatusRequest struct {
 	Status string `json:"status" binding:"required"`
 }
 
+type RemoveQueueRequest struct {
+	OrderIDs []int `json:"order_ids" binding:"required"`
+}
+
 type WebSocketMessage struct {
 	Type string      `json:"type"`
 	Data interface{} `json:"data"`
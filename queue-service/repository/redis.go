@@ -205,6 +205,35 @@ func (r *RedisRepository) RemoveFromQueue(orderID int) error {
 	return nil
 }
 
+// RemoveManyFromQueue removes several orders in one round trip and
+// refreshes the stats once
+func (r *RedisRepository) RemoveManyFromQueue(orderIDs []int) error {
+	if len(orderIDs) == 0 {
+		return nil
+	}
+
+	members := make([]interface{}, len(orderIDs))
+	keys := make([]string, len(orderIDs))
+	for i, orderID := range orderIDs {
+		members[i] = strconv.Itoa(orderID)
+		keys[i] = fmt.Sprintf("queue:order:%d", orderID)
+	}
+
+	_, err := r.client.TxPipelined(r.ctx, func(pipe redis.Pipeliner) error {
+		pipe.ZRem(r.ctx, "queue:active", members...)
+		pipe.Del(r.ctx, keys...)
+		return nil
+	})
+	if err != nil {
+		return fmt.Errorf("failed to remove orders from queue: %v", err)
+	}
+
+	// Update stats
+	r.updateStats()
+
+	return nil
+}
+
 func (r *RedisRepository) GetQueueStats() (*models.QueueStats, error) {
 	statsKey := "queue:stats"
 	
@@ -35,6 +35,10 @@ func (s *QueueService) RemoveFromQueue(orderID int) error {
 	return s.repo.RemoveFromQueue(orderID)
 }
 
+func (s *QueueService) RemoveManyFromQueue(orderIDs []int) error {
+	return s.repo.RemoveManyFromQueue(orderIDs)
+}
+
 func (s *QueueService) GetQueueStats() (*models.QueueStats, error) {
 	return s.repo.GetQueueStats()
 }
\ No newline at end of file